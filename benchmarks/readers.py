@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleich der Reader aus gluecksfee.readers mit dem bisherigen Weg über
+pandas.read_excel (readExcelFile)
+
+Es wird eine synthetische Eingabe mit n Personen und k Seminaren als xlsx, CSV
+und Parquet erzeugt und jede Datei mit den passenden Readern eingelesen
+(bester Wert aus mehreren Wiederholungen). Alle Reader müssen das gleiche
+Ergebnis wie readExcelFile liefern.
+
+    python benchmarks/readers.py [-n 40000] [-k 30] [--repeat 3]
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gluecksfee.readers import readRegistrations
+from gluecksfee.sparse import toDense
+
+def writeInput(directory, n, k, requests=3, seed=1):
+    """Synthetic registrations with a Plaetze and an inhaltlich row as .xlsx, .csv and .parquet."""
+    from pandas import DataFrame, concat
+    rng = np.random.default_rng(seed)
+    x = np.zeros((n, k), dtype='int')
+    rows = np.repeat(np.arange(n), requests)
+    x[rows, rng.integers(0, k, rows.size)] = 1
+    df = DataFrame(x, columns=[f'Seminar {i}' for i in range(k)])
+    df.insert(0, 'Person', [f'P{u}' for u in range(n)])
+    special = DataFrame([['inhaltlich']+list(rng.integers(0, k//2+1, k)), ['Plaetze']+[max(1, n*requests//k//2)]*k],
+                        columns=df.columns)
+    df = concat([special, df], ignore_index=True)
+    files = {ext: os.path.join(directory, f'input{ext}') for ext in ['.xlsx', '.csv', '.parquet']}
+    df.to_excel(files['.xlsx'], sheet_name='registrierung', index=False)
+    df.to_csv(files['.csv'], index=False, sep=';')
+    try:
+        df.to_parquet(files['.parquet'], index=False)
+    except ImportError:
+        del files['.parquet']
+    return files
+
+def timeit(fun, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fun()
+        best = min(best, time.perf_counter()-start)
+    return best, res
+
+def same(a, b):
+    return (list(a[0]) == list(b[0]) and np.array_equal(toDense(a[1]), toDense(b[1])) and list(a[2]) == list(b[2])
+            and list(a[3]) == list(b[3]) and list(a[4]) == list(b[4]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Reader für die Eingabe")
+    parser.add_argument("-n", type=int, default=40000, help="Anzahl Personen. Default: 40000")
+    parser.add_argument("-k", type=int, default=30, help="Anzahl Seminare. Default: 30")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen pro Reader. Default: 3")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = writeInput(directory, args.n, args.k)
+        t0, ref = timeit(lambda: readRegistrations(files['.xlsx'], reader='pandas'), args.repeat)
+        print(f'n={args.n}, k={args.k}')
+        print(f'{"pandas (xlsx)":24s} {t0:8.3f} s')
+        ok = True
+        cases = [('xlsx', '.xlsx', False), ('xlsx --sparse', '.xlsx', True), ('csv', '.csv', False),
+                 ('csv --sparse', '.csv', True), ('parquet', '.parquet', False), ('parquet --sparse', '.parquet', True)]
+        for name, ext, sparse in cases:
+            if ext not in files:
+                print(f'{name:24s}     (pyarrow fehlt)')
+                continue
+            t, res = timeit(lambda: readRegistrations(files[ext], sparse=sparse), args.repeat)
+            ok &= same(ref, res)
+            print(f'{name:24s} {t:8.3f} s  {t0/t:6.1f}x{"" if same(ref, res) else "  ABWEICHUNG"}')
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Startzeit der Gluecksfee: misst `import gluecksfee` und `gluecksfee3.py -h` in
+frischen Python-Prozessen (Median über mehrere Wiederholungen) und vergleicht
+mit den Zielwerten in TARGETS. Zusätzlich wird geprüft, dass der Import des
+Pakets pandas nicht lädt.
+
+    python benchmarks/startup.py [--repeat 7]
+
+Der Exit-Code ist 1, wenn ein Zielwert überschritten wird.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds (median of fresh processes); the baseline is the interpreter start itself
+TARGETS = {'import gluecksfee': 0.25,
+           'gluecksfee3.py -h': 0.35}
+
+COMMANDS = {'python': [sys.executable, '-c', 'pass'],
+            'import gluecksfee': [sys.executable, '-c', 'import gluecksfee'],
+            'gluecksfee3.py -h': [sys.executable, os.path.join(ROOT, 'gluecksfee3.py'), '-h']}
+
+def measure(cmd, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter()-start)
+    return sorted(times)[len(times)//2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Startzeit der SeKo Gluecksfee")
+    parser.add_argument("--repeat", type=int, default=7, help="Wiederholungen pro Messung. Default: 7")
+    args = parser.parse_args()
+
+    ok = True
+    for name, cmd in COMMANDS.items():
+        t = measure(cmd, args.repeat)
+        target = TARGETS.get(name)
+        status = '' if target is None else ('ok' if t <= target else 'ZU LANGSAM')
+        ok &= target is None or t <= target
+        print(f'{name:20s} {t*1000:8.1f} ms' + ('' if target is None else f'  (Ziel {target*1000:.0f} ms) {status}'))
+
+    loaded = subprocess.run([sys.executable, '-c', 'import sys, gluecksfee; print("pandas" in sys.modules)'],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    print(f'pandas beim Import geladen: {loaded}')
+    ok &= loaded == 'False'
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
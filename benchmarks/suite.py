@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark-Suite der Auslosung: Laufzeit und Speicherbedarf pro Phase
+
+Für jeden Fall aus CASES wird die Eingabe erzeugt (benchmarks/synthetic.py)
+bzw. die mitgelieferte input.xlsx genutzt und in einem eigenen Prozess
+ausgeführt; gemessen werden die Phasen
+  parse     readRegistrations und hashSemTypes
+  assign    assignmentMatrix
+  waitlist  waitingListRequests und waitingPlacesMatrix
+  export    Schreiben der Ausgabe (Writer nach Dateiendung)
+jeweils mit Laufzeit (bester Wert aus --repeat Durchläufen) und maximalem
+Speicher (Peak RSS der Phase; unter Linux wird der Peak vor jeder Phase über
+/proc/self/clear_refs zurückgesetzt, sonst ist es der Peak des Prozesses).
+
+Das Ergebnis wird als JSON gespeichert und mit einer Baseline verglichen
+(Default: benchmarks/baseline.json); Phasen, die um mehr als --tolerance
+langsamer sind, werden markiert und der Exit-Code ist 1.
+
+    python benchmarks/suite.py                      # alle Fälle bis 10^5 Personen
+    python benchmarks/suite.py --all                # inkl. 10^6 Personen
+    python benchmarks/suite.py --cases input n1000 -o result.json
+    python benchmarks/suite.py --save-baseline      # Baseline neu schreiben
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gluecksfee.lottery import assignmentMatrix, hashSemTypes, waitingListRequests, waitingPlacesMatrix
+from gluecksfee.output import ResultViews, getWriter
+from gluecksfee.readers import readRegistrations
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# n Personen, k Seminare, requests Anmeldungen pro Person, skew Popularität, groupSize inhaltliche
+# Gruppe, capacity Plätze/Anmeldungen; input/output: Format der Eingabe und Ausgabe
+CASES = {
+    'input':    dict(file=os.path.join(ROOT, 'input.xlsx'), output='.xlsx'),
+    'n100':     dict(n=100, k=8, requests=3, skew=0.5, groupSize=2, capacity=0.6, input='.xlsx', output='.xlsx'),
+    'n1000':    dict(n=1000, k=20, requests=3, skew=1.0, groupSize=3, capacity=0.5, input='.xlsx', output='.xlsx'),
+    'n10000':   dict(n=10000, k=40, requests=4, skew=1.0, groupSize=2, capacity=0.5, input='.xlsx', output='.xlsx'),
+    'n10000-flat': dict(n=10000, k=40, requests=2, skew=0.0, groupSize=1, capacity=1.2, input='.csv', output='.csv'),
+    'n100000':  dict(n=100000, k=60, requests=3, skew=1.2, groupSize=3, capacity=0.4, input='.csv', output='.parquet',
+                     sparse=True),
+    'n1000000': dict(n=1000000, k=100, requests=3, skew=1.0, groupSize=4, capacity=0.5, input='.parquet',
+                     output='.parquet', sparse=True, sampler='exponential', large=True),
+}
+
+#%% peak memory of a phase
+def resetPeak():
+    """Reset the peak RSS of the process (Linux only); returns False if not possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peakMB():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == 'darwin' else peak/1024
+
+class Phases:
+    def __init__(self):
+        self.results = {}
+
+    @contextmanager
+    def __call__(self, name):
+        resetPeak()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter()-start
+        peak = peakMB()
+        old = self.results.get(name)
+        if old is not None:
+            seconds, peak = min(seconds, old['seconds']), max(peak or 0, old['peakMB'] or 0) or None
+        self.results[name] = {'seconds': seconds, 'peakMB': peak}
+
+#%% a single case, run in its own process
+def runCase(name, spec, directory, repeat=1, sampler=None):
+    from synthetic import generateRegistrations, writeRegistrations
+    sampler = sampler or spec.get('sampler', 'legacy')
+    sparse = spec.get('sparse', False)
+    if 'file' in spec:
+        file = spec['file']
+    else:
+        params = {key: spec[key] for key in ['n', 'k', 'requests', 'skew', 'groupSize', 'capacity']}
+        file = writeRegistrations(os.path.join(directory, name+spec['input']), *generateRegistrations(**params))
+    output = os.path.join(directory, name+'_output'+spec['output'])
+
+    phases = Phases()
+    for _ in range(repeat):
+        with phases('parse'):
+            seminarNames, x, userid, places, inhaltlich = readRegistrations(file, sparse=sparse)
+            semTypes = hashSemTypes(inhaltlich)
+        with phases('assign'):
+            y = assignmentMatrix(x, places, semTypes, inhaltlich, seed=1, sampler=sampler)
+        with phases('waitlist'):
+            wx = waitingListRequests(x, y, semTypes)
+            _, order = waitingPlacesMatrix(wx, places, semTypes, inhaltlich, preAssigned=y.sum(axis=1, dtype='int'),
+                                           seed=1, sampler=sampler, seminarNames=seminarNames, userid=userid)
+        with phases('export'):
+            getWriter(output)(output, x, y, userid, seminarNames, places, [f'Benchmark {name}'], order=order,
+                              views=ResultViews(x, y))
+    return {'params': {**{key: v for key, v in spec.items() if key not in ('file', 'large')},
+                       'sampler': sampler, 'sparse': sparse},
+            'persons': int(x.shape[0]), 'seminars': int(x.shape[1]), 'registrations': int(np.count_nonzero(x) if isinstance(x, np.ndarray) else x.nnz),
+            'phases': phases.results}
+
+def runSuite(cases, repeat=1, sampler=None):
+    result = {'version': 1, 'date': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+              'cpus': os.cpu_count(), 'peakReset': resetPeak(), 'cases': {}}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        for name in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool: # fresh process: memory of this case only
+                result['cases'][name] = pool.submit(runCase, name, CASES[name], directory, repeat, sampler).result()
+            res = result['cases'][name]
+            print(f'{name:12s} n={res["persons"]:<8d} k={res["seminars"]:<4d} ' +
+                  '  '.join(f'{phase} {v["seconds"]:7.3f} s' for phase, v in res['phases'].items()), flush=True)
+    return result
+
+#%% comparison with the baseline
+def compare(result, baseline, tolerance=1.25, minSeconds=0.05):
+    """Print the ratio to the baseline per case and phase; returns the list of slower phases."""
+    slower = []
+    print(f'\n{"Fall":12s} {"Phase":9s} {"Zeit":>9s} {"Baseline":>9s} {"Faktor":>7s} {"Peak MB":>9s} {"Baseline":>9s}')
+    for name, res in result['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if base is None:
+            continue
+        if base['params'] != res['params']:
+            print(f'{name:12s} (andere Parameter als in der Baseline)')
+            continue
+        for phase, v in res['phases'].items():
+            b = base['phases'].get(phase)
+            if b is None:
+                continue
+            ratio = v['seconds']/b['seconds'] if b['seconds'] > 0 else np.inf
+            flag = ratio > tolerance and v['seconds'] > minSeconds
+            if flag:
+                slower.append((name, phase, ratio))
+            mem = lambda m: f'{m:9.1f}' if m is not None else f'{"-":>9s}'
+            print(f'{name:12s} {phase:9s} {v["seconds"]:9.3f} {b["seconds"]:9.3f} {ratio:7.2f} {mem(v["peakMB"])} '
+                  f'{mem(b["peakMB"])}{"  LANGSAMER" if flag else ""}')
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark-Suite der Auslosung mit synthetischen Eingaben")
+    parser.add_argument("--cases", nargs='+', choices=list(CASES), default=None,
+                        help="Auszuführende Fälle. Default: alle außer n1000000")
+    parser.add_argument("--all", action='store_true', help="Alle Fälle inkl. n1000000")
+    parser.add_argument("--repeat", type=int, default=1, help="Wiederholungen pro Fall. Default: 1")
+    parser.add_argument("--sampler", default=None, help="Sampler für alle Fälle. Default: wie im Fall angegeben")
+    parser.add_argument("-o", "--output", default=None, help="Ergebnis als JSON speichern")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline zum Vergleich. Default: benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", action='store_true', help="Speichert das Ergebnis als Baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="Faktor, ab dem eine Phase als langsamer gilt. Default: 1.25")
+    args = parser.parse_args()
+
+    cases = args.cases or [name for name, spec in CASES.items() if args.all or not spec.get('large')]
+    result = runSuite(cases, args.repeat, args.sampler)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+        return 0
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            slower = compare(result, json.load(f), args.tolerance)
+        return 1 if slower else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetische Anmeldungen für Benchmarks
+
+generateRegistrations erzeugt eine Eingabe mit n Personen und k Seminaren:
+  requests    mittlere Anzahl Anmeldungen pro Person (mind. 1, Poisson-verteilt)
+  skew        Popularität der Seminare ~ (Rang)^-skew, 0: alle gleich beliebt
+  groupSize   Anzahl inhaltlich gleicher Seminare pro Gruppe (Zeile "inhaltlich"),
+              z.B. 3 für die Termine A, B und C eines Seminars
+  capacity    Plätze insgesamt / Anmeldungen insgesamt, gleich auf die
+              Seminare verteilt (Zeile "Plaetze"); > 1 bedeutet genug Plätze
+Jede Person meldet sich für verschiedene Seminare an, gezogen proportional zur
+Popularität (Exponential-Keys, blockweise ohne die dichte Matrix n x k zu erzeugen).
+
+writeRegistrations schreibt die Eingabe im Format des Sheets 'registrierung'
+als .xlsx (xlsxwriter), .csv oder .parquet (pyarrow).
+
+@author: Tobias Hoßfeld
+
+"""
+
+import csv
+import os.path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gluecksfee.sparse import RegistrationMatrix, denseRowBlocks
+
+def generateRegistrations(n, k, requests=3, skew=1.0, groupSize=1, capacity=0.5, seed=1, blockSize=65536):
+    """Returns (seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich) as readRegistrations
+    with sparse=True."""
+    rng = np.random.default_rng(seed)
+    popularity = rng.permutation(np.arange(1, k+1, dtype='float32')**-skew)
+    counts = np.clip(1+rng.poisson(max(requests-1, 0), n), 1, k)
+
+    users, seminars = [], []
+    for start in range(0, n, blockSize):
+        c = counts[start:start+blockSize]
+        keys = rng.standard_exponential(size=(c.size, k), dtype='float32')/popularity # smallest keys first
+        m = c.max()
+        top = np.argpartition(keys, m-1, axis=1)[:, :m] if m < k else np.tile(np.arange(k), (c.size, 1))
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(keys, top, axis=1), axis=1), axis=1)
+        take = np.arange(m) < c[:, None]
+        users.append(np.nonzero(take)[0]+start)
+        seminars.append(top[take])
+    users, seminars = np.concatenate(users), np.concatenate(seminars)
+    x = RegistrationMatrix.fromCoordinates(users, seminars, np.ones(users.size, dtype='int'), (n, k))
+
+    inhaltlich = np.arange(k)//max(groupSize, 1)+1
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    seminarNames = np.array([f'Seminar {g}{letters[i % groupSize] if groupSize > 1 else ""}'
+                             for i, g in enumerate(inhaltlich)], dtype=object)
+    places = np.full(k, max(1, int(round(capacity*users.size/k))))
+    userid = np.array([f'P{u}' for u in range(n)], dtype=object)
+    return seminarNames, x, userid, places, inhaltlich
+
+def writeRegistrations(file, seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich):
+    """Write the registrations as sheet 'registrierung' (.xlsx), .csv or .parquet."""
+    header = ['Person', *seminarNames]
+    special = [['inhaltlich', *inhaltlich.tolist()], ['Plaetze', *np.asarray(numParticipantsPerSeminar).tolist()]]
+    ext = os.path.splitext(file)[1].lower()
+    if ext == '.xlsx':
+        import xlsxwriter
+        workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+        ws = workbook.add_worksheet('registrierung')
+        for r, row in enumerate([header]+special):
+            ws.write_row(r, 0, row)
+        for start, block in denseRowBlocks(x):
+            for j, row in enumerate(block.tolist()):
+                ws.write_string(start+j+3, 0, userid[start+j])
+                ws.write_row(start+j+3, 1, row)
+        workbook.close()
+    elif ext == '.csv':
+        with open(file, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f, delimiter=';')
+            w.writerows([header]+special)
+            for start, block in denseRowBlocks(x):
+                w.writerows([userid[start+j], *row] for j, row in enumerate(block.tolist()))
+    elif ext in ('.parquet', '.pq'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = [pa.array(['inhaltlich', 'Plaetze', *userid], type=pa.string())]
+        for i in range(x.shape[1]):
+            column = np.zeros(x.shape[0]+2, dtype='int64')
+            column[:2] = inhaltlich[i], numParticipantsPerSeminar[i]
+            users, values = x.column(i)
+            column[users+2] = values
+            columns.append(pa.array(column))
+        pq.write_table(pa.Table.from_arrays(columns, names=[str(v) for v in header]), file)
+    else:
+        raise ValueError(f'Unknown input format "{ext}"')
+    return file
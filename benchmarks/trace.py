@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Zusätzliche Laufzeit des Traces (gluecksfee.trace) für Auslosung und Warteliste
+einer synthetischen Eingabe mit n Personen und k Seminaren
+
+Für jeden Sampler wird die Auslosung ohne Trace und mit Trace als JSONL bzw.
+Parquet ausgeführt (bester Wert aus mehreren Wiederholungen); die Zuweisung
+muss in allen Fällen identisch sein.
+
+    python benchmarks/trace.py [-n 100000] [-k 60] [--repeat 3]
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gluecksfee.lottery import assignmentMatrix, hashSemTypes, waitingListRequests, waitingPlacesMatrix
+from gluecksfee.sparse import RegistrationMatrix
+from gluecksfee.trace import openTrace
+
+def syntheticInput(n, k, requests=3, seed=1):
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(n), requests)
+    users, seminars = np.unique(np.stack((users, rng.integers(0, k, users.size))), axis=1)
+    x = RegistrationMatrix.fromCoordinates(users, seminars, np.ones(users.size, dtype='int'), (n, k))
+    inhaltlich = rng.integers(0, k//2+1, k)
+    return x, np.full(k, max(1, n*requests//k//2)), inhaltlich
+
+def draw(x, places, inhaltlich, sampler, trace=None):
+    semTypes = hashSemTypes(inhaltlich)
+    y = assignmentMatrix(x, places, semTypes, inhaltlich, seed=1, sampler=sampler, trace=trace)
+    wx = waitingListRequests(x, y, semTypes)
+    waitingPlacesMatrix(wx, places, semTypes, inhaltlich, preAssigned=y.sum(axis=1, dtype='int'),
+                        seed=1, sampler=sampler, trace=trace)
+    if trace is not None:
+        trace.close()
+    return y
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des Traces der Auslosung")
+    parser.add_argument("-n", type=int, default=100000, help="Anzahl Personen. Default: 100000")
+    parser.add_argument("-k", type=int, default=60, help="Anzahl Seminare. Default: 60")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen. Default: 3")
+    args = parser.parse_args()
+
+    x, places, inhaltlich = syntheticInput(args.n, args.k)
+    print(f'n={args.n}, k={args.k}, Anmeldungen={x.nnz}')
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        for sampler in ['legacy', 'exponential']:
+            t0, ref = np.inf, None
+            for ext in [None, '.jsonl', '.parquet']:
+                best = np.inf
+                for _ in range(args.repeat):
+                    try:
+                        trace = openTrace(os.path.join(directory, 'trace'+ext)) if ext else None
+                    except ImportError as e:
+                        print(f'{sampler:12s} {ext:9s} ({e})')
+                        break
+                    start = time.perf_counter()
+                    y = draw(x, places, inhaltlich, sampler, trace)
+                    best = min(best, time.perf_counter()-start)
+                else:
+                    if ext is None:
+                        t0, ref = best, y
+                        print(f'{sampler:12s} {"-":9s} {best:8.3f} s')
+                        continue
+                    same = np.array_equal(ref.toDense(), y.toDense())
+                    ok &= same
+                    size = os.path.getsize(os.path.join(directory, 'trace'+ext)) / 2**20
+                    print(f'{sampler:12s} {ext:9s} {best:8.3f} s  +{(best-t0)/t0*100:5.1f}%  {size:7.1f} MB'
+                          f'{"" if same else "  ABWEICHUNG"}')
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleich der Writer aus gluecksfee.output: Laufzeit und maximaler zusätzlicher
+Speicher beim Schreiben der Ausgabe für eine synthetische Auslosung mit n
+Personen und k Seminaren. Der Speicher wird in einem zweiten Durchlauf mit
+tracemalloc gemessen, da tracemalloc die Laufzeit verfälscht.
+
+Anmeldungen und Zuweisung liegen als RegistrationMatrix vor, damit nur der
+Speicherbedarf des Writers gemessen wird.
+
+    python benchmarks/writers.py [-n 20000] [-k 30] [--writers pandas xlsx csv parquet]
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gluecksfee.output import WRITERS, EXTENSIONS
+from gluecksfee.sparse import RegistrationMatrix
+
+def syntheticDraw(n, k, requests=3, seed=1):
+    """Registrations x, assignment y (half of the requests) and waiting lists as in Lottery."""
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(n), requests)
+    seminars = rng.integers(0, k, users.size)
+    users, seminars = np.unique(np.stack((users, seminars)), axis=1)
+    x = RegistrationMatrix.fromCoordinates(users, seminars, np.ones(users.size, dtype='int'), (n, k))
+    chosen = rng.random(users.size) < 0.5
+    y = RegistrationMatrix.fromCoordinates(users[chosen], seminars[chosen], np.ones(chosen.sum(), dtype='int'), (n, k))
+    userid = np.array([f'P{u}' for u in range(n)], dtype=object)
+    seminarNames = np.array([f'Seminar {i}' for i in range(k)], dtype=object)
+    order = {seminarNames[i]: userid[rng.permutation(x.registered(i))] for i in range(k)}
+    return x, y, userid, seminarNames, [max(1, n*requests//k//2)]*k, order
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Writer für die Ausgabe")
+    parser.add_argument("-n", type=int, default=20000, help="Anzahl Personen. Default: 20000")
+    parser.add_argument("-k", type=int, default=30, help="Anzahl Seminare. Default: 30")
+    parser.add_argument("--writers", nargs='+', default=list(WRITERS), choices=list(WRITERS),
+                        help="Zu vergleichende Writer. Default: alle")
+    args = parser.parse_args()
+
+    draw = syntheticDraw(args.n, args.k)
+    ext = {w: e for e, w in EXTENSIONS.items()}
+    print(f'n={args.n}, k={args.k}')
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.writers:
+            file = os.path.join(directory, 'output'+ext.get(name, '.xlsx'))
+            write = lambda: WRITERS[name](file, *draw[:5], ['Benchmark'], order=draw[5])
+            start = time.perf_counter()
+            try:
+                write()
+            except ImportError as e:
+                print(f'{name:10s} ({e})')
+                continue
+            t = time.perf_counter()-start
+            tracemalloc.start()
+            write()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{name:10s} {t:8.2f} s  {peak/2**20:8.1f} MB')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+SeKo Gluecksfee: gemeinsame Bausteine der Skripte gluecksfee2.py und gluecksfee3.py
+
+Als Bibliothek:
+
+    from gluecksfee import Lottery
+    lottery = Lottery(seed='Seminare 2021').load('input.xlsx')
+    lottery.assign(); lottery.waitlist(); lottery.export('output.xlsx')
+
+Der Import lädt nichts weiter; gluecksfee.lottery (mit numpy) wird beim ersten
+Zugriff auf einen der Namen geladen, pandas und xlsxwriter erst beim Einlesen
+bzw. Schreiben. So lassen sich auch die Module des Pakets mit python -m starten,
+z.B. python -m gluecksfee.sampler.
+
+@author: Tobias Hoßfeld
+
+"""
+
+__all__ = ['Lottery', 'seedFromString', 'hashSemTypes', 'readExcelFile',
+           'assignmentMatrix', 'waitingListRequests', 'waitingPlacesMatrix']
+
+def __getattr__(name):
+    """Names of gluecksfee.lottery, imported on first use."""
+    if name in __all__:
+        from gluecksfee import lottery
+        return getattr(lottery, name)
+    raise AttributeError(f"module 'gluecksfee' has no attribute '{name}'")
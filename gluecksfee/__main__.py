@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""python -m gluecksfee: Auslosung mit Warteliste wie gluecksfee3.py"""
+
+from gluecksfee.cli import main
+
+if __name__ == "__main__":
+    main()
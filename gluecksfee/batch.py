@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Auslosung vieler Eingaben auf einmal, z.B. pro Fakultät und Semester
+
+Statt gluecksfee3.py für jede Eingabe einzeln zu starten, werden alle Eingaben
+eines Verzeichnisses (.xlsx, .csv, .parquet) oder einer Manifest-Datei in einem
+Prozesspool ausgelost. Die Prozesse importieren numpy, die Reader und Writer
+einmal beim Start und losen danach nacheinander mehrere Eingaben aus; die
+größten Eingaben werden zuerst verteilt.
+
+Das Manifest ist eine CSV-Datei (Trennzeichen , ; oder Tab) mit den Spalten
+Eingabe und optional Ausgabe, Seed und Maximum; relative Pfade beziehen sich auf
+das Verzeichnis des Manifests. Ohne Seed wird f'{seed}/{Dateiname}' genutzt,
+ohne Maximum --maximum. Jede Auslosung wird wie mit gluecksfee3.py in ihre
+Ausgabe geschrieben (Default: <Ausgabeverzeichnis>/<Name>_output.xlsx).
+
+Die Zusammenfassung (Sheet Batch, Default batch_summary.xlsx im
+Ausgabeverzeichnis) enthält pro Eingabe Personen, Seminare, Anmeldungen, Plätze,
+vergebene Plätze, Auslastung der Plätze, Anteil der Personen mit mind. einem
+Seminar, mittleres Verhältnis zugewiesen/angemeldet und die Laufzeit sowie eine
+Zeile über alle Eingaben.
+
+    python -m gluecksfee.batch inputs/ -s "WS 2022" -m 2 --workers 8
+    python -m gluecksfee.batch manifest.csv
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from datetime import datetime
+import os
+import time
+
+import numpy as np
+
+from gluecksfee.lottery import Lottery
+from gluecksfee.readers import EXTENSIONS as INPUTS
+
+COLUMNS = ['Eingabe', 'Ausgabe', 'Seed', 'Maximum', 'Personen', 'Seminare', 'Anmeldungen', 'Plaetze',
+           'Vergeben', 'Auslastung', 'Mind. ein Seminar', 'Ratio', 'Warteplaetze', 'Laufzeit', 'Fehler']
+
+#%% inputs
+def readManifest(file, seed, maximum, outputDir=None):
+    """Jobs (input, output, seed, maximum) of a manifest CSV with the columns Eingabe, Ausgabe, Seed, Maximum."""
+    base = os.path.dirname(os.path.abspath(file))
+    with open(file, newline='', encoding='utf-8-sig') as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+        f.seek(0)
+        rows = list(csv.DictReader(f, dialect=dialect))
+    jobs = []
+    for line, row in enumerate(rows, 2):
+        row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key is not None}
+        if not row.get('eingabe'):
+            raise ValueError(f'Line {line} of {file}: the column Eingabe is missing or empty')
+        file_ = os.path.join(base, row['eingabe'])
+        output = os.path.join(base, row['ausgabe']) if row.get('ausgabe') else None
+        jobs.append(job(file_, output, row.get('seed') or None, int(row['maximum']) if row.get('maximum') else None,
+                        seed, maximum, outputDir))
+    return jobs
+
+def readDirectory(directory, seed, maximum, outputDir=None):
+    """Jobs of all inputs (.xlsx, .csv, .parquet) of a directory, in the order of the file names."""
+    names = sorted(name for name in os.listdir(directory) if os.path.splitext(name)[1].lower() in INPUTS
+                   and not name.startswith('~$') and os.path.isfile(os.path.join(directory, name)))
+    return [job(os.path.join(directory, name), None, None, None, seed, maximum, outputDir) for name in names]
+
+def job(file, output, seed, maximum, defaultSeed, defaultMaximum, outputDir=None):
+    name = os.path.splitext(os.path.basename(file))[0]
+    if output is None:
+        output = os.path.join(outputDir or os.path.dirname(file), f'{name}_output.xlsx')
+    return {'input': file, 'output': output, 'seed': seed if seed is not None else f'{defaultSeed}/{os.path.basename(file)}',
+            'maximum': maximum if maximum is not None else defaultMaximum}
+
+#%% one draw, run in a worker
+_options = {}
+
+def _initWorker(options):
+    """Import the readers and writers once per worker."""
+    global _options
+    _options = options
+    import xlsxwriter # noqa: F401
+    import gluecksfee.output # noqa: F401
+
+def runJob(job):
+    """Draw one input and write its output; returns the row of the summary."""
+    start = time.perf_counter()
+    row = {'Eingabe': job['input'], 'Ausgabe': job['output'], 'Seed': job['seed'], 'Maximum': job['maximum']}
+    try:
+        lottery = Lottery(seed=job['seed'], maximum=job['maximum'], sampler=_options.get('sampler', 'legacy'),
+                          sparse=_options.get('sparse', False), rng=_options.get('rng', 'legacy')).load(job['input'])
+        lottery.assign()
+        if _options.get('waitlist', True):
+            lottery.waitlist()
+        os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+        lottery.export(job['output'])
+        row.update(summaryRow(lottery))
+        lottery.close()
+    except Exception as e: # the other inputs are still drawn
+        row['Fehler'] = f'{type(e).__name__}: {e}'
+    row['Laufzeit'] = time.perf_counter()-start
+    return row
+
+def summaryRow(lottery):
+    views = lottery.views()
+    requested, assigned = np.asarray(views.requested).ravel(), np.asarray(views.assigned).ravel()
+    hasRequest = requested > 0
+    places = np.asarray(lottery.numParticipantsPerSeminar, dtype='float')
+    return {'Personen': int(hasRequest.sum()), 'Seminare': len(lottery.seminarNames),
+            'Anmeldungen': int(requested.sum()), 'Plaetze': int(places.sum()),
+            'Vergeben': int(views.teilnehmer.sum()),
+            'Auslastung': views.teilnehmer.sum()/places.sum() if places.sum() > 0 else None,
+            'Mind. ein Seminar': float((assigned[hasRequest] > 0).mean()) if hasRequest.any() else None,
+            'Ratio': float(np.mean(assigned[hasRequest]/requested[hasRequest])) if hasRequest.any() else None,
+            'Warteplaetze': sum(len(v) for v in lottery.order.values()) if lottery.order is not None else None}
+
+def totalRow(rows):
+    """Row over all inputs: sums, the fill rate of all places and the coverage over all persons."""
+    ok = [row for row in rows if not row.get('Fehler')]
+    total = {key: sum(row[key] for row in ok) for key in ['Personen', 'Seminare', 'Anmeldungen', 'Plaetze', 'Vergeben']}
+    total['Auslastung'] = total['Vergeben']/total['Plaetze'] if total['Plaetze'] else None
+    persons = sum(row['Personen'] for row in ok if row['Mind. ein Seminar'] is not None)
+    total['Mind. ein Seminar'] = sum(row['Personen']*row['Mind. ein Seminar'] for row in ok if row['Mind. ein Seminar'] is not None)/persons if persons else None
+    total['Ratio'] = sum(row['Personen']*row['Ratio'] for row in ok if row['Ratio'] is not None)/persons if persons else None
+    total['Warteplaetze'] = sum(row['Warteplaetze'] or 0 for row in ok)
+    total['Laufzeit'] = sum(row['Laufzeit'] for row in rows)
+    total['Fehler'] = f'{len(rows)-len(ok)} Fehler' if len(ok) < len(rows) else None
+    return {'Eingabe': f'Gesamt ({len(rows)} Eingaben)', **total}
+
+#%% all jobs
+def runBatch(jobs, workers=None, **options):
+    """Draw all jobs on a process pool; returns the summary rows in the order of the jobs."""
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    order = sorted(range(len(jobs)), key=lambda j: -os.path.getsize(jobs[j]['input']) if os.path.isfile(jobs[j]['input']) else 0)
+    rows = [None]*len(jobs)
+    if workers <= 1:
+        _initWorker(options)
+        for j in order:
+            rows[j] = runJob(jobs[j])
+            _progress(rows[j])
+        return rows
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(options,)) as pool:
+        futures = {pool.submit(runJob, jobs[j]): j for j in order}
+        for future, j in futures.items():
+            rows[j] = future.result()
+            _progress(rows[j])
+    return rows
+
+def _progress(row):
+    if row.get('Fehler'):
+        print(f'{row["Eingabe"]}: {row["Fehler"]}', flush=True)
+    else:
+        share = row['Mind. ein Seminar']
+        share = f'{share*100:.1f}% mit mind. einem Seminar' if share is not None else 'keine Anmeldungen'
+        print(f'{row["Eingabe"]} -> {row["Ausgabe"]}: {row["Vergeben"]}/{row["Plaetze"]} Plätze, '
+              f'{share} ({row["Laufzeit"]:.2f} s)', flush=True)
+
+def writeSummary(file, rows, parameters=()):
+    from gluecksfee.output import writeSheets
+    table = rows + [totalRow(rows)]
+    writeSheets(file, [('Batch', COLUMNS, ((None, [row.get(c) for c in COLUMNS]) for row in table), False),
+                       ('Parameters', ['Parameter'], ((None, [p]) for p in parameters), False)])
+    return file
+
+#%%
+def main(argv=None):
+    from gluecksfee.cli import str2bool
+    from gluecksfee.sampler import SAMPLERS
+    from gluecksfee.streams import RNG_MODES
+    now = datetime.now()
+    parser = argparse.ArgumentParser(description="Auslosung vieler Eingaben in einem Prozesspool")
+    parser.add_argument("inputs", help="Verzeichnis mit den Eingaben (.xlsx, .csv, .parquet) oder Manifest (.csv mit den Spalten Eingabe, Ausgabe, Seed, Maximum)")
+    parser.add_argument("-s", "--seed", default=now.strftime("%m/%d/%Y, %H:%M:%S"),
+                        help="Seed für Eingaben ohne eigenen Seed, Eingabe x nutzt SEED/x")
+    parser.add_argument("-m", "--maximum", type=int, default=999,
+                        help="Maximale Anzahl von Seminaren pro Person für Eingaben ohne eigenes Maximum. Default: 999")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="Verzeichnis der Ausgaben ohne eigene Ausgabe. Default: Verzeichnis der Eingabe")
+    parser.add_argument("--summary", default=None,
+                        help="Zusammenfassung aller Auslosungen. Default: batch_summary.xlsx im Ausgabeverzeichnis")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl der Prozesse. Default: Anzahl der CPUs")
+    parser.add_argument("--waitlist", type=str2bool, nargs='?', const=True, default=True,
+                        help="Wartelisten wie gluecksfee3.py berechnen (True or False). Default: True")
+    parser.add_argument("--sampler", choices=list(SAMPLERS), default="legacy", help="s. gluecksfee3.py. Default: legacy")
+    parser.add_argument("--rng", choices=list(RNG_MODES), default="legacy", help="s. gluecksfee3.py. Default: legacy")
+    parser.add_argument("--sparse", type=str2bool, nargs='?', const=True, default=False, help="s. gluecksfee3.py. Default: False")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.inputs):
+        jobs = readDirectory(args.inputs, args.seed, args.maximum, args.output_dir)
+        directory = args.output_dir or args.inputs
+    else:
+        jobs = readManifest(args.inputs, args.seed, args.maximum, args.output_dir)
+        directory = args.output_dir or os.path.dirname(os.path.abspath(args.inputs))
+    if not jobs:
+        print(f'Keine Eingaben in {args.inputs}')
+        return 1
+    print(f'{len(jobs)} Eingaben, Seed "{args.seed}", Sampler {args.sampler}\n')
+    start = time.perf_counter()
+    rows = runBatch(jobs, args.workers, sampler=args.sampler, rng=args.rng, sparse=args.sparse, waitlist=args.waitlist)
+    summary = args.summary or os.path.join(directory, 'batch_summary.xlsx')
+    os.makedirs(os.path.dirname(os.path.abspath(summary)), exist_ok=True)
+    writeSummary(summary, rows, [f'Eingaben: {args.inputs}', f'Seed für Zufallszahlen: "{args.seed}"',
+                                 f'Maximale #Seminare: {args.maximum}', f'Sampler: {args.sampler}', f'RNG: {args.rng}',
+                                 f'Sparse: {args.sparse}', f'Warteliste: {args.waitlist}', f'Prozesse: {args.workers or os.cpu_count()}',
+                                 f'Laufzeit: {time.perf_counter()-start:.3f} s'])
+    print(f'\nZusammenfassung gespeichert in {summary}')
+    return 1 if any(row.get('Fehler') for row in rows) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Vektorisierte Auslosung für R Replikationen gleichzeitig
+
+batchedAssignment führt die Runden von assignmentMatrix für R unabhängige
+Auslosungen gleichzeitig aus. Der Zustand jeder Replikation (Anzahl zugewiesener
+Seminare pro Person, offene Anmeldungen, Anfragen pro Seminar) liegt in
+gestapelten Arrays R x n bzw. R x k; pro Runde wählt jede Replikation ihr
+nächstes (am wenigsten nachgefragtes) Seminar, die Gewichte
+curMax+addToLowest-assigned (x at_least_one_seminar_prob_factor für Personen
+ohne Seminar) werden für alle Replikationen gemeinsam berechnet und die
+Teilnehmer mit Exponential-Keys (s. gluecksfee.sampler) gezogen.
+
+Die Replikationen haben die gleiche Verteilung wie assignmentMatrix mit dem
+Sampler 'exponential', nutzen aber einen numpy Generator und sind daher nicht
+mit einzelnen Seeds der Skripte reproduzierbar. at_least_one_seminar_prob_factor
+kann pro Replikation angegeben werden, um den Parameter zu untersuchen.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import numpy as np
+
+from gluecksfee.lottery import groupIndex
+from gluecksfee.sparse import asColumns
+
+#%%
+def batchedAssignment(matrix, numParticipantsPerSeminar, semTypes, inhaltlich, replicas,
+                      maxSeminarsAssignedPerParticipant=999,
+                      at_least_one_seminar_prob_factor=100.0,
+                      seed=None, addToLowest=1.0):
+    """Run `replicas` draws at once; returns the number of assigned seminars per
+    replica and user (R x n) and the assigned places per replica and seminar (R x k)."""
+    x = asColumns(matrix)
+    rng = np.random.default_rng(seed)
+    R = replicas
+    n, k = x.shape
+    places = np.asarray(numParticipantsPerSeminar, dtype='int64')
+    factor = np.broadcast_to(np.asarray(at_least_one_seminar_prob_factor, dtype='float'), (R,))[:,None]
+    group = groupIndex(semTypes, k)
+
+    # the seminars per user (CSR) and the position of each of these entries in x (CSC)
+    seminarOfEntry = np.repeat(np.arange(k), np.diff(x.indptr))
+    rowOrder = np.lexsort((seminarOfEntry, x.indices))
+    rowptr = np.zeros(n+1, dtype='int64')
+    np.cumsum(np.bincount(x.indices, minlength=n), out=rowptr[1:])
+    rowLength = np.diff(rowptr)
+
+    active = np.repeat((x.data != 0)[None,:], R, axis=0) # open requests per replica and entry of x
+    demand = np.repeat(x.sum(axis=0)[None,:], R, axis=0) # requests per replica and seminar
+    assigned = np.zeros((R, n), dtype='int64')
+    filled = np.zeros((R, k), dtype='int64')
+    done = np.zeros((R, k), dtype=bool)
+    rows = np.arange(R)
+
+    for _ in range(k):
+        # next (least popular) seminar per replica, ties are broken by the smaller index
+        i = np.argmin(np.where(done, np.iinfo('int64').max, demand), axis=1)
+        done[rows, i] = True
+
+        # registered users of seminar i per replica, padded to the longest column
+        start, length = x.indptr[i], np.diff(x.indptr)[i]
+        M = length.max()
+        if M == 0:
+            continue
+        slot = np.arange(M)[None,:]
+        valid = slot < length[:,None]
+        pos = np.where(valid, start[:,None]+slot, 0)
+        users = x.indices[pos]
+        registered = valid & active[rows[:,None], pos] & (x.data[pos] > 0)
+        registered &= assigned[rows[:,None], users] < maxSeminarsAssignedPerParticipant
+
+        # weights as in assignmentMatrix and top-k with exponential keys
+        a = assigned[rows[:,None], users]
+        curMax = np.max(np.where(registered, a, 0), axis=1, keepdims=True)
+        p = (curMax+addToLowest-a).astype('float')
+        p = np.where(a == 0, p*factor, p)
+        with np.errstate(divide='ignore'):
+            keys = np.where(registered, rng.exponential(size=p.shape)/p, np.inf)
+        cap = places[i]
+        full = registered.sum(axis=1) > cap
+        select = registered.copy()
+        if full.any():
+            c = cap[full]
+            kth = np.sort(keys[full], axis=1)[np.arange(c.size), np.maximum(c-1, 0)]
+            kth[c == 0] = -np.inf
+            select[full] &= keys[full] <= kth[:,None]
+
+        r, s = np.nonzero(select)
+        u = users[r, s]
+        assigned[r, u] += 1
+        filled[rows, i] = select.sum(axis=1)
+
+        # delete other, content-wise related seminars from the requests of the selected users
+        L = rowLength[u].max() if u.size else 0
+        if L == 0:
+            continue
+        slot = np.arange(L)[None,:]
+        validRow = slot < rowLength[u][:,None]
+        entry = rowOrder[np.where(validRow, rowptr[u][:,None]+slot, 0)] # position in x
+        remove = validRow & (group[seminarOfEntry[entry]] == group[i[r]][:,None]) & active[r[:,None], entry]
+        rr, ee = np.broadcast_to(r[:,None], entry.shape)[remove], entry[remove]
+        np.subtract.at(demand, (rr, seminarOfEntry[ee]), x.data[ee])
+        active[rr, ee] = False
+
+    return assigned, filled
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Cache der eingelesenen Anmeldungen, adressiert über den SHA-256 der Eingabedatei
+
+Wird die Auslosung mehrfach mit der gleichen Eingabe ausgeführt (andere Seeds,
+Parameter, Berichte), muss die Datei nur beim ersten Mal geparst werden. Jeder
+Eintrag ist ein Verzeichnis <Cache>/<Schlüssel>/ mit
+  indptr.npy, indices.npy, data.npy   Anmeldungen spaltenweise (RegistrationMatrix)
+  userid.npy, seminarNames.npy        Personen und Seminare (falls möglich als .npy)
+  meta.json                           Plaetze, inhaltlich, hashSemTypes und Formatversion
+Die .npy-Dateien werden beim Laden nur lesend in den Speicher abgebildet (mmap).
+
+Der Schlüssel enthält den SHA-256 des Dateiinhalts, den Reader und die
+Formatversion CACHE_VERSION: eine geänderte Datei ergibt einen neuen Eintrag,
+alte Einträge werden nicht mehr getroffen und bei Überschreiten von maxBytes
+als am längsten nicht genutzte Einträge gelöscht.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from gluecksfee.sparse import RegistrationMatrix, asColumns
+
+CACHE_VERSION = 2 # 2: persons are kept as text by the row readers
+
+def defaultCacheDir():
+    return os.environ.get('GLUECKSFEE_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'gluecksfee')
+
+def fileHash(file, blockSize=1 << 20):
+    h = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+#%% values of the special rows and labels: JSON keeps int, float, str and None apart
+def _toJson(v):
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+def _encode(a):
+    kind = 'list' if isinstance(a, list) else ('int' if np.issubdtype(np.asarray(a).dtype, np.integer) else 'object')
+    return {'type': kind, 'values': [_toJson(v) for v in a]}
+
+def _decode(d):
+    if d['type'] == 'list':
+        return d['values']
+    return np.array(d['values'], dtype='int' if d['type'] == 'int' else object)
+
+def _saveLabels(directory, name, labels):
+    """Store ids/names as .npy if they are all int or all str, otherwise in meta.json."""
+    values = [_toJson(v) for v in labels]
+    for kind, dtype in [(int, 'int64'), (str, 'U')]:
+        if all(type(v) is kind for v in values):
+            np.save(os.path.join(directory, name+'.npy'), np.array(values, dtype=dtype))
+            return None
+    return _encode(np.array(values, dtype=object))
+
+def _loadLabels(directory, name, meta):
+    if meta.get(name) is not None:
+        return _decode(meta[name])
+    values = np.load(os.path.join(directory, name+'.npy'), mmap_mode='r')
+    return values.astype(object) if values.dtype.kind == 'U' else np.array(values, dtype=object)
+
+#%%
+class InputCache:
+    def __init__(self, directory=None, maxBytes=1 << 30):
+        self.directory = directory or defaultCacheDir()
+        self.maxBytes = maxBytes
+
+    def key(self, file, reader=None, defaultNumberParticipantsPerSeminar=12):
+        from gluecksfee.readers import getReader
+        reader = getReader(file, reader).__name__
+        return f'{fileHash(file)}-{reader}-{defaultNumberParticipantsPerSeminar}-v{CACHE_VERSION}'
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key, sparse=False):
+        """Returns (seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich, semTypes) or None."""
+        directory = self.path(key)
+        if not os.path.isdir(directory):
+            return None
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['version'] != CACHE_VERSION:
+                raise ValueError('outdated cache entry')
+            load = lambda name: np.load(os.path.join(directory, name+'.npy'), mmap_mode='r')
+            x = RegistrationMatrix(load('indptr'), load('indices'), load('data'), meta['shape'])
+            res = (_loadLabels(directory, 'seminarNames', meta), x if sparse else x.toDense(),
+                   _loadLabels(directory, 'userid', meta), _decode(meta['numParticipantsPerSeminar']),
+                   _decode(meta['inhaltlich']),
+                   {k: np.array(v, dtype='int64') for k, v in meta['semTypes']})
+        except (OSError, ValueError, KeyError, TypeError): # damaged (e.g. a missing file) or outdated entry
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        os.utime(directory) # last access for the eviction
+        return res
+
+    def store(self, key, seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich, semTypes):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            x = asColumns(x)
+            for name in ['indptr', 'indices', 'data']:
+                np.save(os.path.join(tmp, name+'.npy'), getattr(x, name))
+            meta = {'version': CACHE_VERSION, 'shape': list(x.shape),
+                    'seminarNames': _saveLabels(tmp, 'seminarNames', seminarNames),
+                    'userid': _saveLabels(tmp, 'userid', userid),
+                    'numParticipantsPerSeminar': _encode(numParticipantsPerSeminar),
+                    'inhaltlich': _encode(inhaltlich),
+                    'semTypes': [[_toJson(k), v.tolist()] for k, v in semTypes.items()]}
+            with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp, self.path(key))
+            except OSError: # stored by another process in the meantime
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """(last access, size in bytes, key) of all entries."""
+        res = []
+        if not os.path.isdir(self.directory):
+            return res
+        for key in os.listdir(self.directory):
+            directory = self.path(key)
+            if key.startswith('.tmp-') or not os.path.isdir(directory):
+                continue
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            res.append((os.path.getmtime(directory), size, key))
+        return res
+
+    def evict(self, keep=None):
+        """Delete the least recently used entries until the cache fits into maxBytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.maxBytes:
+                break
+            if key != keep:
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+#%%
+def readCached(file, cache, reader=None, defaultNumberParticipantsPerSeminar=12, sparse=False):
+    """readRegistrations through the cache; also returns the hashSemTypes grouping.
+    Returns (seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich, semTypes)."""
+    from gluecksfee.lottery import hashSemTypes
+    from gluecksfee.readers import readRegistrations
+    key = cache.key(file, reader, defaultNumberParticipantsPerSeminar)
+    res = cache.load(key, sparse=sparse)
+    if res is None:
+        res = readRegistrations(file, reader=reader, defaultNumberParticipantsPerSeminar=defaultNumberParticipantsPerSeminar, sparse=sparse)
+        res = res + (hashSemTypes(res[4]),)
+        cache.store(key, *res)
+    return res
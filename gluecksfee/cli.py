@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Kommandozeile der SeKo Gluecksfee
+
+gluecksfee3.py (Auslosung mit Warteliste), gluecksfee2.py (ohne Warteliste) und
+`python -m gluecksfee` rufen main auf; die Auslosung selbst steckt in
+gluecksfee.lottery.Lottery. pandas und die Simulation werden erst bei Bedarf
+importiert, damit z.B. `-h` schnell antwortet.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+from datetime import datetime
+import os.path
+
+from gluecksfee.lottery import Lottery
+from gluecksfee.output import WRITERS
+from gluecksfee.pipeline import TARGETS, defaultSheets, plan, splitNames
+from gluecksfee.readers import READERS
+from gluecksfee.sampler import SAMPLERS
+from gluecksfee.streams import RNG_MODES
+
+#%% Parse Input Arguments
+def str2bool(v):
+    if isinstance(v, bool):
+        return v
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    elif v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+def buildParser(verboseDefault=False):
+    now = datetime.now()
+    parser = argparse.ArgumentParser(description="SeKo Gluecksfee zur Seminarteilnehmer Auslosung")
+    parser.add_argument("-s", "--seed",
+                        help="randomly initialize the random number generator with that seed",
+                        default=now.strftime("%m/%d/%Y, %H:%M:%S"))
+    parser.add_argument("-i", "--input",
+                        help="Name des Excel-Files zur Eingabe (auch .csv oder .parquet)",
+                        default="input.xlsx")
+    parser.add_argument("--reader", choices=list(READERS), default=None,
+                        help="Verfahren zum Einlesen der Eingabe: xlsx (zeilenweise, ohne pandas), csv, parquet oder pandas (pandas.read_excel, bisheriger Weg). Default: nach Dateiendung, sonst pandas")
+    parser.add_argument("--cache", nargs='?', const='', default=None,
+                        help="Speichert die eingelesene Eingabe im angegebenen Verzeichnis (Default: ~/.cache/gluecksfee bzw. $GLUECKSFEE_CACHE) und lädt sie bei gleichem Dateiinhalt von dort. Default: kein Cache")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="Maximale Größe des Caches in MB, die am längsten nicht genutzten Einträge werden gelöscht. Default: 1024")
+    parser.add_argument("-o", "--output",
+                        help="Die Ausgabe wird im angebenen Excel File gespeichert. Default: output.xlsx",
+                        default="output.xlsx")
+    parser.add_argument("--writer", choices=list(WRITERS), default=None,
+                        help="Verfahren zum Schreiben der Ausgabe: xlsx (zeilenweise mit konstantem Speicherbedarf), csv bzw. parquet (eine Datei pro Sheet: OUTPUT_<Sheet>.csv) oder pandas (DataFrame.to_excel, bisheriger Weg). Default: nach Dateiendung, sonst xlsx")
+    parser.add_argument("-m", "--maximum",
+                        help="Die maximale Anzahl von Seminaren, die pro Person zugewiesen wird. Default: 999",
+                        default=999, type=int)
+
+    parser.add_argument("-v", "--verbose",  type=str2bool, nargs='?',
+                            const=True, default=verboseDefault,
+                        help="Gibt eine ausführliche Ausgabe auf der Konsole aus (True or False). Default: True")
+    parser.add_argument("--summary", type=int, default=None,
+                        help="Anzahl der Personen und Seminare in der Zusammenfassung auf der Konsole bei --verbose, 0: keine Zusammenfassung. Default: alle")
+    parser.add_argument("--trace", default=None,
+                        help="Schreibt ein Protokoll jeder Runde der Auslosung (Angemeldete, Gewichte, Gezogene, Zustand des Zufallsgenerators) in die angegebene Datei (.jsonl oder .parquet); Bericht mit python -m gluecksfee.trace TRACE. Default: kein Trace")
+    parser.add_argument("--profile", nargs='?', const='', default=None,
+                        help="Misst Laufzeit und Speicher jeder Phase (Einlesen, Auslosung pro Runde, Warteliste, jedes Sheet) und speichert den Bericht als JSON in der angegebenen Datei. Default ohne Dateiname: OUTPUT_profile.json")
+    parser.add_argument("--metrics", nargs='?', const='', default=None,
+                        help="Berechnet Kennzahlen der Fairness (Anteil mit mind. 1 Seminar, Jain-Index und Gini von ratio, Histogramm der zugewiesenen Seminare, Überbuchung pro Seminar), bei --simulate über alle Durchläufe; Sheet Metrics in der Ausgabe und JSON in der angegebenen Datei. Default ohne Dateiname: OUTPUT_metrics.json")
+    parser.add_argument("--sparse",  type=str2bool, nargs='?',
+                            const=True, default=False,
+                        help="Speichert Anmeldungen und Zuweisungen spaltenweise (sparse), der Speicherbedarf wächst mit der Anzahl der Anmeldungen statt mit #Personen x #Seminare (True or False). Default: False")
+    parser.add_argument("--simulate", type=int, default=0,
+                        help="Monte-Carlo-Simulation: die Auslosung wird für N abgeleitete Seeds wiederholt und eine Zusammenfassung in der Ausgabe gespeichert. Default: 0 (eine Auslosung)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Anzahl der Prozesse für --simulate bzw. für die Warteliste mit --rng streams. Default: Anzahl der CPUs bei --simulate, sonst 1")
+    parser.add_argument("--replicas", type=int, default=0,
+                        help="Berechnet bei --simulate jeweils R Auslosungen gleichzeitig mit dem vektorisierten Kern (schneller, Durchläufe nicht einzeln reproduzierbar). Default: 0 (einzelne Auslosungen)")
+    parser.add_argument("--simulate-waitlist",  type=str2bool, nargs='?',
+                            const=True, default=False,
+                        help="Simuliert bei --simulate auch die Warteliste (True or False). Default: False")
+    parser.add_argument("--waitlist-top", type=int, default=None,
+                        help="Zieht nur die ersten K Plätze jeder Warteliste; der Zustand wird in OUTPUT_waitlist.npz gespeichert, weitere Plätze mit python -m gluecksfee.waitlist OUTPUT_waitlist.npz SEMINAR -n N. Default: vollständige Wartelisten")
+    parser.add_argument("--sampler", choices=list(SAMPLERS), default="legacy",
+                        help="Verfahren zum gewichteten Ziehen ohne Zurücklegen: legacy (np.random.choice, reproduziert bisherige Seeds), exponential (Exponential-Keys, schneller bei vielen Anmeldungen) oder buckets (zuerst die Gewichtsklasse, dann gleichverteilt in der Klasse). Default: legacy")
+    parser.add_argument("--engine", choices=['lottery', 'flow'], default="lottery",
+                        help="Verfahren der Zuweisung: lottery (Auslosung, Seminare mit wenigen Anmeldungen zuerst) oder flow (Flussproblem: maximale Anzahl an Personen mit mind. einem Seminar, dann maximale Anzahl an Plätzen; Zufallskosten aus dem Seed entscheiden zwischen gleichwertigen Lösungen). Default: lottery")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Zeitbudget in Sekunden für --engine flow, danach wird die bis dahin beste Zuweisung genutzt. Default: ohne Grenze")
+    parser.add_argument("--stages", default=None,
+                        help="Auszuführende Stufen durch Komma getrennt: draw, waitlist, summary, metrics, export; benötigte Stufen (Einlesen, Auslosung) werden ergänzt, alle anderen übersprungen. Default: alle Stufen des Skripts")
+    parser.add_argument("--sheets", default=None,
+                        help="Sheets der Ausgabe durch Komma getrennt: Seminar, Assignment, Difference, Stats_Person, Parameters, Warteplaetze, Metrics; nur die dafür nötigen Stufen werden ausgeführt, z.B. ohne Warteliste bei --sheets Assignment,Parameters. Default: alle Sheets der Stufen")
+    parser.add_argument("--rng", choices=list(RNG_MODES), default="legacy",
+                        help="Zufallszahlen: legacy (ein globaler Generator für alle Seminare, reproduziert bisherige Seeds) oder streams (ein unabhängiger Generator pro Seminar, abgeleitet aus Seed und Seminarname; einzelne Seminare können neu gezogen und Wartelisten parallel berechnet werden). Default: legacy")
+    return parser
+
+#%%
+def main(argv=None, waitlist=True, verboseDefault=False):
+    """Run the command line; returns the Lottery (or the SimulationStats with --simulate)."""
+    parser = buildParser(verboseDefault)
+    args = parser.parse_args(argv)
+    if args.engine != 'lottery' and args.simulate > 0:
+        parser.error('--simulate wiederholt die Auslosung, --engine flow ist dafür nicht vorgesehen')
+    if args.simulate > 0 and (args.stages is not None or args.sheets is not None):
+        parser.error('--stages und --sheets gelten nicht für --simulate')
+
+    #%% Stages: the targets of the script, or of --stages/--sheets, and the stages they need
+    try:
+        if args.stages is not None:
+            targets = splitNames(args.stages, TARGETS, 'stages')
+        else:
+            # with --sheets the waiting lists are only drawn for the sheet Warteplaetze
+            targets = ['draw'] + (['waitlist'] if waitlist and args.sheets is None else []) + \
+                      (['summary'] if args.verbose and args.summary != 0 else []) + \
+                      (['metrics'] if args.metrics is not None else []) + ['export']
+        if args.sheets is not None:
+            sheets = splitNames(args.sheets, defaultSheets(['waitlist', 'metrics']), 'sheets')
+            targets = targets if 'export' in targets else targets+['export']
+        else:
+            sheets = defaultSheets(targets)
+    except ValueError as e:
+        parser.error(str(e))
+    stages = plan(targets, sheets)
+
+    print("Die SeKo Gluecksfee schwingt ihren Zauberstaub...\n")
+    print(f'Seed für Zufallszahlen: "{args.seed}"')
+    print(f'Eingabe-Datei: {args.input}')
+    print(f'Ausgabe-Datei: {args.output}')
+    print(f'Maximale #Seminare: {args.maximum}')
+    print(f'Sampler: {args.sampler}')
+    if args.rng != 'legacy':
+        print(f'RNG: {args.rng}')
+    if args.engine != 'lottery':
+        print(f'Engine: {args.engine}')
+    print(f'Sparse: {args.sparse}')
+    if args.stages is not None or args.sheets is not None:
+        print(f'Stufen: {", ".join(stages)}')
+    print(f'Verbose: {args.verbose}\n')
+
+    #%% Read Input File
+    if not os.path.isfile(args.input):
+        raise FileNotFoundError(args.input)
+
+    profile = None
+    if args.profile is not None:
+        from gluecksfee.profiler import Profiler
+        profile = Profiler()
+
+    cache = None
+    if args.cache is not None:
+        from gluecksfee.cache import InputCache
+        cache = InputCache(args.cache or None, maxBytes=args.cache_size << 20)
+    lottery = Lottery(seed=args.seed, maximum=args.maximum, sampler=args.sampler, sparse=args.sparse,
+                      verbose=args.verbose, reader=args.reader, cache=cache, writer=args.writer,
+                      trace=args.trace, profile=profile, rng=args.rng, workers=args.workers,
+                      waitlistTop=args.waitlist_top if 'waitlist' in stages else None, engine=args.engine,
+                      timeBudget=args.time_budget).load(args.input)
+    if args.verbose:
+        print(f'Random Number Generation initialisiert mit {lottery.seedValue}')
+
+    def writeProfile():
+        if profile is not None:
+            from gluecksfee.profiler import profileFile
+            file = args.profile or profileFile(args.output)
+            profile.write(file, lottery.seminarNames, input=args.input, output=args.output, seed=args.seed,
+                          sampler=args.sampler, sparse=args.sparse)
+            profile.close()
+            print(f'Profil gespeichert in {file}')
+
+    def writeMetrics(metrics):
+        from gluecksfee.metrics import KEYS, metricsFile
+        summary = metrics.summary()
+        for key, label in KEYS:
+            print(f'{label}: {summary[key]["mean"]:.4g}')
+        file = args.metrics or metricsFile(args.output)
+        metrics.write(file, lottery.seminarNames, input=args.input, output=args.output, seed=args.seed,
+                      maximum=args.maximum, sampler=args.sampler, engine=args.engine)
+        print(f'Kennzahlen gespeichert in {file}')
+
+    #%% Monte Carlo simulation: repeat the draw for many derived seeds and only store the summary
+    if args.simulate > 0:
+        from gluecksfee.profiler import phase
+        from gluecksfee.simulate import simulate, writeSimulationReport
+        with phase(profile, 'simulate'):
+            stats = simulate(lottery.x, lottery.numParticipantsPerSeminar, lottery.semTypes, lottery.inhaltlich,
+                             seed=args.seed, runs=args.simulate, workers=args.workers,
+                             maxSeminarsAssignedPerParticipant=args.maximum, sampler=args.sampler,
+                             replicas=args.replicas, waitlist=args.simulate_waitlist,
+                             metrics=args.metrics is not None)
+        for key, value in stats.summary().items():
+            print(f'{key}: {value:.4g}')
+        z = [f'Seed für Zufallszahlen: "{args.seed}" (Durchlauf j: "{args.seed}/j")', f'Eingabe-Datei: {args.input}',
+             f'Ausgabe-Datei: {args.output}', f'Maximale #Seminare: {args.maximum}', f'Durchläufe: {args.simulate}',
+             f'Replikationen: {args.replicas}', f'Sampler: {args.sampler}']
+        with phase(profile, 'export'):
+            writeSimulationReport(args.output, stats, lottery.userid, lottery.seminarNames, parameters=z)
+        if stats.metrics is not None:
+            writeMetrics(stats.metrics)
+        writeProfile()
+        return stats
+
+    #%% Let's do the assignment and the waiting lists
+    lottery.assign()
+    if lottery.flowStats is not None and not lottery.flowStats['optimal']:
+        print(f'Zeitbudget von {args.time_budget} s erreicht: die Zuweisung ist gültig, aber evtl. nicht optimal')
+    if 'waitlist' in stages:
+        lottery.waitlist()
+
+    #%% Output: console summary and Excel file
+    if 'summary' in stages:
+        from gluecksfee.output import printSummary
+        from gluecksfee.profiler import phase
+        with phase(profile, 'printSummary'):
+            printSummary(lottery.x, lottery.y, lottery.userid, lottery.seminarNames, lottery.numParticipantsPerSeminar,
+                         limit=args.summary, views=lottery.views())
+    metrics = lottery.metrics() if 'metrics' in stages else None
+    if 'export' in stages:
+        lottery.export(args.output, metrics=metrics, sheets=sheets)
+    lottery.close()
+    if metrics is not None:
+        writeMetrics(metrics)
+    if lottery.waitlistRest is not None:
+        from gluecksfee.waitlist import waitlistStateFile
+        print(f'Zustand der Warteliste gespeichert in {lottery.saveWaitlistState(waitlistStateFile(args.output))}')
+    writeProfile()
+    return lottery
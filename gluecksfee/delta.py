@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Nachträgliche Änderungen einer veröffentlichten Auslosung
+
+Nach der Veröffentlichung gibt es Abmeldungen, Nachmeldungen und geänderte
+Platzzahlen. Statt die Auslosung neu zu starten, werden die Änderungen auf die
+vorherige Ausgabe angewendet:
+  abmelden   die Person verliert ihren Platz im Seminar bzw. auf der Warteliste
+  anmelden   die Person wird hinten an die Warteliste angefügt; mehrere
+             Nachmeldungen für ein Seminar werden zufällig angeordnet (Stream
+             des Seminars aus dem Seed, s. gluecksfee.streams)
+  plaetze    neue Anzahl der Plätze; bestehende Zuweisungen bleiben erhalten
+Freie Plätze der geänderten Seminare werden danach in der Reihenfolge der
+Warteliste vergeben. Übersprungen wird, wer bereits ein inhaltlich gleiches
+Seminar hat (und daher von der Warteliste entfernt wird) oder die maximale
+Anzahl an Seminaren erreicht hat. Wer nachrückt, wird von den Wartelisten der
+inhaltlich gleichen Seminare entfernt. Alle anderen Zuweisungen und Wartelisten
+bleiben unverändert.
+
+Gelesen werden die Sheets Seminar, Warteplaetze und Parameters der vorherigen
+Ausgabe, aus dem Sheet Assignment nur die Personen (eine Warteliste mit einer
+unbekannten Person wird abgelehnt), sowie die Sonderzeilen der Eingabe
+(inhaltliche Gruppen). Die Eingabe wird auch neben der
+vorherigen Ausgabe gesucht; ohne Eingabe bricht delta ab (-i). Die neue Ausgabe
+enthält die Sheets Seminar, Warteplaetze und Parameters und kann wieder als
+vorherige Ausgabe dienen; die Änderungen werden als <Ausgabe>_diff.csv
+gespeichert:
+
+    python -m gluecksfee.delta output.xlsx changes.csv -o output2.xlsx
+
+Die Änderungsdatei (CSV, Trennzeichen , ; oder Tab) hat die Spalten Aktion,
+Person, Seminar und Plaetze (nur für die Aktion plaetze).
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import csv
+import itertools
+import os.path
+
+import numpy as np
+
+from gluecksfee.output import sheetFile, writeSheets
+from gluecksfee.readers import cellValue, readSpecialRows, textLabel, xlsxRows
+from gluecksfee.streams import seminarStream
+
+ACTIONS = {'anmelden': 'add', 'add': 'add',
+           'abmelden': 'remove', 'remove': 'remove',
+           'plaetze': 'places', 'plätze': 'places', 'places': 'places'}
+
+#%% previous output
+def iterResultRows(file, sheet):
+    """Iterator over the rows of a sheet of an output (xlsx, or one CSV/Parquet file per sheet), read
+    row by row resp. in record batches; None without the sheet."""
+    ext = os.path.splitext(str(file))[1].lower()
+    if ext in ('.csv', '.parquet', '.pq'):
+        part = sheetFile(file, sheet, ext)
+        if not os.path.isfile(part):
+            return None
+        return _csvRows(part) if ext == '.csv' else _parquetRows(part)
+    rows = xlsxRows(file, sheet)
+    try:
+        first = next(rows)
+    except ValueError: # no such worksheet
+        return None
+    except StopIteration:
+        return iter([])
+    return itertools.chain([first], rows)
+
+def _csvRows(part):
+    with open(part, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            yield [None if v == '' else textLabel(v) for v in row] # persons stay text, e.g. '00123'
+
+def _parquetRows(part):
+    import pyarrow.parquet as pq
+    f = pq.ParquetFile(part)
+    yield list(f.schema_arrow.names)
+    for batch in f.iter_batches():
+        yield from (list(row) for row in zip(*batch.to_pydict().values()))
+
+def resultRows(file, sheet):
+    """Rows of a sheet of an output as list; None without the sheet."""
+    rows = iterResultRows(file, sheet)
+    return None if rows is None else list(rows)
+
+class Result:
+    """Seminars with places, requests and participants, the waiting lists and the parameters of an output.
+    Persons are stored as text, as they are written to the sheets."""
+    def __init__(self, seminarNames, places, requests, participants, order, parameters, persons=None):
+        self.seminarNames = list(seminarNames)
+        self.places = list(places)
+        self.requests = list(requests)
+        self.participants = participants # list of persons per seminar
+        self.order = order # waiting list per seminar name
+        self.parameters = list(parameters)
+        self.persons = persons # persons of the sheet Assignment, None: not known
+
+    @classmethod
+    def read(cls, file):
+        rows = resultRows(file, 'Seminar')
+        if rows is None:
+            raise ValueError(f'The output {file} has no sheet Seminar')
+        rows = [row for row in rows[1:] if row and row[0] is not None]
+        persons = lambda values: [str(v) for v in values if v is not None and v != '']
+        waiting = {row[0]: persons(row[1:]) for row in (resultRows(file, 'Warteplaetze') or [[]])[1:] if row}
+        parameters = [row[0] for row in (resultRows(file, 'Parameters') or [[]])[1:] if row and row[0] is not None]
+        order = {**waiting, **{row[0]: [] for row in rows if row[0] not in waiting}} # order of the sheet Warteplaetze
+        assignment = iterResultRows(file, 'Assignment') # only the first column, the persons
+        known = None if assignment is None else {str(row[0]) for row in itertools.islice(assignment, 1, None)
+                                                 if row and row[0] is not None and row[0] != ''}
+        return cls([row[0] for row in rows], [int(row[1]) for row in rows], [int(row[3]) for row in rows],
+                   [persons(row[5:]) for row in rows], order, parameters, known)
+
+    def checkWaitlists(self):
+        """Raise a ValueError if a waiting list holds a person who is not in the sheet Assignment,
+        e.g. a row index instead of the person in outputs of older versions."""
+        if self.persons is None:
+            return
+        for name, persons in self.order.items():
+            unknown = [u for u in persons if u not in self.persons]
+            if unknown:
+                raise ValueError(f'The waiting list of seminar {name} holds the person {unknown[0]}, '
+                                 f'who is not in the sheet Assignment')
+
+    def parameter(self, prefix, default=None):
+        """Value of the parameter line 'prefix: value', e.g. parameter('Maximale #Seminare')."""
+        for line in self.parameters:
+            if str(line).startswith(prefix+':'):
+                return str(line)[len(prefix)+1:].strip()
+        return default
+
+    def sheets(self):
+        """Sheets Seminar, Warteplaetze and Parameters as (name, header, rows, index), see outputSheets."""
+        teilnehmer = [len(p) for p in self.participants]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zugewiesen = np.array(teilnehmer, dtype='float')/np.array(self.requests, dtype='float')
+        seminarRows = ((name, [self.places[i], teilnehmer[i], self.requests[i], zugewiesen[i], *self.participants[i]])
+                       for i, name in enumerate(self.seminarNames))
+        width = max([len(v) for v in self.order.values()], default=0)
+        return [('Seminar', ['Seminar', 'Plaetze', 'Teilnehmer', 'Anfragen', 'Zugewiesen', *range(1, max(teilnehmer, default=0)+1)],
+                 seminarRows, True),
+                ('Parameters', ['Parameter'], ((None, [p]) for p in self.parameters), False),
+                ('Warteplaetze', [None, *range(width)], ((name, v) for name, v in self.order.items()), True)]
+
+def resolveInput(file, output):
+    """Input file of the parameters of an output: a relative path is looked up in the working
+    directory, next to the output and as file name next to the output; None if not found."""
+    if file is None:
+        return None
+    folder = os.path.dirname(os.path.abspath(str(output)))
+    for candidate in (file, os.path.join(folder, file), os.path.join(folder, os.path.basename(file))):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def contentGroups(result, file):
+    """Value of the row inhaltlich per seminar of the result, read from the input file; None if the
+    input has no row inhaltlich. A missing input raises FileNotFoundError, the rule would be lost."""
+    if file is None or not os.path.isfile(file):
+        raise FileNotFoundError(f'Input {file} with the row inhaltlich not found, please pass it with -i')
+    seminarNames, _, values = readSpecialRows(file)
+    groups = dict(zip(seminarNames, values))
+    if any(groups.get(name) is None for name in result.seminarNames):
+        return None
+    return [groups[name] for name in result.seminarNames]
+
+#%% changes
+def readChanges(file, encoding='utf-8-sig'):
+    """Returns the list of changes (action, person, seminar, places) of a CSV file with the columns
+    Aktion, Person, Seminar, Plaetze."""
+    with open(file, newline='', encoding=encoding) as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+        f.seek(0)
+        rows = csv.reader(f, dialect)
+        header = [v.strip().lower() for v in next(rows, [])]
+        try:
+            columns = [header.index(c) for c in ['aktion', 'person', 'seminar']]
+        except ValueError:
+            raise ValueError(f'The changes {file} need the columns Aktion, Person, Seminar (and Plaetze)') from None
+        plaetze = next((j for j, c in enumerate(header) if c in ('plaetze', 'plätze', 'places')), None)
+        changes = []
+        for line, row in enumerate(rows, 2):
+            if not any(v.strip() for v in row):
+                continue
+            action, person, seminar = [row[j].strip() if j < len(row) else '' for j in columns]
+            if action.lower() not in ACTIONS:
+                raise ValueError(f'Unknown action "{action}" in line {line} of {file}, choose from {list(ACTIONS)}')
+            action = ACTIONS[action.lower()]
+            places = cellValue(row[plaetze]) if plaetze is not None and plaetze < len(row) else None
+            if action == 'places' and not isinstance(places, int):
+                raise ValueError(f'Line {line} of {file}: the action plaetze needs the number of places')
+            changes.append((action, person, textLabel(seminar), places))
+    return changes
+
+def applyChanges(result, changes, inhaltlich=None, maximum=999, seed=None):
+    """Apply the changes to the Result in place; only the seminars of the changes are filled from their
+    waiting lists. inhaltlich: content group per seminar of result, None: every seminar on its own.
+    Returns the diff as rows (Person, Seminar, Aenderung, Details). A waiting list with a person who
+    is not in the sheet Assignment raises a ValueError (see Result.checkWaitlists)."""
+    result.checkWaitlists()
+    names = result.seminarNames
+    index = {name: i for i, name in enumerate(names)}
+    group = list(inhaltlich) if inhaltlich is not None else list(range(len(names)))
+    members = {}
+    for i, g in enumerate(group):
+        members.setdefault(g, []).append(i)
+    seminarsOf = {} # assigned seminars per person
+    for i, users in enumerate(result.participants):
+        for u in users:
+            seminarsOf.setdefault(u, set()).add(i)
+    hasGroup = lambda u, i: any(group[s] == group[i] for s in seminarsOf.get(u, ()))
+
+    diff = []
+    changed, late = {}, {} # seminars of the changes (ordered), late registrations per seminar
+    for action, person, seminar, places in changes:
+        if seminar not in index:
+            raise ValueError(f'Unknown seminar "{seminar}" in the changes')
+        i = index[seminar]
+        person = str(person)
+        waiting = result.order[seminar]
+        changed[i] = True
+        if action == 'remove':
+            found = False
+            if i in seminarsOf.get(person, ()):
+                result.participants[i].remove(person)
+                seminarsOf[person].discard(i)
+                diff.append((person, seminar, 'abgemeldet', ''))
+                found = True
+            if person in waiting:
+                waiting.remove(person)
+                diff.append((person, seminar, 'von Warteliste entfernt', 'abgemeldet'))
+                found = True
+            if person in late.get(i, ()):
+                late[i].remove(person)
+                found = True
+            if found:
+                result.requests[i] -= 1
+            else:
+                diff.append((person, seminar, 'nicht gefunden', 'abmelden'))
+        elif action == 'add':
+            if i in seminarsOf.get(person, ()) or person in waiting or person in late.get(i, ()):
+                diff.append((person, seminar, 'bereits angemeldet', ''))
+                continue
+            result.requests[i] += 1
+            late.setdefault(i, []).append(person)
+        else:
+            diff.append((None, seminar, 'Plaetze', f'{result.places[i]} -> {places}'))
+            result.places[i] = places
+
+    # late registrations: appended to the waiting list in a random order drawn from the stream of the seminar
+    for i, persons in late.items():
+        if len(persons) > 1:
+            persons = [persons[j] for j in seminarStream(seed, names[i], 'delta').permutation(len(persons))]
+        for person in persons:
+            if hasGroup(person, i):
+                diff.append((person, names[i], 'angemeldet', 'bereits ein inhaltlich gleiches Seminar'))
+            else:
+                result.order[names[i]].append(person)
+                diff.append((person, names[i], 'auf Warteliste', f'Platz {len(result.order[names[i]])-1}'))
+
+    # free places of the changed seminars are given to the waiting list in its order
+    for i in sorted(changed):
+        seminar, waiting = names[i], result.order[names[i]]
+        free = result.places[i]-len(result.participants[i])
+        if free < 0:
+            diff.append((None, seminar, 'ueberbelegt', f'{len(result.participants[i])} Teilnehmer bei {result.places[i]} Plaetzen'))
+        position = {u: j for j, u in enumerate(waiting)} # places on the waiting list before filling
+        j = 0
+        while free > 0 and j < len(waiting):
+            u = waiting[j]
+            if hasGroup(u, i):
+                waiting.pop(j)
+                diff.append((u, seminar, 'von Warteliste entfernt', 'bereits ein inhaltlich gleiches Seminar'))
+                continue
+            if len(seminarsOf.get(u, ())) >= maximum:
+                j += 1
+                continue
+            waiting.pop(j)
+            result.participants[i].append(u)
+            seminarsOf.setdefault(u, set()).add(i)
+            diff.append((u, seminar, 'nachgerueckt', f'Warteliste Platz {position[u]}'))
+            for s in members[group[i]]:
+                if s != i and u in result.order[names[s]]:
+                    result.order[names[s]].remove(u)
+                    diff.append((u, names[s], 'von Warteliste entfernt', f'nachgerueckt in {seminar}'))
+            free -= 1
+        if free > 0:
+            diff.append((None, seminar, 'freie Plaetze', str(free)))
+    return diff
+
+def writeDiff(file, diff):
+    with open(file, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['Person', 'Seminar', 'Aenderung', 'Details'])
+        w.writerows(['' if v is None else v for v in row] for row in diff)
+    return file
+
+def diffFile(output):
+    """File of the diff: output.xlsx -> output_diff.csv"""
+    return f'{os.path.splitext(str(output))[0]}_diff.csv'
+
+#%%
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wendet Abmeldungen, Nachmeldungen und geänderte Plätze auf eine veröffentlichte Auslosung an")
+    parser.add_argument("previous", help="Vorherige Ausgabe (.xlsx, oder .csv/.parquet mit einer Datei pro Sheet)")
+    parser.add_argument("changes", help="Änderungen als CSV mit den Spalten Aktion (anmelden, abmelden, plaetze), Person, Seminar, Plaetze")
+    parser.add_argument("-i", "--input", default=None,
+                        help="Eingabe mit der Zeile inhaltlich. Default: Eingabe-Datei aus dem Sheet Parameters")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Neue Ausgabe mit den Sheets Seminar, Warteplaetze und Parameters. Default: PREVIOUS_delta.xlsx")
+    parser.add_argument("-s", "--seed", default=None,
+                        help="Seed für die Reihenfolge der Nachmeldungen. Default: Seed der vorherigen Ausgabe/Name der Änderungsdatei")
+    parser.add_argument("-m", "--maximum", type=int, default=None,
+                        help="Maximale Anzahl von Seminaren pro Person. Default: aus dem Sheet Parameters")
+    args = parser.parse_args(argv)
+
+    result = Result.read(args.previous)
+    changes = readChanges(args.changes)
+    seed = args.seed or f'{result.parameter("Seed für Zufallszahlen", "").strip(chr(34))}/{os.path.basename(args.changes)}'
+    maximum = args.maximum if args.maximum is not None else int(result.parameter('Maximale #Seminare', 999))
+    output = args.output or f'{os.path.splitext(args.previous)[0]}_delta{os.path.splitext(args.previous)[1]}'
+
+    file = args.input or resolveInput(result.parameter('Eingabe-Datei'), args.previous) or result.parameter('Eingabe-Datei')
+    try:
+        inhaltlich = contentGroups(result, file)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if inhaltlich is None:
+        print(f'Keine Zeile inhaltlich in {file}: jedes Seminar ist eine eigene inhaltliche Gruppe')
+
+    try:
+        diff = applyChanges(result, changes, inhaltlich, maximum, seed)
+    except ValueError as e:
+        parser.error(str(e))
+    result.parameters += [f'Vorherige Ausgabe: {args.previous}', f'Änderungen: {args.changes} ({len(changes)})',
+                          f'Seed der Änderungen: "{seed}"']
+    writeSheets(output, result.sheets())
+    print(f'{len(changes)} Änderungen, {sum(row[2] == "nachgerueckt" for row in diff)} Personen nachgerückt')
+    print(f'Ausgabe gespeichert in {output}, Änderungen in {writeDiff(diffFile(output), diff)}')
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Zuweisung als Flussproblem (--engine flow)
+
+Statt der Runden von assignmentMatrix (Seminare mit wenigen Anmeldungen zuerst)
+wird die Zuweisung als Fluss im Netzwerk
+
+    Quelle -> Person -> Person x inhaltliche Gruppe -> Seminar -> Senke
+              (Kapazität --maximum)  (Kapazität 1)  (Anmeldung)  (Kapazität Plaetze)
+
+berechnet. Ziel ist zuerst die maximale Anzahl an Personen mit mind. einem
+Seminar, danach die maximale Anzahl vergebener Plätze. Dafür wird in Stufen
+gerechnet: in Stufe L darf jede Person bis zu L Seminare haben, Stufe 1
+maximiert also die Abdeckung. Ein augmentierender Weg nimmt keiner Person ein
+Seminar weg, ohne ihr ein anderes zu geben, das Ergebnis einer Stufe bleibt in
+den folgenden erhalten; nach der letzten Stufe ist der Fluss maximal.
+
+Jede Stufe beginnt mit einer Greedy-Zuweisung (jede Person schlägt ihr
+günstigstes freies Seminar vor, die Seminare nehmen die günstigsten Vorschläge
+an) und wird mit augmentierenden Wegen im Austauschgraphen der Seminare
+vervollständigt: die Kante s -> t zählt die Personen in s, die nach t wechseln
+könnten. Ein Weg beginnt an einem Seminar mit einer Person, die noch ein
+Seminar bekommen kann, und endet an einem Seminar mit freiem Platz; die
+Breitensuche läuft auf der k x k-Matrix der Seminare statt über alle Personen.
+
+Die Kosten jeder Anmeldung sind gleichverteilte Zufallszahlen aus dem Seed. Sie
+entscheiden zwischen gleichwertigen Lösungen, wer einen Platz bekommt oder
+wechselt, und erhalten so den Charakter der Auslosung; die Lösung ist für einen
+Seed reproduzierbar. Ist das Zeitbudget abgelaufen, wird die bis dahin erreichte
+(gültige) Zuweisung zurückgegeben.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import time
+
+import numpy as np
+
+from gluecksfee.lottery import ContentGroups
+from gluecksfee.sparse import RegistrationMatrix, asColumns
+
+class CoverageFlow:
+    """State of the flow: the assigned requests (entries of x in CSC order), the seminars per user,
+    the content groups per user and the exchange counts between seminars."""
+    def __init__(self, matrix, numParticipantsPerSeminar, semTypes, seed=None):
+        x = asColumns(matrix)
+        self.shape = x.shape
+        n, k = x.shape
+        self.indptr, self.users = x.indptr, x.indices
+        self.requested = x.data > 0
+        self.seminarOf = np.repeat(np.arange(k), np.diff(x.indptr))
+        self.rng = np.random.default_rng(seed)
+        self.cost = self.rng.random(self.users.size) # random tie-breaking cost per request
+        self.rowOrder = np.lexsort((self.seminarOf, self.users)) # entries ordered by user (CSR)
+        self.rowptr = np.zeros(n+1, dtype='int64')
+        np.cumsum(np.bincount(self.users, minlength=n), out=self.rowptr[1:])
+
+        self.places = np.asarray(numParticipantsPerSeminar, dtype='int64')
+        self.assigned = np.zeros(self.users.size, dtype=bool)
+        self.count = np.zeros(n, dtype='int64') # assigned seminars per user
+        self.filled = np.zeros(k, dtype='int64') # assigned users per seminar
+        self.groups = ContentGroups(semTypes, k, n)
+        self.group = self.groups.group
+        self.exchange = np.zeros((k, k), dtype='int64') # users in s which could move to t
+        self.reverse = np.zeros((k, k), dtype=bool) # reverse[t, s]: exchange[s, t] > 0
+        self.entrants = np.zeros(k, dtype='int64') # users below the level which could get s
+
+    #%% entries
+    def rowEntries(self, users):
+        """Entries of x (CSC positions) of the users and the user of each entry."""
+        users = np.asarray(users, dtype='int64')
+        length = self.rowptr[users+1]-self.rowptr[users]
+        pos = np.repeat(self.rowptr[users]-np.cumsum(length)+length, length)+np.arange(length.sum())
+        return self.rowOrder[pos], np.repeat(users, length)
+
+    def entries(self, users, s):
+        """Entries of (users, s), -1 if a user is not in the column of seminar s."""
+        start, end = self.indptr[s], self.indptr[s+1]
+        j = np.searchsorted(self.users[start:end], users)
+        found = j < end-start
+        found[found] = self.users[start+j[found]] == users[found]
+        return np.where(found, start+j, -1)
+
+    def set(self, pos, value):
+        u, s = self.users[pos], self.seminarOf[pos]
+        self.assigned[pos] = value
+        self.count[u] += 1 if value else -1
+        self.filled[s] += 1 if value else -1
+        if value:
+            self.groups.add(u, s)
+        else:
+            self.groups.discard(u, s)
+
+    #%% exchange graph and entrants
+    def edges(self, users, level):
+        """Exchange edges s*k+t (one per user which could move from s to t) and the seminars the
+        users below the level could get, for the current state of the users."""
+        k = self.shape[1]
+        pos, owner = self.rowEntries(np.unique(users))
+        t = self.seminarOf[pos]
+        open_ = self.requested[pos] & ~self.assigned[pos]
+        entrant = open_ & (self.count[owner] < level) & ~self.groups.satisfied(owner, self.group[t])
+        # pairs (assigned entry of a user, open entry of the same user)
+        a = np.flatnonzero(self.assigned[pos])
+        bounds = np.searchsorted(owner, owner[a], side='left'), np.searchsorted(owner, owner[a], side='right')
+        length = bounds[1]-bounds[0]
+        src = np.repeat(a, length)
+        dst = np.repeat(bounds[0]-np.cumsum(length)+length, length)+np.arange(length.sum())
+        g = self.group[t[dst]]
+        move = open_[dst] & ((g == self.group[t[src]]) | ~self.groups.satisfied(owner[dst], g))
+        return t[src[move]]*k+t[dst[move]], t[entrant]
+
+    def update(self, users, level, sign):
+        """Add (sign=1) or remove (sign=-1) the edges of a few users."""
+        k = self.shape[1]
+        edges, seminars = self.edges(users, level)
+        np.add.at(self.exchange.reshape(-1), edges, sign)
+        np.add.at(self.entrants, seminars, sign)
+        s, t = np.divmod(edges, k)
+        self.reverse[t, s] = self.exchange[s, t] > 0
+
+    def rebuild(self, level, blockSize=65536):
+        k = self.shape[1]
+        self.exchange[:] = 0
+        self.entrants[:] = 0
+        for start in range(0, self.shape[0], blockSize):
+            edges, seminars = self.edges(np.arange(start, min(start+blockSize, self.shape[0])), level)
+            self.exchange += np.bincount(edges, minlength=k*k).reshape(k, k)
+            self.entrants += np.bincount(seminars, minlength=k)
+        self.reverse[:] = (self.exchange > 0).T
+
+    #%% greedy start of a level
+    def greedy(self, level, deadline=None):
+        """Proposals in rounds: every user below the level proposes its cheapest seminar with a free
+        place, each seminar accepts up to its free places the proposals of the users with the fewest
+        remaining options, the cheapest first."""
+        live = np.flatnonzero(self.requested & ~self.assigned)
+        added = 0
+        while live.size:
+            u, s = self.users[live], self.seminarOf[live]
+            live = live[(self.count[u] < level) & (self.filled[s] < self.places[s]) & self.groups.eligible(u, s)]
+            if live.size == 0:
+                break
+            pressure = np.bincount(self.seminarOf[live], minlength=self.shape[1])/np.maximum(self.places-self.filled, 1)
+            order = np.lexsort((self.cost[live], pressure[self.seminarOf[live]], self.users[live]))
+            proposals = live[order]
+            first = np.r_[True, self.users[proposals[1:]] != self.users[proposals[:-1]]]
+            proposals = proposals[first]
+            s = self.seminarOf[proposals]
+            options = np.bincount(self.users[live], minlength=self.shape[0])[self.users[proposals]]
+            order = np.lexsort((self.cost[proposals], options, s))
+            proposals, s = proposals[order], s[order]
+            index = np.arange(s.size)
+            rank = index-np.maximum.accumulate(np.where(np.r_[True, s[1:] != s[:-1]], index, 0))
+            accept = proposals[rank < (self.places-self.filled)[s]]
+            self.assigned[accept] = True
+            self.count[self.users[accept]] += 1
+            self.filled += np.bincount(self.seminarOf[accept], minlength=self.shape[1])
+            self.groups.add(self.users[accept], self.seminarOf[accept])
+            added += accept.size
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        return added
+
+    #%% augmenting paths
+    def paths(self, blocked, skipped):
+        """Shortest paths of seminars from the seminars with an entrant to a seminar with a free place,
+        from one backward search from the seminars with free places; paths of the same length in
+        random order. blocked[t, s]: edge s -> t unusable."""
+        k = self.shape[1]
+        child = np.full(k, -1)
+        seen = np.zeros(k, dtype=bool)
+        frontier = np.flatnonzero(self.filled < self.places)
+        seen[frontier] = True
+        sources = []
+        while frontier.size:
+            hit = frontier[(self.entrants[frontier] > 0) & ~skipped[frontier]]
+            sources.extend(self.rng.permutation(hit))
+            reach = self.reverse[frontier] & ~seen
+            if blocked.any():
+                reach &= ~blocked[frontier]
+            new = np.flatnonzero(reach.any(axis=0))
+            child[new] = frontier[np.argmax(reach[:, new], axis=0)]
+            seen[new] = True
+            frontier = new
+        for s in sources:
+            path = [s]
+            while child[path[-1]] >= 0:
+                path.append(child[path[-1]])
+            yield path
+
+    def augment(self, path, level):
+        """Move one user along each edge of the path, starting at its free end, and give the first
+        seminar to an entrant. Returns None or the edge (s, t) without a valid user."""
+        changes, touched = [], {}
+        def touch(u):
+            if u not in touched:
+                touched[u] = True
+                self.update([u], level, -1)
+        def apply(off, on):
+            for pos in (off, on):
+                if pos >= 0:
+                    touch(self.users[pos])
+            if off >= 0:
+                self.set(off, False)
+            self.set(on, True)
+            changes.append((off, on))
+
+        failed = None
+        for s, t in zip(path[-2::-1], path[:0:-1]):
+            start = self.indptr[s]
+            offs = start+np.flatnonzero(self.assigned[start:self.indptr[s+1]])
+            users = self.users[offs]
+            ons = self.entries(users, t)
+            ok = ons >= 0
+            ok[ok] = self.requested[ons[ok]] & ~self.assigned[ons[ok]]
+            g = self.group[t]
+            ok &= (g == self.group[s]) | ~self.groups.satisfied(users, g)
+            if not ok.any():
+                failed = (s, t)
+                break
+            j = np.flatnonzero(ok)[np.argmin(self.cost[ons[ok]]-self.cost[offs[ok]])]
+            apply(offs[j], ons[j])
+        if failed is None:
+            s = path[0]
+            pos = np.arange(self.indptr[s], self.indptr[s+1])
+            users = self.users[pos]
+            ok = self.requested[pos] & ~self.assigned[pos] & (self.count[users] < level) & self.groups.eligible(users, s)
+            if ok.any():
+                candidates = pos[ok]
+                apply(-1, candidates[np.lexsort((self.cost[candidates], self.count[self.users[candidates]]))[0]])
+            else:
+                failed = (s, s)
+        if failed is not None:
+            for off, on in reversed(changes):
+                self.set(on, False)
+                if off >= 0:
+                    self.set(off, True)
+        if touched:
+            self.update(list(touched), level, 1)
+        return failed
+
+    #%%
+    def solve(self, maximum=999, timeBudget=None, verbose=False):
+        """Levels 1, ..., maximum; returns a dict with the statistics (optimal: not stopped by the budget)."""
+        start = time.perf_counter()
+        deadline = start+timeBudget if timeBudget is not None else None
+        k = self.shape[1]
+        stats = {'levels': 0, 'greedy': 0, 'augmentations': 0, 'optimal': True}
+        maxRequests = int(np.bincount(self.users[self.requested], minlength=self.shape[0]).max(initial=0))
+        for level in range(1, min(maximum, maxRequests)+1):
+            stats['levels'] = level
+            greedy = self.greedy(level, deadline)
+            augmentations = 0
+            searching = deadline is None or time.perf_counter() < deadline
+            if searching:
+                self.rebuild(level)
+                blocked = np.zeros((k, k), dtype=bool)
+                skipped = np.zeros(k, dtype=bool)
+            while searching and (deadline is None or time.perf_counter() < deadline):
+                searching = False
+                for path in self.paths(blocked, skipped):
+                    # the paths of one search are checked again: earlier paths changed the state
+                    if self.entrants[path[0]] <= 0 or self.filled[path[-1]] >= self.places[path[-1]]:
+                        searching = True
+                        continue
+                    failed = self.augment(path, level)
+                    searching = True
+                    if failed is None:
+                        augmentations += 1
+                        blocked[:] = False
+                    elif failed[0] == failed[1]:
+                        skipped[failed[0]] = True # no valid entrant: skip the seminar in this level
+                    else:
+                        blocked[failed[1], failed[0]] = True
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        break
+            stats['greedy'] += greedy
+            stats['augmentations'] += augmentations
+            if verbose:
+                print(f'Stufe {level}: {greedy} Plätze greedy, {augmentations} augmentierende Wege, '
+                      f'{(self.count > 0).sum()} Personen mit mind. einem Seminar, {self.filled.sum()} Plätze '
+                      f'({time.perf_counter()-start:.2f} s)')
+            if deadline is not None and time.perf_counter() >= deadline:
+                stats['optimal'] = False
+                break
+            if not (self.count >= level).any():
+                break
+        stats['seconds'] = time.perf_counter()-start
+        return stats
+
+    def assignment(self, dtype='int64'):
+        """Assigned users per seminar as RegistrationMatrix."""
+        columns = [(self.users[self.indptr[s]:self.indptr[s+1]][self.assigned[self.indptr[s]:self.indptr[s+1]]], 1)
+                   for s in range(self.shape[1])]
+        return RegistrationMatrix.fromColumns(columns, self.shape, dtype=dtype)
+
+#%%
+def flowAssignment(matrix, numParticipantsPerSeminar, semTypes, inhaltlich,
+                   maxSeminarsAssignedPerParticipant=999, seed=None, timeBudget=None, verbose=False, stats=None):
+    """Assignment with the coverage-first flow (see module docstring), same result type as
+    assignmentMatrix. stats (a dict) receives levels, augmentations, seconds and optimal."""
+    flow = CoverageFlow(matrix, numParticipantsPerSeminar, semTypes, seed=seed)
+    res = flow.solve(maxSeminarsAssignedPerParticipant, timeBudget=timeBudget, verbose=verbose)
+    if stats is not None:
+        stats.update(res)
+    y = flow.assignment(asColumns(matrix).dtype)
+    return y if isinstance(matrix, RegistrationMatrix) else y.toDense()
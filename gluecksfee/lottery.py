@@ -0,0 +1,755 @@
+# -*- coding: utf-8 -*-
+"""
+SeKo Gluecksfee: Einlesen der Anmeldungen, Auslosung und Warteliste
+
+Die Funktionen arbeiten mit dichten numpy-Matrizen x[user_id, seminar_id] oder
+mit RegistrationMatrix (gluecksfee.sparse). Intern wird die spaltenweise
+Darstellung genutzt; die Ergebnisse haben den gleichen Typ wie die Eingabe.
+
+Lottery fasst Einlesen (gluecksfee.readers), Auslosung, Warteliste und
+Excel-Ausgabe für die Nutzung als Bibliothek zusammen; pandas wird erst beim
+Einlesen bzw. Schreiben geladen.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import hashlib
+import heapq
+import time
+import numpy as np
+
+from datetime import datetime
+from functools import reduce
+from operator import iconcat
+
+from gluecksfee.profiler import phase
+from gluecksfee.sampler import distinctPositions, drawClasses, getSampler, rngDigest
+from gluecksfee.sparse import RegistrationMatrix, asColumns
+from gluecksfee.streams import seminarStreams
+
+#%% Initialize Random Generator: the seed string is hashed with SHA-256; the sum of the
+# digest as uint32 wraps around as in numpy 1.x on Windows, where the published draws were made
+def seedFromString(seed):
+    hash = hashlib.sha256(seed.encode('utf-8'))
+    return int(np.sum(np.frombuffer(hash.digest(), dtype='uint32'), dtype='uint32'))
+#%% content groups (row inhaltlich): group -> seminars in ascending order, from a single np.unique
+def hashSemTypes(inhaltlich):
+    keys, group = np.unique(inhaltlich, return_inverse=True)
+    seminars = np.argsort(group, kind='stable')
+    bounds = np.cumsum(np.bincount(group, minlength=len(keys)))[:-1]
+    return dict(zip(keys, np.split(seminars, bounds)))
+
+def groupIndex(semTypes, numSeminars):
+    """Index of the content group (inhaltlich) of every seminar."""
+    group = np.zeros(numSeminars, dtype='int64')
+    for g, seminars in enumerate(semTypes.values()):
+        group[seminars] = g
+    return group
+
+class ContentGroups:
+    """Seminar -> content group index and per user a bitmask of the groups in which the user
+    already has a seminar: whether a user may still get seminar i is a single bit test and all
+    content-identical seminars are excluded by setting one bit."""
+    def __init__(self, semTypes, numSeminars, numUsers):
+        self.group = groupIndex(semTypes, numSeminars)
+        self.bits = np.zeros((numUsers, (len(semTypes)+7) >> 3), dtype='uint8')
+
+    @classmethod
+    def fromAssignment(cls, semTypes, y):
+        """Groups satisfied by the assignment y."""
+        y = asColumns(y)
+        groups = cls(semTypes, y.shape[1], y.shape[0])
+        seminars = np.repeat(np.arange(y.shape[1]), np.diff(y.indptr))
+        keep = y.data > 0
+        g = groups.group[seminars[keep]]
+        np.bitwise_or.at(groups.bits, (y.indices[keep], g >> 3), (1 << (g & 7)).astype('uint8'))
+        return groups
+
+    def satisfied(self, users, g):
+        """users already have a seminar of group g (elementwise for arrays of groups)."""
+        g = np.asarray(g)
+        return (self.bits[users, g >> 3] & (1 << (g & 7)).astype('uint8')) != 0
+
+    def eligible(self, users, i):
+        return ~self.satisfied(users, self.group[i])
+
+    def add(self, users, i):
+        """users got seminar i: set the bit of its group (pairs of users and groups without duplicates)."""
+        g = self.group[i]
+        self.bits[users, g >> 3] |= (1 << (g & 7)).astype('uint8')
+
+    def discard(self, users, i):
+        """users gave up seminar i, their only seminar of its group: clear the bit."""
+        g = self.group[i]
+        self.bits[users, g >> 3] &= ~(1 << (g & 7)).astype('uint8')
+
+class WeightClasses:
+    """Per seminar the eligible registered users grouped by weight class, i.e. by their number of
+    assigned seminars (sampler='buckets'). The entries of a seminar are kept in the order
+    [not eligible | class 0 | class 1 | ...] with the class boundaries per seminar: the class sizes
+    are read in O(#classes), and a user is moved to the next class (or out) by swapping the entry
+    to the class boundary, only for the entries of the selected users."""
+    def __init__(self, x, rows, maximum):
+        x = asColumns(x)
+        self.indptr = x.indptr
+        self.rows = rows # requested seminars per user (CSR)
+        self.seminar = np.repeat(np.arange(x.shape[1]), np.diff(x.indptr)) # seminar of each entry
+        self.user = x.indices # user of each entry
+        self.numUsers = x.shape[0]
+        self.key = self.seminar*self.numUsers+self.user # ascending: entry of (user, seminar) by searchsorted
+        live = (x.data > 0) & (maximum > 0)
+        requests = np.bincount(self.user[live], minlength=x.shape[0])
+        self.numClasses = max(1, min(maximum, int(requests.max(initial=0)))) # the maximum or all requests assigned: not eligible
+        self.state = np.where(live, 0, -1) # class of each entry, -1: not eligible
+        self.slots = np.argsort(2*self.seminar+live, kind='stable') # entries in the order of the classes per seminar
+        self.pos = np.empty_like(self.slots) # slot of each entry
+        self.pos[self.slots] = np.arange(self.slots.size)
+        self.bounds = np.empty((x.shape[1], self.numClasses+1), dtype='int64') # first slot of each class, end of the seminar
+        self.bounds[:, 0] = x.indptr[:-1]+np.bincount(self.seminar[~live], minlength=x.shape[1])
+        self.bounds[:, 1:] = x.indptr[1:, None]
+        self.flag = np.zeros(self.slots.size, dtype=bool) # scratch of _move
+
+    def counts(self, i):
+        """Eligible users of seminar i per class."""
+        return np.diff(self.bounds[i])
+
+    def eligible(self, i):
+        """Eligible users of seminar i in ascending order."""
+        return np.sort(self.user[self.slots[self.bounds[i, 0]:self.indptr[i+1]]])
+
+    def sample(self, i, size, weights, rng=None):
+        """Draw `size` eligible users of seminar i in the order of the draw, weights: weight of a user per
+        class; only the drawn classes and the drawn users are visited."""
+        rng = rng or np.random
+        n = self.counts(i)
+        drawn, rank = drawClasses(n, weights, size, rng)
+        select = np.empty(min(size, n.sum()), dtype='int64')
+        weighted = select[:drawn.size]
+        for c in np.unique(drawn):
+            mask = drawn == c
+            weighted[mask] = self.bounds[i, c]+distinctPositions(n[c], mask.sum(), rng)[rank[mask]]
+        if drawn.size < select.size: # only users with weight 0 are left, they follow in uniform order
+            zero = np.concatenate([np.arange(self.bounds[i, c], self.bounds[i, c+1]) for c in np.flatnonzero(weights == 0)])
+            select[drawn.size:] = zero[distinctPositions(zero.size, select.size-drawn.size, rng)]
+        return self.user[self.slots[select]]
+
+    def update(self, users, i, done, atCapacity, group):
+        """users got seminar i: their entries of the seminars not yet done move to the next class, or
+        out if the user reached the maximum (atCapacity per user) or now has a seminar of group[i]."""
+        indptr = self.rows.indptr
+        start, length = indptr[users], indptr[users+1]-indptr[users]
+        seminars = self.rows.indices[np.repeat(start-np.cumsum(length)+length, length)+np.arange(length.sum())]
+        keep = ~done[seminars]
+        key = seminars[keep]*self.numUsers+np.repeat(users, length)[keep]
+        order = np.argsort(key) # ascending keys: searchsorted continues from the previous entry
+        entries = np.searchsorted(self.key, key[order])
+        live = self.state[entries] >= 0
+        out = (np.repeat(atCapacity, length)[keep][order] | (group[key[order] // self.numUsers] == group[i]))[live]
+        entries = entries[live]
+        leaving = entries[out]
+        while leaving.size: # class by class down to not eligible
+            self._move(leaving, -1)
+            leaving = leaving[self.state[leaving] >= 0]
+        self._move(entries[~out], 1)
+
+    def _move(self, entries, step):
+        """Move the entries one class up (step 1) or down (step -1, below class 0: not eligible). Per
+        seminar and class the t moving entries are swapped into the last (up) or first (down) t slots
+        of the class, then the boundary is shifted by t."""
+        if entries.size == 0:
+            return
+        width = self.numClasses+1
+        key = self.seminar[entries]*width+self.state[entries]
+        order = np.argsort(key, kind='stable')
+        entries, key = entries[order], key[order]
+        first = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        t = np.diff(np.append(first, key.size))
+        s, c = self.seminar[entries[first]], self.state[entries[first]]
+        b = c+1 if step > 0 else c # boundary which is shifted
+        lo = self.bounds[s, b]-t if step > 0 else self.bounds[s, b]
+        start = np.repeat(lo, t)
+        target = start+np.arange(entries.size)-np.repeat(first, t) # slots of the moved entries
+        slot = self.pos[entries]
+        inside = (slot >= start) & (slot < start+np.repeat(t, t))
+        self.flag[slot[inside]] = True
+        blocked = target[~self.flag[target]] # target slots of other entries of the class
+        self.flag[slot[inside]] = False
+        moving = slot[~inside]
+        a, z = self.slots[blocked], self.slots[moving]
+        self.slots[blocked], self.slots[moving] = z, a
+        self.pos[z], self.pos[a] = blocked, moving
+        self.bounds[s, b] += -t if step > 0 else t
+        self.state[entries] += step
+
+#%%
+def readExcelFile(file='input2021.xlsx', defaultNumberParticipantsPerSeminar=12, sparse=False, blockSize=4096):
+    from pandas import read_excel
+
+    WS = read_excel(file, sheet_name='registrierung')
+
+    def checkPlaetze(v):
+        if isinstance(v, int):
+            return v==-99
+        else:
+            return v.lower() in ['platz','plaetze','plätze']
+
+    def checkInhaltlich(v):
+        if isinstance(v, int):
+            return v==-100
+        else:
+            return v.lower() in ['inhalt','inhaltlich','content']
+
+    def getValuesForLabel_andRemove(fun=checkPlaetze, warning='Plaetze', defaultVal=12):
+        s = (WS.iloc[:, 0]).apply(fun)
+        res = np.where(s)[0]
+        if len(res)==0: # zeile fehlt
+            h = [defaultVal]*(WS.shape[1]-1)
+            dropIndex = []
+        elif len(res)==1: # genau 1 zeile existiert
+            h = WS.iloc[res[0] ,1:].values
+            dropIndex = [res[0]]
+            #WS.drop(WS.index[res[0]], inplace=True)
+        else: # several entries
+            raise ValueError(f'Several rows for {warning}: Row {res+2}!')
+
+        return h, dropIndex
+
+
+    numPlaetzeFromExcel, dropIndex1 = getValuesForLabel_andRemove()
+    inhaltlich, dropIndex2 = getValuesForLabel_andRemove(checkInhaltlich, warning='inhaltlich', defaultVal=None)
+
+    w = reduce(iconcat,[dropIndex1, dropIndex2],[])
+    WS.drop(WS.index[w], inplace=True)
+
+    if sparse: # convert blocks of rows, so that the dense int matrix is never created
+        users, seminars, values = [], [], []
+        for start in range(0, WS.shape[0], blockSize):
+            block = WS.iloc[start:start+blockSize, 1:].values.astype('int')
+            u, s = np.nonzero(block)
+            users.append(u+start); seminars.append(s); values.append(block[u,s])
+        x = RegistrationMatrix.fromCoordinates(np.concatenate(users or [[]]), np.concatenate(seminars or [[]]),
+                                               np.concatenate(values or [np.zeros(0, dtype='int')]), (WS.shape[0], WS.shape[1]-1))
+        userid = WS.iloc[:,0].values
+    else:
+        matrix = np.array(WS)
+        x = matrix[:,1:].astype('int')
+        userid = matrix[:,0]
+
+
+
+    return WS, x, userid, numPlaetzeFromExcel, inhaltlich
+
+#%% other, content-wise related seminars: subtract the requests of the users from the request counts
+def removeRequests(rows, r, I, done, users, group, g):
+    """rows: requested seminars per user (CSR); only the rows of the users are visited,
+    independent of the number of seminars in group g."""
+    start, length = rows.indptr[users], rows.indptr[users+1]-rows.indptr[users]
+    pos = np.repeat(start-np.cumsum(length)+length, length)+np.arange(length.sum())
+    seminars, values = rows.indices[pos], rows.data[pos]
+    keep = (group[seminars] == g) & ~done[seminars]
+    seminars, inverse = np.unique(seminars[keep], return_inverse=True)
+    removed = np.zeros(seminars.size, dtype=r.dtype)
+    np.add.at(removed, inverse, values[keep])
+    r[seminars] -= removed
+    for s in seminars[removed != 0]:
+        heapq.heappush(I, (r[s], s))
+
+#%% Assignment of people to requested seminars: there are several more options implemented, but we are using here the default values only
+# x[user_id, seminar_id]
+def assignmentMatrix(matrix,numParticipantsPerSeminar, semTypes, inhaltlich,
+                     maxSeminarsAssignedPerParticipant=999,
+                     at_least_one_seminar_prob_factor = 100.0,
+                     seed=None, addToLowest=1.0, sampler='legacy', verbose=False, seminarNames=None, trace=None, profile=None,
+                     rng='legacy'):
+
+    x = asColumns(matrix) # not changed: content-identical seminars are excluded by the bitmask of groups
+    sample = getSampler(sampler)
+    n, numSeminars = x.shape
+    groups = ContentGroups(semTypes, numSeminars, n)
+    rows = x.T # requested seminars per user
+
+    # rng='streams': one Generator per seminar (gluecksfee.streams), otherwise the global np.random
+    streams = seminarStreams(seed, seminarNames if seminarNames is not None else range(numSeminars), 'assign') if rng == 'streams' else None
+    if streams is None:
+        np.random.seed(seed)
+    y = [None]*numSeminars # assignment: assigned users per seminar
+    assigned = np.zeros(n, dtype=x.dtype) # number of seminars assigned per user, i.e. y.sum(axis=1)
+    atCapacity = assigned >= maxSeminarsAssignedPerParticipant # users which reached the maximum
+    buckets = WeightClasses(x, rows, maxSeminarsAssignedPerParticipant) if getattr(sample, 'usesClasses', False) else None
+
+    #I = np.argsort(x.sum(axis=0)) # smallest seminars first
+    r = x.sum(axis=0) # number of requests r_i per seminar, updated incrementally
+    I = [(r[i], i) for i in range(numSeminars)] # heap of seminars which need to be assigned
+    heapq.heapify(I)
+    done = np.zeros(numSeminars, dtype=bool)
+
+
+    if verbose:
+        probsPerRound = []
+        requested = asColumns(matrix).T # requested seminars per user
+        assignedSeminars = [[] for _ in range(n)]
+    #print(f'Seminarreihenfolge: {I}')
+
+    while len(I)>0:
+        # determine next (least popular) seminar from remaining with minimum number of requests;
+        # ties are broken by the smaller seminar index, as np.argmin did on the remaining list
+        ri, i = heapq.heappop(I)
+        if done[i] or ri != r[i]: # outdated heap entry
+            continue
+        done[i] = True
+        if profile is not None:
+            roundStart = time.perf_counter()
+
+        if buckets is None:
+            registeredUsers = x.registered(i)
+            registeredUsers = registeredUsers[~atCapacity[registeredUsers] & groups.eligible(registeredUsers, i)]
+            numRegistered = len(registeredUsers)
+        else: # eligible users per weight class; the users themselves only if they are all assigned or reported
+            counts = buckets.counts(i)
+            numRegistered = counts.sum()
+            registeredUsers = buckets.eligible(i) if numRegistered <= numParticipantsPerSeminar[i] or verbose or trace is not None else None
+
+        if numRegistered <= numParticipantsPerSeminar[i]:
+            select = registeredUsers
+
+            if verbose:
+                    print(f'seminar {i} ({numParticipantsPerSeminar[i]} places): registrations {len(registeredUsers)}')
+                    print(f'   registered users: {registeredUsers}')
+                    print('   Wahrscheinlichkeit: alle TN zugewiesen')
+                    probsPerRound.append(([1],['*'],[len(registeredUsers)]))
+            if trace is not None:
+                trace.round('assign', i, numParticipantsPerSeminar[i], registeredUsers, select,
+                            rng=rngDigest(streams[i] if streams is not None else None))
+        else:
+
+            if registeredUsers is not None:
+                assigned_places_so_far = assigned[registeredUsers]
+                curMax = np.max(assigned_places_so_far)
+
+                p = (curMax+addToLowest-assigned_places_so_far)
+
+                noseminarsofar = assigned_places_so_far==0
+                p[noseminarsofar] *= at_least_one_seminar_prob_factor
+                p = p/p.sum()
+
+            if trace is not None:
+                state = rngDigest(streams[i] if streams is not None else None)
+            if buckets is not None: # the same weights per class: curMax is the highest class with users
+                weights = np.flatnonzero(counts)[-1]+addToLowest-np.arange(counts.size, dtype='float')
+                weights[0] *= at_least_one_seminar_prob_factor
+                select = buckets.sample(i, numParticipantsPerSeminar[i], weights, streams[i] if streams is not None else None)
+            elif streams is None:
+                select = sample(registeredUsers, numParticipantsPerSeminar[i], p)
+            else:
+                select = sample(registeredUsers, numParticipantsPerSeminar[i], p, rng=streams[i])
+            if trace is not None:
+                trace.round('assign', i, numParticipantsPerSeminar[i], registeredUsers, select, assigned_places_so_far, p, state)
+
+            if verbose:
+                bi = np.bincount(assigned_places_so_far)
+                probsPerRound.append((np.unique(p)[::-1],np.unique(assigned_places_so_far), bi[bi>0]) )
+
+            if verbose:
+                print(f'seminar {i} ({numParticipantsPerSeminar[i]} places): registrations {len(registeredUsers)}')
+                print(f'    registered users: {registeredUsers}')
+                for (theuser,theprob) in zip(registeredUsers, p):
+                    theass = np.squeeze(np.sort(np.array(assignedSeminars[theuser], dtype='int')))
+                    seminars, values = requested.column(theuser)
+                    thereq = np.squeeze(seminars[values!=0])
+                    print(f'    user {theuser} has {assigned[theuser]} seminars assigned: {theass} and requested {thereq}; prob. for next seminar {theprob*100:.2f}%')
+                print(f'    Zugewiesene Teilnehmer for seminar {i}: ({len(select)}) people = {np.sort(select)}')
+
+        y[i] = select
+        assigned[select] += 1
+        atCapacity[select] = assigned[select] >= maxSeminarsAssignedPerParticipant
+        if buckets is not None:
+            buckets.update(select, i, done, atCapacity[select], groups.group)
+        if verbose:
+            for u in select:
+                assignedSeminars[u].append(i)
+
+        groups.add(select, i)
+        removeRequests(rows, r, I, done, select, groups.group, groups.group[i])
+        if profile is not None:
+            profile.round('assign', i, numRegistered, time.perf_counter()-roundStart)
+
+    if verbose:
+        for k, (probs, assSems, nAss) in enumerate(probsPerRound):
+            s = f'Round {k}: Seminar "{seminarNames[k] if seminarNames is not None else k}" '
+            for i,p in enumerate(probs):
+                s+=f'p_{assSems[i]}={p*100:.4f}% ({nAss[i]}); '
+            print(s)
+
+    y = RegistrationMatrix.fromColumns([(users, 1) for users in y], x.shape, dtype=x.dtype)
+    return y if isinstance(matrix, RegistrationMatrix) else y.toDense()
+
+#%% requests for the waiting lists: users with a seminar of a content group are removed from all seminars of that group
+def waitingListRequests(matrix, y, semTypes):
+    wx = asColumns(matrix)
+    wx = wx.copy() if wx is matrix else wx
+    groups = ContentGroups.fromAssignment(semTypes, y)
+    seminars = np.repeat(np.arange(wx.shape[1]), np.diff(wx.indptr))
+    wx.data[groups.satisfied(wx.indices, groups.group[seminars])] = 0
+    return wx if isinstance(matrix, RegistrationMatrix) else wx.toDense()
+
+#%% Assignment of people to requested seminars: there are several more options implemented, but we are using here the default values only
+# x[user_id, seminar_id]
+def waitlistLevels(x, I):
+    """Level of each seminar in the processing order I: a seminar only depends on the earlier
+    seminars sharing a registered user, so seminars of the same level can be drawn in parallel."""
+    x = asColumns(x)
+    last = np.zeros(x.shape[0], dtype='int') # level of the last seminar per user
+    level = np.zeros(x.shape[1], dtype='int')
+    for i in I:
+        users = x.registered(i)
+        level[i] = last[users].max()+1 if users.size else 1
+        last[users] = level[i]
+    return level
+
+def drawWaitlist(registeredUsers, size, p, sample, stream=None, keepState=False):
+    """Draw of one waiting list (also in a worker process of waitingPlacesMatrix): the selected users,
+    the state of the generator after the draw if keepState, and the seconds of the draw."""
+    start = time.perf_counter()
+    select = sample(registeredUsers, size, p) if stream is None else sample(registeredUsers, size, p, rng=stream)
+    after = None
+    if keepState:
+        after = stream.bit_generator.state if stream is not None else np.random.get_state(legacy=False)
+    return select, after, time.perf_counter()-start
+
+def waitingPlacesMatrix(matrix,numParticipantsPerSeminar, semTypes, inhaltlich, preAssigned,
+                     at_least_one_seminar_prob_factor = 100.0,
+                     seed=None, addToLowest=1.0, sampler='legacy', verbose=False, seminarNames=None, userid=None, trace=None,
+                     profile=None, rng='legacy', workers=None, topK=None, remainder=None):
+    """Waiting list per seminar as weighted permutation of its registered users. With topK only the
+    first topK places are drawn; the other users get the mean rank of the places not drawn. If
+    remainder is a dict, it receives per seminar name the users not drawn, their weights and the
+    state of the random generator after the draw (see gluecksfee.waitlist.extendWaitlist)."""
+
+    x = asColumns(matrix)
+    sample = getSampler(sampler)
+    if seminarNames is None:
+        seminarNames = np.arange(x.shape[1])
+    if userid is None:
+        userid = np.arange(x.shape[0])
+
+    n, numSeminars = x.shape
+    # rng='streams': one Generator per seminar (gluecksfee.streams), otherwise the global np.random
+    streams = seminarStreams(seed, seminarNames, 'waitlist') if rng == 'streams' else None
+    if streams is None:
+        np.random.seed(seed)
+
+    y = [((), 0.0)]*numSeminars # waiting list weights per seminar
+    waiting = np.zeros(n) # sum of the waiting list weights per user, i.e. y.sum(axis=1)
+    order = {}
+
+    # the requests x do not change here, so the seminars are processed from the most popular
+    # to the least popular; a stable sort keeps the smaller seminar index first for ties
+    r = x.sum(axis=0) # number of requests r_i per seminar
+    I = np.argsort(-r, kind='stable') # list of seminars which need to be assigned
+
+    def weights(i):
+        """Registered users of seminar i, their waiting list weights so far, p and the places to draw."""
+        registeredUsers = x.registered(i)
+        #print(registeredUsers)
+        #print(registeredUsers.size)
+        if registeredUsers.size <= 1:
+            return registeredUsers, None, None, registeredUsers.size
+
+        assigned_places_so_far = waiting[registeredUsers]+preAssigned[registeredUsers]
+        curMax = np.max(assigned_places_so_far)
+
+        p = (curMax+addToLowest-assigned_places_so_far)
+
+        noseminarsofar = assigned_places_so_far==0
+        p[noseminarsofar] *= at_least_one_seminar_prob_factor
+        p = p/p.sum()
+
+        size = registeredUsers.size if topK is None else min(topK, registeredUsers.size)
+        return registeredUsers, assigned_places_so_far, p, size
+
+    def draw(i):
+        """Waiting list of seminar i for the current weights:
+        (registeredUsers, select, assigned, p, rng state, rng state after the draw, seconds)."""
+        if profile is not None:
+            roundStart = time.perf_counter()
+        registeredUsers, assigned_places_so_far, p, size = weights(i)
+        stream = streams[i] if streams is not None else None
+        state = rngDigest(stream) if trace is not None and registeredUsers.size > 0 else None
+        if registeredUsers.size <= 1:
+            return registeredUsers, registeredUsers, None, None, state, None, (time.perf_counter()-roundStart if profile is not None else None)
+        select, after, _ = drawWaitlist(registeredUsers, size, p, sample, stream, remainder is not None and size < registeredUsers.size)
+        return registeredUsers, select, assigned_places_so_far, p, state, after, (time.perf_counter()-roundStart if profile is not None else None)
+
+    def apply(i, res):
+        registeredUsers, select, assigned_places_so_far, p, state, after, seconds = res
+        if registeredUsers.size == 0:
+            order[i] = []
+        elif registeredUsers.size == 1:
+            order[i] = [userid[registeredUsers].item()]
+        elif select.size == registeredUsers.size:
+            #y[select,i] = 1
+            rank = (registeredUsers.size-np.arange(registeredUsers.size))/registeredUsers.size
+            y[i] = (select, rank)
+            waiting[select] += rank
+
+            order[i] = userid[select]
+        else:
+            # top K: the users not drawn get the mean rank (m-K+1)/(2m) of the places K+1, ..., m
+            m = registeredUsers.size
+            rank = np.full(m, (m-select.size+1)/(2*m))
+            drawn = np.searchsorted(registeredUsers, select)
+            rank[drawn] = (m-np.arange(select.size))/m
+            y[i] = (registeredUsers, rank)
+            waiting[registeredUsers] += rank
+
+            order[i] = userid[select]
+            if remainder is not None:
+                undrawn = np.ones(m, dtype='bool')
+                undrawn[drawn] = False
+                remainder[seminarNames[i]] = {'users': userid[registeredUsers[undrawn]], 'p': p[undrawn],
+                                              'state': after, 'position': select.size}
+        if trace is not None and registeredUsers.size > 0:
+            trace.round('waitlist', i, numParticipantsPerSeminar[i], registeredUsers, select, assigned_places_so_far, p, state)
+        if profile is not None:
+            profile.round('waitlist', i, registeredUsers.size, seconds)
+
+    level = waitlistLevels(x, I) if streams is not None and workers is not None and workers > 1 else None
+    if level is not None and np.bincount(level).max(initial=0) > 1:
+        # seminars of one level share no user, their weights do not depend on each other and
+        # each one draws from its own stream: the result is the same as in the serial loop.
+        # The weights are computed here, the draws run in worker processes with a copy of the stream;
+        # a level with a single seminar is drawn here.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for l in range(1, level.max(initial=0)+1):
+                seminars = I[level[I] == l]
+                if seminars.size == 1:
+                    apply(seminars[0], draw(seminars[0]))
+                    continue
+                jobs = []
+                for i in seminars:
+                    start = time.perf_counter()
+                    registeredUsers, assigned_places_so_far, p, size = weights(i)
+                    state = rngDigest(streams[i]) if trace is not None and registeredUsers.size > 0 else None
+                    future = None
+                    if registeredUsers.size > 1:
+                        future = pool.submit(drawWaitlist, registeredUsers, size, p, sample, streams[i],
+                                             remainder is not None and size < registeredUsers.size)
+                    jobs.append((i, registeredUsers, assigned_places_so_far, p, state, future, time.perf_counter()-start))
+                for i, registeredUsers, assigned_places_so_far, p, state, future, seconds in jobs:
+                    select, after, drawn = future.result() if future is not None else (registeredUsers, None, 0.0)
+                    apply(i, (registeredUsers, select, assigned_places_so_far, p, state, after, seconds+drawn))
+    else:
+        for i in I:
+            apply(i, draw(i))
+    order = {seminarNames[i]: order[i] for i in I}
+
+    y = RegistrationMatrix.fromColumns(y, x.shape, dtype='float')
+    return (y if isinstance(matrix, RegistrationMatrix) else y.toDense()), order
+
+#%% Library interface: a single draw from an input file
+class Lottery:
+    """Auslosung als Objekt, die Skripte gluecksfee2.py und gluecksfee3.py nutzen sie ebenfalls:
+
+        lottery = Lottery(seed='Seminare 2021', maximum=2).load('input.xlsx')
+        y = lottery.assign()
+        order = lottery.waitlist()
+        lottery.export('output.xlsx')
+    """
+    def __init__(self, seed=None, maximum=999, sampler='legacy', sparse=False, verbose=False, reader=None, cache=None, writer=None,
+                 trace=None, profile=None, rng='legacy', workers=None, waitlistTop=None, engine='lottery', timeBudget=None):
+        self.seed = seed if seed is not None else datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+        self.maximum = maximum
+        self.sampler = sampler
+        self.rng = rng # 'legacy': global np.random, 'streams': one Generator per seminar (gluecksfee.streams)
+        self.workers = workers # worker processes for the waiting lists with rng='streams'
+        self.waitlistTop = waitlistTop # only the first K places per waiting list, None: all
+        self.engine = engine # 'lottery': assignmentMatrix, 'flow': coverage-first flow (gluecksfee.flow)
+        self.timeBudget = timeBudget # seconds for engine='flow', None: no limit
+        self.flowStats = None
+        self.sparse = sparse
+        self.verbose = verbose
+        self.reader = reader # see gluecksfee.readers, default: by file extension
+        self.cache = cache # gluecksfee.cache.InputCache or its directory, None: no cache
+        self.writer = writer # see gluecksfee.output, default: by file extension
+        self.trace = trace # file of the round trace (.jsonl or .parquet) or a gluecksfee.trace.TraceWriter
+        self._tracer = None
+        self.profile = profile # gluecksfee.profiler.Profiler, None: no measurements
+        self.input = None
+        self.y = None # assignment x[user_id, seminar_id]
+        self.y_wait = None # waiting list ranks
+        self.order = None # waiting list per seminar name
+        self.waitlistRest = None # with waitlistTop: users not drawn per seminar name, see gluecksfee.waitlist
+        self._views = None
+
+    @property
+    def seedValue(self):
+        return seedFromString(self.seed)
+
+    def _seed(self):
+        """Seed of the draw functions: the seed string for the streams, else seedFromString."""
+        with phase(self.profile, 'seedFromString'):
+            return self.seed if self.rng == 'streams' else self.seedValue
+
+    def load(self, file):
+        if self.cache is not None:
+            from gluecksfee.cache import InputCache, readCached
+            cache = self.cache if isinstance(self.cache, InputCache) else InputCache(self.cache)
+            with phase(self.profile, 'readCached'):
+                self.seminarNames, self.x, self.userid, self.numParticipantsPerSeminar, self.inhaltlich, self.semTypes = \
+                    readCached(file, cache, reader=self.reader, sparse=self.sparse)
+        else:
+            from gluecksfee.readers import readRegistrations
+            with phase(self.profile, 'readRegistrations'):
+                self.seminarNames, self.x, self.userid, self.numParticipantsPerSeminar, self.inhaltlich = \
+                    readRegistrations(file, reader=self.reader, sparse=self.sparse)
+            with phase(self.profile, 'hashSemTypes'):
+                self.semTypes = hashSemTypes(self.inhaltlich)
+        self.input = file
+        self.y = self.y_wait = self.order = self.waitlistRest = self._views = None
+        return self
+
+    def assign(self):
+        if self.engine == 'flow':
+            from gluecksfee.flow import flowAssignment
+            self.flowStats = {}
+            with phase(self.profile, 'flowAssignment'):
+                self.y = flowAssignment(self.x, self.numParticipantsPerSeminar, self.semTypes, self.inhaltlich,
+                                        maxSeminarsAssignedPerParticipant=self.maximum, seed=self.seedValue,
+                                        timeBudget=self.timeBudget, verbose=self.verbose, stats=self.flowStats)
+            self._views = None
+            return self.y
+        seed = self._seed()
+        trace = self.tracer()
+        with phase(self.profile, 'assignmentMatrix'):
+            self.y = assignmentMatrix(self.x, self.numParticipantsPerSeminar, self.semTypes, self.inhaltlich,
+                                      maxSeminarsAssignedPerParticipant=self.maximum,
+                                      seed=seed, sampler=self.sampler, verbose=self.verbose,
+                                      seminarNames=self.seminarNames, trace=trace, profile=self.profile, rng=self.rng)
+        self._views = None
+        return self.y
+
+    def tracer(self):
+        """TraceWriter of assign() and waitlist(), opened at the first use; None without trace."""
+        if self.trace is None:
+            return None
+        if self._tracer is None:
+            from gluecksfee.trace import TraceWriter, openTrace
+            self._tracer = self.trace if isinstance(self.trace, TraceWriter) else openTrace(self.trace, {
+                'seed': self.seed, 'seedValue': self.seedValue, 'sampler': self.sampler if isinstance(self.sampler, str) else None, 'rng': self.rng,
+                'maximum': self.maximum, 'input': self.input, 'seminarNames': list(self.seminarNames), 'userid': list(self.userid)})
+        return self._tracer
+
+    def close(self):
+        """Write the rest of the trace and close it."""
+        if self._tracer is not None:
+            self._tracer.close()
+            self._tracer = None
+
+    def views(self):
+        """ResultViews of the assignment, built once per draw and shared by summary and export."""
+        from gluecksfee.output import ResultViews
+        if self.y is None:
+            self.assign()
+        if self._views is None:
+            self._views = ResultViews(self.x, self.y)
+        return self._views
+
+    def waitlist(self):
+        if self.y is None:
+            self.assign()
+        with phase(self.profile, 'waitingListRequests'):
+            wx = waitingListRequests(self.x, self.y, self.semTypes)
+        seed = self._seed()
+        trace = self.tracer()
+        self.waitlistRest = {} if self.waitlistTop is not None else None
+        with phase(self.profile, 'waitingPlacesMatrix'):
+            self.y_wait, self.order = waitingPlacesMatrix(wx, self.numParticipantsPerSeminar, self.semTypes, self.inhaltlich,
+                                                          preAssigned=self.y.sum(axis=1, dtype='int'),
+                                                          seed=seed, sampler=self.sampler, verbose=self.verbose,
+                                                          seminarNames=self.seminarNames, userid=self.userid, trace=trace,
+                                                          profile=self.profile, rng=self.rng, workers=self.workers,
+                                                          topK=self.waitlistTop, remainder=self.waitlistRest)
+        return self.order
+
+    def extendWaitlist(self, seminarName, size):
+        """Draw the next `size` places of the waiting list of one seminar (waitlistTop), continuing from
+        the state of the random generator after the last draw; the places are appended to order."""
+        from gluecksfee.waitlist import extendWaitlist
+        if self.waitlistRest is None:
+            raise ValueError('A waiting list can only be extended after waitlist() with waitlistTop')
+        if seminarName not in self.waitlistRest:
+            return self.order[seminarName][:0]
+        users, self.waitlistRest[seminarName] = extendWaitlist(self.waitlistRest[seminarName], size,
+                                                               self.sampler, self.rng)
+        if self.waitlistRest[seminarName]['users'].size == 0:
+            del self.waitlistRest[seminarName]
+        self.order[seminarName] = np.concatenate([self.order[seminarName], users])
+        return users
+
+    def saveWaitlistState(self, file):
+        """Save the state for extending the waiting lists later (python -m gluecksfee.waitlist)."""
+        from gluecksfee.waitlist import saveWaitlistState
+        return saveWaitlistState(file, self.waitlistRest, seed=self.seed, input=self.input, topK=self.waitlistTop, rng=self.rng,
+                                 sampler=self.sampler if isinstance(self.sampler, str) else None)
+
+    def redrawWaitlist(self, seminarName):
+        """Draw the waiting list of one seminar again (rng='streams'): the weights are restored from
+        the waiting lists of the seminars drawn before it, the seminar draws from its own stream.
+        Returns the waiting list, which is the one of waitlist() for the same input and seed."""
+        from gluecksfee.streams import seminarStream
+        if self.rng != 'streams':
+            raise ValueError("A single seminar can only be drawn again with rng='streams'")
+        if self.order is None:
+            self.waitlist()
+        wx = asColumns(waitingListRequests(self.x, self.y, self.semTypes))
+        i = list(self.seminarNames).index(seminarName)
+        I = list(np.argsort(-wx.sum(axis=0), kind='stable'))
+        yw = asColumns(self.y_wait)
+        waiting = np.zeros(wx.shape[0]) # waiting list weights of the seminars before i
+        for j in I[:I.index(i)]:
+            users, rank = yw.column(j)
+            waiting[users] += rank
+        users = wx.registered(i)
+        if users.size <= 1:
+            return [self.userid[users].item()] if users.size else []
+        y, order = waitingPlacesMatrix(RegistrationMatrix.fromColumns([(users, 1)], (wx.shape[0], 1)), [self.numParticipantsPerSeminar[i]],
+                                       {0: np.array([0])}, [0], preAssigned=self.y.sum(axis=1, dtype='int')+waiting,
+                                       seed=self.seed, sampler=self.sampler, seminarNames=[seminarName], userid=self.userid,
+                                       rng='streams', topK=self.waitlistTop)
+        return order[seminarName]
+
+    def parameters(self, output):
+        return [f'Seed für Zufallszahlen: "{self.seed}"', f'Eingabe-Datei: {self.input}',
+                f'Ausgabe-Datei: {output}', f'Maximale #Seminare: {self.maximum}', f'Verbose: {self.verbose}',
+                f'Sampler: {self.sampler}', f'Sparse: {self.sparse}'] + \
+               ([f'RNG: {self.rng}'] if self.rng != 'legacy' else []) + \
+               ([f'Engine: flow ({self.flowStats.get("augmentations")} augmentierende Wege, '
+                 f'{"optimal" if self.flowStats.get("optimal") else f"Zeitbudget von {self.timeBudget} s erreicht"})']
+                if self.engine == 'flow' and self.flowStats is not None else []) + \
+               ([f'Warteliste: erste {self.waitlistTop} Plätze'] if self.waitlistTop is not None else []) + \
+               ([f'Trace: {self.trace}'] if isinstance(self.trace, str) else []) + \
+               ([f'Laufzeit bis zur Ausgabe: {self.profile.total:.3f} s'] if self.profile is not None else [])
+
+    def metrics(self):
+        """gluecksfee.metrics.FairnessMetrics of the assignment, computed from the counters of the ResultViews."""
+        from gluecksfee.metrics import FairnessMetrics
+        views = self.views()
+        with phase(self.profile, 'metrics'):
+            return FairnessMetrics(views.requested, self.numParticipantsPerSeminar, views.anfragen).add(views.assigned, views.teilnehmer)
+
+    def export(self, file, parameters=None, metrics=None, sheets=None):
+        """Write the output (Excel, or CSV/Parquet per sheet); the sheet Warteplaetze only exists after waitlist(),
+        the sheet Metrics only with metrics (see metrics()). sheets: names of the sheets, default all."""
+        from gluecksfee.output import getWriter, needsViews, selectSheets
+        if parameters is None:
+            parameters = self.parameters(file)
+        with phase(self.profile, 'export'):
+            views = None
+            if needsViews(selectSheets(sheets, self.order, metrics)):
+                with phase(self.profile, 'ResultViews'):
+                    views = self.views()
+            getWriter(file, self.writer)(file, self.x, self.y, self.userid, self.seminarNames, self.numParticipantsPerSeminar,
+                                         parameters, order=self.order, views=views, profile=self.profile, metrics=metrics,
+                                         sheets=sheets)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Kennzahlen der Fairness einer Auslosung oder einer Monte-Carlo-Simulation (--metrics)
+
+FairnessMetrics bekommt pro Auslosung nur die Zähler, die ohnehin berechnet
+werden: zugewiesene Seminare pro Person und Teilnehmer pro Seminar (dazu einmal
+die Anmeldungen pro Person und pro Seminar). Pro Person wird nichts gespeichert,
+sondern nur das gemeinsame Histogramm (angemeldet, zugewiesen); daraus ergeben
+sich ohne weiteren Durchlauf über die Personen
+  Anteil mit mind. 1 Seminar   Personen mit mind. einem Seminar / Personen mit Anmeldung
+  Jain-Index (ratio)           (Summe ratio)^2 / (N * Summe ratio^2), 1: alle gleich
+  Gini (ratio)                 0: alle gleich, nahe 1: sehr ungleich
+  Histogramm                   Anzahl der Personen mit 0, 1, 2, ... Seminaren
+mit ratio = zugewiesen/angemeldet (s. Stats_Person). Pro Seminar kommen die
+Überbuchung (Anfragen/Plaetze) und die Anfragen ohne Platz dazu. Bei mehreren
+Durchläufen werden die Histogramme addiert und die Kennzahlen pro Durchlauf mit
+Mittelwert, Standardabweichung, Minimum und Maximum zusammengefasst; zwei
+FairnessMetrics werden mit merge zusammengeführt.
+
+Das Ergebnis wird als Sheet Metrics in die Ausgabe und als JSON-Datei (Default
+<Ausgabe>_metrics.json) geschrieben, um Veranstaltungen und Durchläufe ohne die
+ganze Ausgabe zu vergleichen.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import json
+import os.path
+
+import numpy as np
+
+KEYS = [('coverage', 'Anteil mit mind. 1 Seminar'), ('jain', 'Jain-Index (ratio)'),
+        ('gini', 'Gini (ratio)'), ('placesUsed', 'Anteil vergebener Plätze')]
+
+def metricsFile(output):
+    """Default file of the metrics: output.xlsx -> output_metrics.json"""
+    return f'{os.path.splitext(str(output))[0]}_metrics.json'
+
+#%% metrics of the joint histogram (requested, assigned)
+def ratioValues(joint):
+    """Distinct values of ratio=assigned/requested in ascending order and the number of persons
+    with each value; persons without requests are left out."""
+    r, a = np.nonzero(joint[1:])
+    count = joint[1:][r, a]
+    values, inverse = np.unique(a/(r+1), return_inverse=True)
+    return values, np.bincount(inverse, weights=count, minlength=values.size)
+
+def jainIndex(values, count):
+    s, sq, n = (count*values).sum(), (count*values**2).sum(), count.sum()
+    return s**2/(n*sq) if sq > 0 else np.nan
+
+def giniCoefficient(values, count):
+    """Gini of grouped values (ascending): sum_i (2i-N-1) x_(i) / (N sum x) over the sorted values,
+    a group of c equal values at the positions p+1, ..., p+c contributes c (2p+c-N) v."""
+    n, s = count.sum(), (count*values).sum()
+    if s <= 0:
+        return np.nan
+    before = np.cumsum(count)-count
+    return (values*count*(2*before+count-n)).sum()/(n*s)
+
+class FairnessMetrics:
+    """Streaming fairness metrics: add() takes the counters of one draw, merge() the metrics of
+    other runs (e.g. of the worker processes of --simulate)."""
+    def __init__(self, requested, places, requests=None):
+        self.requested = np.asarray(requested, dtype='int64') # requests per person
+        self.places = np.asarray(places, dtype='float') # places per seminar
+        self.requests = None if requests is None else np.asarray(requests, dtype='float') # requests per seminar
+        size = int(self.requested.max(initial=0))+1
+        self.joint = np.zeros((size, size)) # persons per (requested, assigned), summed over the runs
+        self.filled = np.zeros(self.places.size) # assigned places per seminar, summed over the runs
+        self.runs = 0
+        self.acc = {key: np.array([0.0, 0.0, np.inf, -np.inf]) for key, _ in KEYS} # sum, sum of squares, min, max
+
+    def add(self, assigned, filled):
+        """Counters of one draw: assigned seminars per person and assigned places per seminar."""
+        assigned = np.asarray(assigned, dtype='int64').ravel()
+        size = self.joint.shape[0]
+        joint = np.bincount(self.requested*size+np.minimum(assigned, size-1), minlength=size*size).reshape(size, size)
+        self.joint += joint
+        filled = np.asarray(filled, dtype='float').ravel()
+        self.filled += filled
+        self.runs += 1
+        for key, v in self.values(joint, filled).items():
+            acc = self.acc[key]
+            if not np.isnan(v):
+                acc += [v, v**2, 0, 0]
+                acc[2:] = min(acc[2], v), max(acc[3], v)
+        return self
+
+    def values(self, joint, filled):
+        values, count = ratioValues(joint)
+        persons = joint[1:].sum()
+        return {'coverage': joint[1:, 1:].sum()/persons if persons else np.nan,
+                'jain': jainIndex(values, count), 'gini': giniCoefficient(values, count),
+                'placesUsed': filled.sum()/self.places.sum() if self.places.sum() > 0 else np.nan}
+
+    def merge(self, other):
+        self.joint += other.joint
+        self.filled += other.filled
+        self.runs += other.runs
+        for key, acc in self.acc.items():
+            v = other.acc[key]
+            acc[:2] += v[:2]
+            acc[2:] = min(acc[2], v[2]), max(acc[3], v[3])
+        return self
+
+    #%% results
+    def summary(self):
+        """Per metric mean, std, min and max over the runs."""
+        runs = max(self.runs, 1)
+        res = {}
+        for key, _ in KEYS:
+            s, sq, vmin, vmax = self.acc[key]
+            mean = s/runs if np.isfinite(vmin) else np.nan
+            res[key] = {'mean': mean, 'std': np.sqrt(max(sq/runs-mean**2, 0)) if np.isfinite(vmin) else np.nan,
+                        'min': vmin if np.isfinite(vmin) else np.nan, 'max': vmax if np.isfinite(vmax) else np.nan}
+        return res
+
+    def histogram(self):
+        """Mean number of persons (with requests) per number of assigned seminars."""
+        h = self.joint[1:].sum(axis=0)/max(self.runs, 1)
+        return h[:np.flatnonzero(h)[-1]+1] if h.any() else h[:1]
+
+    def seminars(self):
+        """Per seminar: places, requests, oversubscription requests/places, mean participants and the
+        requests without a place."""
+        filled = self.filled/max(self.runs, 1)
+        requests = self.requests if self.requests is not None else np.full(self.places.size, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            over = requests/self.places
+        return {'places': self.places, 'requests': requests, 'oversubscription': over, 'filled': filled,
+                'unmet': np.maximum(requests-filled, 0)}
+
+    def sheet(self, seminarNames):
+        """Sheet Metrics as (name, header, rows, index), see gluecksfee.output.outputSheets; the rows
+        have the same width for the CSV and Parquet writers."""
+        width = 6
+        def rows():
+            summary = self.summary()
+            yield None, ['Durchläufe', self.runs]
+            for key, label in KEYS:
+                v = summary[key]
+                yield None, [label, v['mean'], v['std'], v['min'], v['max']]
+            seminars = self.seminars()
+            yield None, ['Überbuchte Seminare', int((seminars['oversubscription'] > 1).sum())]
+            yield None, ['Anfragen ohne Platz', float(np.nansum(seminars['unmet']))]
+            yield None, []
+            yield None, ['Zugewiesene Seminare', 'Personen']
+            for a, count in enumerate(self.histogram()):
+                yield None, [a, count]
+            yield None, []
+            yield None, ['Seminar', 'Plaetze', 'Anfragen', 'Ueberbuchung', 'Teilnehmer', 'Ohne Platz']
+            for name, *values in zip(seminarNames, *(seminars[key] for key in ['places', 'requests', 'oversubscription', 'filled', 'unmet'])):
+                yield None, [name, *values]
+        padded = ((label, values+[None]*(width-len(values))) for label, values in rows())
+        return ('Metrics', ['Kennzahl', 'Wert', 'Std', 'Min', 'Max', None], padded, False)
+
+    def toJson(self, seminarNames, **header):
+        def number(v):
+            v = float(v)
+            return None if np.isnan(v) else v
+        seminars = self.seminars()
+        return {**header, 'runs': self.runs,
+                'metrics': {key: {k: number(v) for k, v in value.items()} for key, value in self.summary().items()},
+                'histogram': [number(v) for v in self.histogram()],
+                'seminars': [{'name': str(name), **{key: number(seminars[key][i]) for key in seminars}}
+                             for i, name in enumerate(seminarNames)]}
+
+    def write(self, file, seminarNames, **header):
+        with open(file, 'w', encoding='utf-8') as f:
+            json.dump(self.toJson(seminarNames, **header), f, ensure_ascii=False, indent=1, default=str)
+        return file
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+Ausgabe der Auslosung: Zusammenfassung auf der Konsole und Excel-Datei mit den
+Sheets Seminar, Assignment, Difference, Stats_Person, Parameters und Warteplaetze
+
+Die Sheets werden von outputSheets zeilenweise aus den numpy-Arrays erzeugt und
+von einem der Writer (WRITERS, Wahl nach Dateiendung) geschrieben:
+  xlsx     xlsxwriter im constant_memory Modus, jede Zeile wird sofort in die
+           Datei geschrieben; gleiche Inhalte und Formatierung wie bisher
+  csv      eine CSV-Datei pro Sheet: <name>_<Sheet>.csv
+  parquet  eine Parquet-Datei pro Sheet (pyarrow): <name>_<Sheet>.parquet
+  pandas   bisheriger Weg über DataFrame.to_excel (writeExcel)
+Bis auf den pandas-Writer liegt damit nie ein ganzes Sheet im Speicher.
+
+Konsole und Sheets nutzen die gleichen ResultViews: Teilnehmer pro Seminar,
+Seminare pro Teilnehmer sowie Anfragen und Zuweisungen werden einmal aus den
+Nicht-Null-Einträgen von y (und x) gebildet. Die Zusammenfassung auf der
+Konsole ist optional und erzeugt nur die ausgegebenen Zeilen (limit).
+
+pandas, xlsxwriter und pyarrow werden erst beim Schreiben importiert.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import csv
+import math
+import os.path
+
+import numpy as np
+
+from gluecksfee.profiler import phase
+from gluecksfee.sparse import RegistrationMatrix, asColumns, denseRowBlocks, writeMatrixSheet
+
+#%% Views of the result: built once from the nonzero coordinates of x and y
+class ResultViews:
+    """Seminar -> participants (CSC) and participant -> seminars (CSR) of the
+    assignment y, plus the per seminar and per participant counts of the sheets."""
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+        yc = asColumns(y)
+        if (yc.data <= 0).any():
+            users, seminars = yc.indices, np.repeat(np.arange(yc.shape[1]), np.diff(yc.indptr))
+            keep = yc.data > 0
+            yc = RegistrationMatrix.fromCoordinates(users[keep], seminars[keep], yc.data[keep], yc.shape)
+        self.perSeminar = yc # participants per seminar (CSC)
+        self.perParticipant = yc.T # seminars per participant (CSR)
+        self.requestsPerParticipant = asColumns(x).T if isinstance(x, RegistrationMatrix) else None
+
+        self.teilnehmer = np.diff(yc.indptr) # participants per seminar
+        self.anfragen = x.sum(axis=0) # requests per seminar
+        self.requested = x.sum(axis=1).astype('int') # requests per participant
+        self.assigned = y.sum(axis=1) # assigned seminars per participant
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.ratio = self.assigned/self.requested
+            self.zugewiesen = self.teilnehmer/self.anfragen
+
+    def participants(self, i):
+        """Indices of the participants of seminar i in ascending order."""
+        return self.perSeminar.indices[self.perSeminar.indptr[i]:self.perSeminar.indptr[i+1]]
+
+    def seminars(self, u):
+        """Indices of the seminars assigned to participant u in ascending order."""
+        return self.perParticipant.indices[self.perParticipant.indptr[u]:self.perParticipant.indptr[u+1]]
+
+    def assignmentBlocks(self, blockSize=4096):
+        return denseRowBlocks(self.y, blockSize, rows=self.perParticipant)
+
+    def differenceBlocks(self, blockSize=4096):
+        """Blocks of 2*y-x: +1 assigned, -1 requested but not assigned."""
+        blocks = zip(self.assignmentBlocks(blockSize), denseRowBlocks(self.x, blockSize, rows=self.requestsPerParticipant))
+        return ((start, 2*yb-xb) for (start, yb), (_, xb) in blocks)
+
+    def statsBlocks(self, blockSize=4096):
+        """Blocks of the rows requested, assigned, ratio of Stats_Person."""
+        for start in range(0, self.requested.size, blockSize):
+            s = slice(start, start+blockSize)
+            yield start, np.stack((self.requested[s], self.assigned[s], self.ratio[s])).T
+
+#%% Generate the data for the console: seminar view and participant/user view; only the printed rows are rendered
+def _names(names, index):
+    if index.size == 1:
+        return names[index[0]]
+    elif index.size > 1:
+        return np.array2string(names[index], separator=', ')
+    return "-- keine --"
+
+def printSummary(x, y, userid, seminarNames, numParticipantsPerSeminar, limit=None, views=None):
+    """Print the seminars of each participant and the participants of each seminar
+    (at most `limit` lines each)."""
+    views = views or ResultViews(x, y)
+    print('\n')
+    for i in range(len(userid) if limit is None else min(limit, len(userid))):
+        print(f'Teilnehmer {userid[i]} in Seminaren: {_names(seminarNames, views.seminars(i))}')
+
+    print('\n')
+    for i in range(y.shape[1] if limit is None else min(limit, y.shape[1])):
+        users = views.participants(i)
+        print(f'Seminar {seminarNames[i]} mit {users.size} Teilnehmern bei {views.anfragen[i]} Registrierungen (max. {numParticipantsPerSeminar[i]}): {_names(userid, users)}')
+
+#%% Output the data to Excel sheets
+def writeExcel(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, views=None, profile=None, metrics=None,
+               sheets=None):
+    from pandas import DataFrame, ExcelWriter
+    from xlsxwriter.utility import xl_col_to_name
+
+    sheets = selectSheets(sheets, order, metrics)
+    #%% Store the data in a lista
+    if views is None and needsViews(sheets):
+        views = ResultViews(x, y)
+
+    n = len(userid)
+    k = len(seminarNames)
+    endLetter = xl_col_to_name(k+1)
+
+    #%% Output the data to Excel sheets: Seminar sheet and Assignment sheet
+    writer = ExcelWriter(file, engine='xlsxwriter')
+
+    red_format = writer.book.add_format({'bg_color': '#FFC7CE',
+                                   'font_color': '#9C0006'})
+
+    green_format = writer.book.add_format({'bg_color': '#C6EFCE',
+                                   'font_color': '#006100'})
+
+    if 'Seminar' in sheets:
+        #%% Generate proper Pandas data frame to write the information into excel
+        seminar = [userid[views.participants(i)] for i in range(len(seminarNames))]
+        df = DataFrame(seminar, index=seminarNames, columns=np.arange(1,views.teilnehmer.max()+1))
+        df.insert(0,'Plaetze',numParticipantsPerSeminar)
+        df.insert(1,'Teilnehmer',views.teilnehmer)
+
+        df.insert(2,'Anfragen', views.anfragen)
+        df.insert(3,'Zugewiesen', views.zugewiesen)
+        with phase(profile, 'Seminar'):
+            df.to_excel(writer,sheet_name='Seminar', index=True, index_label='Seminar')
+
+    if 'Assignment' in sheets:
+        with phase(profile, 'Assignment'):
+            writeMatrixSheet(writer, views.assignmentBlocks(), 'Assignment', userid, seminarNames, 'Person')
+
+    #%% Output the data to Excel sheets: Difference sheet
+    if 'Difference' in sheets:
+        with phase(profile, 'Difference'):
+            writeMatrixSheet(writer, views.differenceBlocks(), 'Difference', userid, seminarNames, 'Person')
+
+    #%% Output the data to Excel sheets: Stats_Person sheet
+    if 'Stats_Person' in sheets:
+        with phase(profile, 'Stats_Person'):
+            z = np.stack((views.requested, views.assigned, views.ratio))
+            df = DataFrame(z.T, index=userid, columns=['requested','assigned', 'ratio'])
+            df.to_excel(writer,sheet_name='Stats_Person', index=True, index_label='Person')
+
+    #%% Output the data to Excel sheets: Parameters sheet
+    if 'Parameters' in sheets:
+        with phase(profile, 'Parameters'):
+            df = DataFrame(parameters, columns=['Parameter'])
+            df.to_excel(writer,sheet_name='Parameters', index=False)
+
+    #%% Warteliste
+    if 'Warteplaetze' in sheets:
+        with phase(profile, 'Warteplaetze'):
+            df =  DataFrame.from_dict(order, orient='index')
+            df.to_excel(writer,sheet_name='Warteplaetze', index=True)
+
+    #%% Let's make the excel sheet nicer with some conditional formatting
+    if 'Assignment' in sheets:
+        writer.sheets['Assignment'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    1,
+                                            'format':   green_format})
+
+    if 'Difference' in sheets:
+        writer.sheets['Difference'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    -1,
+                                            'format':   red_format})
+        writer.sheets['Difference'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    +1,
+                                            'format':   green_format})
+
+
+    format_percent = writer.book.add_format({'num_format': '0.0%'})
+    if 'Stats_Person' in sheets:
+        writer.sheets['Stats_Person'].conditional_format(f'D1:D{n+2}', {'type': '3_color_scale',
+                                                 'min_color': "#FF0000",
+                                                 'mid_color': "#FFFF00",
+                                                 'max_color': "#00FF00"})
+
+        writer.sheets['Stats_Person'].conditional_format(f'C1:C{n+2}', {'type': '3_color_scale',
+                                                 'min_color': "#FF0000",
+                                                 'mid_color': "#FFFF00",
+                                                 'max_color': "#00FF00"})
+
+        writer.sheets['Stats_Person'].set_column('D:D', 10, format_percent)
+
+
+    if 'Seminar' in sheets:
+        writer.sheets['Seminar'].set_column('B:B', 10)
+        writer.sheets['Seminar'].set_column('C:C', 12)
+        writer.sheets['Seminar'].set_column('E:E', 15, format_percent)
+
+    if 'Metrics' in sheets:
+        with phase(profile, 'Metrics'):
+            _xlsxSheets(writer.book, [metrics.sheet(seminarNames)], {'Metrics': [('A:A', 28, None)]})
+    #%% save the output and write it to the file
+    with phase(profile, 'close'):
+        writer.close()
+
+#%% The sheets as rows: (name, header, rows, index), rows yield (label, values) with values as list or 1-D array
+SHEETS = ['Seminar', 'Assignment', 'Difference', 'Stats_Person', 'Parameters', 'Warteplaetze', 'Metrics'] # in the order of the output
+VIEW_SHEETS = {'Seminar', 'Assignment', 'Difference', 'Stats_Person'} # sheets built from the ResultViews
+
+def selectSheets(sheets, order=None, metrics=None):
+    """Names of the sheets to write in the order of SHEETS; None: all, Warteplaetze only with the waiting
+    lists and Metrics only with the metrics."""
+    available = [name for name in SHEETS if (name != 'Warteplaetze' or order is not None) and (name != 'Metrics' or metrics is not None)]
+    if sheets is None:
+        return available
+    unknown = [name for name in sheets if name not in SHEETS]
+    if unknown:
+        raise ValueError(f'Unknown sheets {unknown}, available: {SHEETS}')
+    missing = [name for name in sheets if name not in available]
+    if missing:
+        raise ValueError(f'The sheets {missing} need the waiting lists resp. the metrics')
+    return [name for name in available if name in sheets]
+
+def needsViews(sheets):
+    return any(name in VIEW_SHEETS for name in sheets)
+
+def outputSheets(x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, blockSize=4096, views=None, profile=None, metrics=None,
+                 sheets=None):
+    """The sheets as (name, header, rows, index); sheets: names of the sheets (default: all), the
+    ResultViews are only built if a selected sheet needs them."""
+    sheets = selectSheets(sheets, order, metrics)
+    if views is None and needsViews(sheets):
+        views = ResultViews(x, y)
+
+    def seminarRows():
+        for i in range(len(seminarNames)):
+            yield seminarNames[i], [numParticipantsPerSeminar[i], views.teilnehmer[i], views.anfragen[i], views.zugewiesen[i],
+                                    *userid[views.participants(i)]]
+
+    def matrixRows(blocks):
+        for start, block in blocks:
+            for j, row in enumerate(block):
+                yield userid[start+j], row
+
+    def waitingRows():
+        return ((name, v) for name, v in order.items())
+
+    build = {'Seminar': lambda: ('Seminar', ['Seminar', 'Plaetze', 'Teilnehmer', 'Anfragen', 'Zugewiesen', *range(1, views.teilnehmer.max()+1)], seminarRows(), True),
+             'Assignment': lambda: ('Assignment', ['Person', *seminarNames], matrixRows(views.assignmentBlocks(blockSize)), True),
+             'Difference': lambda: ('Difference', ['Person', *seminarNames], matrixRows(views.differenceBlocks(blockSize)), True),
+             'Stats_Person': lambda: ('Stats_Person', ['Person', 'requested', 'assigned', 'ratio'], matrixRows(views.statsBlocks(blockSize)), True),
+             'Parameters': lambda: ('Parameters', ['Parameter'], ((None, [p]) for p in parameters), False),
+             'Warteplaetze': lambda: ('Warteplaetze', [None, *range(max([len(v) for v in order.values()], default=0))], waitingRows(), True),
+             'Metrics': lambda: metrics.sheet(seminarNames)} # metrics: gluecksfee.metrics.FairnessMetrics
+    sheets = [build[name]() for name in sheets]
+    return sheets if profile is None else profile.sheets(sheets)
+
+def _cellValue(v):
+    """Value of a cell as pandas writes it: None for missing values, 'inf' for infinity."""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float):
+        if math.isnan(v):
+            return None
+        if math.isinf(v):
+            return 'inf' if v > 0 else '-inf'
+    return v
+
+#%% Writers: the sheets are written row by row
+def _xlsxSheets(workbook, sheets, columns={}):
+    """Add the sheets to an xlsxwriter workbook; columns: formats (range, width, format) per sheet name,
+    set before the rows as these are written immediately in constant_memory mode."""
+    header_format = workbook.add_format({'bold': True, 'top': 1, 'right': 1, 'bottom': 1, 'left': 1,
+                                         'align': 'center', 'valign': 'top'}) # header style of pandas
+    for name, header, rows, index in sheets:
+        ws = workbook.add_worksheet(name)
+        for column in columns.get(name, []):
+            ws.set_column(*column)
+        for c, v in enumerate(header):
+            if v is not None:
+                ws.write(0, c, _cellValue(v), header_format)
+        first = 1 if index else 0
+        for r, (label, values) in enumerate(rows, 1):
+            if index:
+                ws.write(r, 0, _cellValue(label), header_format)
+            if isinstance(values, np.ndarray) and values.dtype.kind in 'iub': # matrix rows: numbers only
+                for c, v in enumerate(values.tolist(), first):
+                    ws.write_number(r, c, v)
+                continue
+            for c, v in enumerate(values, first):
+                v = _cellValue(v)
+                if v is not None:
+                    ws.write(r, c, v)
+
+def writeXlsx(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, blockSize=4096, views=None, profile=None, metrics=None,
+              sheets=None):
+    """Same sheets and formatting as writeExcel, streamed with xlsxwriter's constant_memory mode."""
+    import xlsxwriter
+    from xlsxwriter.utility import xl_col_to_name
+
+    n = len(userid)
+    k = len(seminarNames)
+    endLetter = xl_col_to_name(k+1)
+
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    red_format = workbook.add_format({'bg_color': '#FFC7CE',
+                                   'font_color': '#9C0006'})
+    green_format = workbook.add_format({'bg_color': '#C6EFCE',
+                                   'font_color': '#006100'})
+    format_percent = workbook.add_format({'num_format': '0.0%'})
+
+    _xlsxSheets(workbook, outputSheets(x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order, blockSize, views, profile, metrics, sheets),
+                {'Stats_Person': [('D:D', 10, format_percent)],
+                 'Seminar': [('B:B', 10, None), ('C:C', 12, None), ('E:E', 15, format_percent)],
+                 'Metrics': [('A:A', 28, None)]})
+
+    #%% Let's make the excel sheet nicer with some conditional formatting
+    worksheets = {ws.get_name(): ws for ws in workbook.worksheets()}
+    if 'Assignment' in worksheets:
+        worksheets['Assignment'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    1,
+                                            'format':   green_format})
+
+    if 'Difference' in worksheets:
+        worksheets['Difference'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    -1,
+                                            'format':   red_format})
+        worksheets['Difference'].conditional_format(f'A1:{endLetter}{n+2}', {'type':     'cell',
+                                            'criteria': 'equal to',
+                                            'value':    +1,
+                                            'format':   green_format})
+
+    for column in ['D', 'C'] if 'Stats_Person' in worksheets else []:
+        worksheets['Stats_Person'].conditional_format(f'{column}1:{column}{n+2}', {'type': '3_color_scale',
+                                                 'min_color': "#FF0000",
+                                                 'mid_color': "#FFFF00",
+                                                 'max_color': "#00FF00"})
+    with phase(profile, 'close'): # the rows are assembled into the xlsx file
+        workbook.close()
+
+def sheetFile(file, name, ext):
+    """Output file of a sheet for the CSV and Parquet writers: output.csv -> output_Seminar.csv"""
+    return f'{os.path.splitext(file)[0]}_{name}{ext}'
+
+def writeCsv(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, blockSize=4096, views=None, profile=None, metrics=None,
+             sheets=None):
+    _csvSheets(file, outputSheets(x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order, blockSize, views, profile, metrics, sheets))
+
+def _csvSheets(file, sheets):
+    for name, header, rows, index in sheets:
+        with open(sheetFile(file, name, '.csv'), 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(['' if v is None else v for v in header])
+            for label, values in rows:
+                values = [_cellValue(v) for v in (values.tolist() if isinstance(values, np.ndarray) else values)]
+                w.writerow(([_cellValue(label)] if index else []) + ['' if v is None else v for v in values])
+
+def _arrowColumn(pa, column, type=None):
+    """Arrow array of the cell values of a column; mixed types are stored as text."""
+    column = [_cellValue(v) for v in column]
+    if type is not None and pa.types.is_string(type):
+        column = [None if v is None else str(v) for v in column]
+    try:
+        a = pa.array(column, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        a = pa.array([None if v is None else str(v) for v in column], type=pa.string())
+    return a.cast(pa.string()) if pa.types.is_null(a.type) else a
+
+def writeParquet(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, blockSize=4096, views=None, profile=None, metrics=None,
+                 sheets=None):
+    """One Parquet file per sheet, written in row groups of blockSize rows. The column
+    types are taken from the first row group."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Parquet output requires pyarrow (pip install pyarrow)') from e
+    _parquetSheets(pa, pq, file, outputSheets(x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order, blockSize, views, profile, metrics, sheets),
+                   blockSize)
+
+def _parquetSheets(pa, pq, file, sheets, blockSize=4096):
+    for name, header, rows, index in sheets:
+        names = ['' if v is None else str(v) for v in header]
+        width = len(names)-1 if index else len(names)
+        writer = None
+        block = []
+        rows = iter(rows)
+        while True:
+            for label, values in rows:
+                values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+                block.append(([label] if index else []) + values + [None]*(width-len(values)))
+                if len(block) == blockSize:
+                    break
+            if writer is not None and not block:
+                break
+            columns = list(zip(*block)) if block else [()]*len(names)
+            if writer is None:
+                arrays = [_arrowColumn(pa, c) for c in columns]
+                schema = pa.schema([pa.field(n, a.type) for n, a in zip(names, arrays)])
+                writer = pq.ParquetWriter(sheetFile(file, name, '.parquet'), schema)
+            else:
+                arrays = [_arrowColumn(pa, c, f.type) for c, f in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            if len(block) < blockSize:
+                break
+            block = []
+        writer.close()
+
+def writePandas(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=None, blockSize=4096, views=None, profile=None, metrics=None,
+                sheets=None):
+    writeExcel(file, x, y, userid, seminarNames, numParticipantsPerSeminar, parameters, order=order, views=views, profile=profile, metrics=metrics,
+               sheets=sheets)
+
+WRITERS = {'xlsx': writeXlsx, 'csv': writeCsv, 'parquet': writeParquet, 'pandas': writePandas}
+EXTENSIONS = {'.xlsx': 'xlsx', '.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+
+def writeSheets(file, sheets, writer=None, blockSize=4096):
+    """Write sheets (name, header, rows, index) as produced by outputSheets without the formatting of
+    the lottery sheets, e.g. for a subset of the sheets; the pandas writer writes xlsx as well."""
+    writer = getWriter(file, writer)
+    if writer is writeCsv:
+        _csvSheets(file, sheets)
+    elif writer is writeParquet:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError('Parquet output requires pyarrow (pip install pyarrow)') from e
+        _parquetSheets(pa, pq, file, sheets, blockSize)
+    else:
+        import xlsxwriter
+        workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+        _xlsxSheets(workbook, sheets)
+        workbook.close()
+
+def getWriter(file, writer=None):
+    """Writer function by name, or by the file extension (default: xlsx)."""
+    if callable(writer):
+        return writer
+    if writer is None:
+        writer = EXTENSIONS.get(os.path.splitext(str(file))[1].lower(), 'xlsx')
+    try:
+        return WRITERS[writer]
+    except KeyError:
+        raise ValueError(f'Unknown writer "{writer}", choose one of {list(WRITERS)}') from None
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Stufen der Auslosung und ihre Abhängigkeiten (--stages, --sheets)
+
+Jede Stufe nennt die Stufen, die vorher laufen müssen; die Sheets der Ausgabe
+sind eigene Stufen. Aus den gewünschten Zielen (z.B. nur die Zuweisung als CSV)
+ergibt plan() die Stufen, die dafür nötig sind, alle anderen werden
+übersprungen:
+  parse         Eingabe einlesen
+  draw          Auslosung (bzw. Flussproblem, --engine flow)
+  waitlist      Wartelisten (waitingListRequests, waitingPlacesMatrix)
+  views         Teilnehmer pro Seminar und Seminare pro Person (ResultViews)
+  summary       Zusammenfassung auf der Konsole (--verbose)
+  metrics       Kennzahlen der Fairness (--metrics)
+  export        Ausgabe der gewählten Sheets
+  Seminar, Assignment, Difference, Stats_Person, Parameters, Warteplaetze, Metrics
+
+    python gluecksfee3.py -o check.csv --sheets Assignment,Parameters
+
+lost nur aus und schreibt zwei CSV-Dateien, ohne Warteliste und ohne die übrigen
+Sheets. gluecksfee2.py und gluecksfee3.py unterscheiden sich nur in den
+Default-Stufen (ohne bzw. mit Warteliste).
+
+@author: Tobias Hoßfeld
+
+"""
+
+from gluecksfee.output import SHEETS
+
+STAGES = {'parse': (),
+          'draw': ('parse',),
+          'waitlist': ('draw',),
+          'views': ('draw',),
+          'summary': ('views',),
+          'metrics': ('views',),
+          'Seminar': ('views',),
+          'Assignment': ('views',),
+          'Difference': ('views',),
+          'Stats_Person': ('views',),
+          'Parameters': ('draw',), # the parameters record the result of --engine flow
+          'Warteplaetze': ('waitlist',),
+          'Metrics': ('metrics',),
+          'export': ()} # and the selected sheets, see plan
+TARGETS = ['draw', 'waitlist', 'summary', 'metrics', 'export'] # stages which can be chosen with --stages
+
+def splitNames(value, choices, what):
+    """Comma separated names of the command line, checked against the choices."""
+    names = [v.strip() for v in value.split(',') if v.strip()]
+    unknown = [v for v in names if v not in choices]
+    if unknown:
+        raise ValueError(f'Unknown {what} {", ".join(unknown)}, possible: {", ".join(choices)}')
+    return names
+
+def defaultSheets(targets):
+    """Sheets of the output for the targets: Warteplaetze only with waitlist, Metrics only with metrics."""
+    return [name for name in SHEETS if (name != 'Warteplaetze' or 'waitlist' in targets) and (name != 'Metrics' or 'metrics' in targets)]
+
+def plan(targets, sheets=()):
+    """Stages needed for the targets in the order of STAGES; export needs the sheets."""
+    needed = set()
+    pending = list(targets) + (list(sheets) if 'export' in targets else [])
+    while pending:
+        stage = pending.pop()
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGES[stage])
+    return [stage for stage in STAGES if stage in needed]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Laufzeit und Speicher der Phasen einer Auslosung (--profile)
+
+Profiler misst für jede Phase (Einlesen, hashSemTypes, Seed, assignmentMatrix,
+waitingListRequests, waitingPlacesMatrix, Ausgabe und jedes einzelne Sheet) die
+Laufzeit und mit tracemalloc den maximal zusätzlich belegten und den am Ende
+noch belegten Speicher. Für assignmentMatrix und waitingPlacesMatrix wird
+zusätzlich jede Runde mit Seminar, Anzahl der Anmeldungen und Laufzeit
+erfasst. Der Bericht wird als JSON gespeichert, Default <Ausgabe>_profile.json.
+
+Ohne Profiler (profile=None) wird nichts gemessen: die Funktionen prüfen nur
+`profile is not None`, tracemalloc wird nicht gestartet.
+
+@author: Tobias Hoßfeld
+
+"""
+
+from contextlib import contextmanager, nullcontext
+import json
+import os.path
+import time
+import tracemalloc
+
+def phase(profile, name):
+    """profile.phase(name), or a context doing nothing without profiler."""
+    return nullcontext() if profile is None else profile.phase(name)
+
+def profileFile(output):
+    """Default file of the report: output.xlsx -> output_profile.json"""
+    return f'{os.path.splitext(str(output))[0]}_profile.json'
+
+class Profiler:
+    def __init__(self, allocations=True):
+        self.allocations = allocations
+        self.phases = []
+        self.rounds = {}
+        self.start = time.perf_counter()
+        self._stack = []
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        """Time and memory of the enclosed code; nested phases are named parent/name."""
+        record = {'name': '/'.join([r['name'].rsplit('/', 1)[-1] for r, _ in self._stack]+[name])}
+        self.phases.append(record)
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack: # the peak is reset for this phase, keep the one of the parent
+                self._stack[-1][1][1] = max(self._stack[-1][1][1], peak)
+            tracemalloc.reset_peak()
+            memory = [current, current] # at the start, peak
+        else:
+            memory = None
+        self._stack.append((record, memory))
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter()-start
+            self._stack.pop()
+            if memory is not None:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, memory[1])
+                record['peakMB'] = (peak-memory[0])/2**20
+                record['allocatedMB'] = (current-memory[0])/2**20
+                if self._stack:
+                    self._stack[-1][1][1] = max(self._stack[-1][1][1], peak)
+
+    def round(self, kind, seminar, registrations, seconds):
+        """One round of assignmentMatrix ('assign') or waitingPlacesMatrix ('waitlist')."""
+        self.rounds.setdefault(kind, []).append({'seminar': int(seminar), 'registrations': int(registrations),
+                                                 'seconds': seconds})
+
+    def sheets(self, sheets):
+        """Measure the writing of each sheet: the phase lasts until the writer asks for the next sheet."""
+        for sheet in sheets:
+            with self.phase(sheet[0]):
+                yield sheet
+
+    @property
+    def total(self):
+        return time.perf_counter()-self.start
+
+    def report(self, seminarNames=None, **info):
+        rounds = {kind: [{**r, 'name': str(seminarNames[r['seminar']])} if seminarNames is not None else r for r in records]
+                  for kind, records in self.rounds.items()}
+        return {**info, 'total': self.total, 'allocations': self.allocations, 'phases': self.phases, 'rounds': rounds}
+
+    def write(self, file, seminarNames=None, **info):
+        with open(file, 'w', encoding='utf-8') as f:
+            json.dump(self.report(seminarNames, **info), f, indent=1, default=str)
+
+    def close(self):
+        if self.allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
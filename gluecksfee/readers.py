@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+Einlesen der Anmeldungen aus xlsx-, CSV- oder Parquet-Dateien
+
+Alle Formate haben den Aufbau des Sheets 'registrierung': die erste Zeile
+enthält 'Person' und die Seminarnamen, die erste Spalte die Personen. Die
+Sonderzeilen "Plaetze" (oder -99) und "inhaltlich" (oder -100) werden wie in
+readExcelFile erkannt und aus den Anmeldungen entfernt. Personen bleiben Text
+wie bei pandas (z.B. '00123'), nur die Anmeldungen werden in Zahlen umgewandelt.
+
+Der Reader wird anhand der Dateiendung gewählt (READERS, EXTENSIONS):
+  xlsx     liest das Sheet-XML zeilenweise direkt aus der xlsx-Datei (Zip-Archiv)
+  csv      Trennzeichen , ; oder Tab, z.B. aus dem Anmeldesystem exportiert
+  parquet  spaltenweise mit pyarrow (optional)
+  pandas   bisheriger Weg über pandas.read_excel (readExcelFile), z.B. für .xls
+
+Die Anmeldungen werden blockweise in numpy-Arrays übernommen, mit sparse=True
+direkt in eine RegistrationMatrix, ohne die dichte Matrix zu erzeugen. Leere
+Zeilen werden übersprungen; der pandas-Reader bricht bei leeren Zeilen zwischen
+den Personen ab, für alle anderen Eingaben sind die Personen und ihre Reihenfolge
+bei allen Readern gleich (s. fromRows).
+
+@author: Tobias Hoßfeld
+
+"""
+
+import csv
+import os.path
+import posixpath
+import zipfile
+from xml.etree.ElementTree import fromstring, iterparse
+from xml.parsers import expat
+
+import numpy as np
+
+from gluecksfee.sparse import RegistrationMatrix
+
+_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS = '{'+_MAIN+'}'
+_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+#%% special rows: the same labels as checkPlaetze and checkInhaltlich in readExcelFile
+def isPlaetze(v):
+    if isinstance(v, int):
+        return v==-99
+    return isinstance(v, str) and v.lower() in ['platz','plaetze','plätze']
+
+def isInhaltlich(v):
+    if isinstance(v, int):
+        return v==-100
+    return isinstance(v, str) and v.lower() in ['inhalt','inhaltlich','content']
+
+def cellValue(v):
+    """Cell as read by pandas: integral numbers and number strings become int."""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, str):
+        s = v.strip()
+        try:
+            return int(s)
+        except ValueError:
+            try:
+                f = float(s)
+            except ValueError:
+                return v
+            return int(f) if f.is_integer() else f
+    return v
+
+def personLabel(v):
+    """Cell of the first column as read by pandas: integral numbers become int, text is kept as it
+    is, e.g. the person '00123' or the label '-99' written as text."""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+def textLabel(v):
+    """Cell of the first column or of the header of a CSV file, where every cell is text: integers
+    in their usual form ('123', '-99') become int, other text is kept, e.g. the person '00123'."""
+    if isinstance(v, str):
+        s = v.strip()
+        try:
+            return int(s) if str(int(s)) == s else v
+        except ValueError:
+            return v
+    return personLabel(v)
+
+def columnNames(header):
+    """Seminar names as pandas names the columns: missing names become 'Unnamed: j',
+    duplicates get the suffix .1, .2, ..."""
+    names, seen = [], {}
+    for j, name in enumerate(header):
+        name = f'Unnamed: {j}' if name is None or name == '' else name
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _requests(block):
+    try:
+        return np.asarray(block).astype('int')
+    except (TypeError, ValueError): # empty cells or numbers as text
+        return np.array([[0 if v is None or v == '' else int(cellValue(v)) for v in row] for row in block], dtype='int')
+
+def _specialValues(values, defaultVal, k):
+    if values is None:
+        return [defaultVal]*k
+    values = [cellValue(v) for v in values]
+    if all(isinstance(v, int) for v in values):
+        return np.array(values, dtype='int')
+    return np.array(values, dtype=object)
+
+#%% rows -> registrations
+def _seminarNames(header):
+    header = list(header)
+    while len(header) > 1 and (header[-1] is None or header[-1] == ''):
+        header.pop()
+    return np.array(columnNames(header)[1:], dtype=object)
+
+def specialFromRows(header, rows, defaultNumberParticipantsPerSeminar=12, readLabel=personLabel):
+    """Only the special rows: (seminarNames, numParticipantsPerSeminar, inhaltlich). The rows are
+    read until both special rows are found, usually the first rows of the file."""
+    seminarNames = _seminarNames(header)
+    k = seminarNames.size
+    special = {}
+    for row in rows:
+        label = readLabel(row[0]) if row else None
+        key = 'Plaetze' if isPlaetze(label) else 'inhaltlich' if isInhaltlich(label) else None
+        if key is not None:
+            special[key] = list(row[1:k+1]) + [None]*(k+1-len(row))
+            if len(special) == 2:
+                break
+    return (seminarNames, _specialValues(special.get('Plaetze'), defaultNumberParticipantsPerSeminar, k),
+            _specialValues(special.get('inhaltlich'), None, k))
+
+def fromRows(header, rows, defaultNumberParticipantsPerSeminar=12, sparse=False, blockSize=4096, readLabel=personLabel):
+    """Build the registrations from the header and an iterable of rows [label, values...].
+    Returns (seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich). The labels of the
+    first column are read with readLabel, only the requests are converted to numbers.
+
+    Completely empty rows are skipped. pandas.read_excel keeps empty rows between the
+    persons as NaN rows, which readExcelFile cannot convert (it raises an error), and
+    drops them at the end of the sheet; so every input the pandas reader accepts gives
+    the same persons in the same order, i.e. the same user indices, with both readers."""
+    seminarNames = _seminarNames(header)
+    k = seminarNames.size
+
+    special = {'Plaetze': [], 'inhaltlich': []} # (row, values)
+    userid, blocks, block = [], [], []
+    users, seminars, values = [], [], []
+    n = 0
+
+    def flush():
+        if not block:
+            return
+        b = _requests(block)
+        if sparse:
+            u, s = np.nonzero(b)
+            users.append(u+n-len(block)); seminars.append(s); values.append(b[u,s])
+        else:
+            blocks.append(b)
+        block.clear()
+
+    for j, row in enumerate(rows):
+        row = list(row[:k+1]) + [None]*(k+1-len(row))
+        label = readLabel(row[0])
+        if isPlaetze(label):
+            special['Plaetze'].append((j, row[1:]))
+        elif isInhaltlich(label):
+            special['inhaltlich'].append((j, row[1:]))
+        elif label is None and all(v is None or v == '' for v in row[1:]): # empty row
+            continue
+        else:
+            userid.append(label)
+            block.append(row[1:])
+            n += 1
+            if len(block) == blockSize:
+                flush()
+    flush()
+
+    for warning, found in special.items():
+        if len(found) > 1:
+            raise ValueError(f'Several rows for {warning}: Row {np.array([j for j, _ in found])+2}!')
+    numPlaetze = _specialValues(special['Plaetze'][0][1] if special['Plaetze'] else None, defaultNumberParticipantsPerSeminar, k)
+    inhaltlich = _specialValues(special['inhaltlich'][0][1] if special['inhaltlich'] else None, None, k)
+
+    if sparse:
+        x = RegistrationMatrix.fromCoordinates(np.concatenate(users or [[]]), np.concatenate(seminars or [[]]),
+                                               np.concatenate(values or [np.zeros(0, dtype='int')]), (n, k))
+    else:
+        x = np.concatenate(blocks) if blocks else np.zeros((0, k), dtype='int')
+    return seminarNames, x, np.array(userid, dtype=object), numPlaetze, inhaltlich
+
+#%% readers
+_COLUMN_INDEX = {} # column letters -> index, filled by _columnIndex
+
+def _columnIndex(ref):
+    """Column index of a cell reference, e.g. 'AB12' -> 27."""
+    letters = ref.rstrip('0123456789')
+    j = _COLUMN_INDEX.get(letters)
+    if j is None:
+        j = 0
+        for ch in letters:
+            j = 26*j + ord(ch) - 64
+        j = _COLUMN_INDEX[letters] = j-1
+    return j
+
+def xlsxRows(file, sheet_name='registrierung'):
+    """Yield the cell values of a worksheet row by row. The sheet XML is parsed
+    incrementally from the zip archive and processed rows are discarded, so the
+    memory does not grow with the number of rows."""
+    with zipfile.ZipFile(file) as z:
+        wb = fromstring(z.read('xl/workbook.xml'))
+        rid = [s.get(_REL+'id') for s in wb.iter(_NS+'sheet') if s.get('name') == sheet_name]
+        if not rid:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        target = next(r.get('Target') for r in fromstring(z.read('xl/_rels/workbook.xml.rels')) if r.get('Id') == rid[0])
+        path = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+        strings = []
+        if 'xl/sharedStrings.xml' in z.namelist():
+            with z.open('xl/sharedStrings.xml') as f:
+                for _, el in iterparse(f):
+                    if el.tag == _NS+'si': # plain text or rich text runs, without phonetic hints
+                        strings.append(''.join((child.text if child.tag == _NS+'t' else child.findtext(_NS+'t')) or ''
+                                               for child in el if child.tag in (_NS+'t', _NS+'r')))
+                        el.clear()
+
+        # the worksheet is parsed with expat handlers instead of building elements,
+        # only the cells of the current chunk are kept
+        C, V, T, ROW = _MAIN+' c', _MAIN+' v', _MAIN+' t', _MAIN+' row'
+        rows, row, cell = [], [], [None, None] # cell: type, text parts
+
+        def start(name, attrs):
+            if name == C:
+                cell[0], cell[1] = attrs.get('t'), None
+                ref = attrs.get('r')
+                if ref is not None:
+                    j = _columnIndex(ref)
+                    if j > len(row):
+                        row.extend([None]*(j-len(row)))
+            elif name == V or name == T:
+                if cell[1] is None:
+                    cell[1] = []
+
+        def end(name):
+            nonlocal row
+            if name == C:
+                t, v = cell[0], None if cell[1] is None else ''.join(cell[1])
+                if v is not None:
+                    if t == 's':
+                        v = strings[int(v)]
+                    elif t == 'b':
+                        v = v == '1'
+                    elif t is None or t == 'n':
+                        try:
+                            v = int(v)
+                        except ValueError:
+                            v = float(v)
+                row.append(v)
+                cell[1] = None
+            elif name == ROW:
+                rows.append(row)
+                row = []
+
+        def data(text):
+            if cell[1] is not None:
+                cell[1].append(text)
+
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.buffer_text = True
+        parser.StartElementHandler, parser.EndElementHandler, parser.CharacterDataHandler = start, end, data
+        with z.open(path) as f:
+            while True:
+                chunk = f.read(1 << 20)
+                parser.Parse(chunk, not chunk)
+                yield from rows
+                rows.clear()
+                if not chunk:
+                    break
+
+def readXlsx(file, sheet_name='registrierung', **kwargs):
+    rows = xlsxRows(file, sheet_name)
+    header = next(rows, [])
+    return fromRows(header, rows, **kwargs)
+
+def readCsv(file, encoding='utf-8-sig', **kwargs):
+    with open(file, newline='', encoding=encoding) as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+        f.seek(0)
+        rows = csv.reader(f, dialect)
+        header = [textLabel(v) for v in next(rows, [])]
+        return fromRows(header, rows, readLabel=textLabel, **kwargs)
+
+def readParquet(file, defaultNumberParticipantsPerSeminar=12, sparse=False, blockSize=4096):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Parquet input requires pyarrow (pip install pyarrow)') from e
+    table = pq.read_table(file)
+    header = columnNames(table.column_names)
+    labels = [textLabel(v) for v in table.column(0).to_pylist()]
+    plaetze = [j for j, v in enumerate(labels) if isPlaetze(v)]
+    inhalt = [j for j, v in enumerate(labels) if isInhaltlich(v)]
+    for warning, found in [('Plaetze', plaetze), ('inhaltlich', inhalt)]:
+        if len(found) > 1:
+            raise ValueError(f'Several rows for {warning}: Row {np.array(found)+2}!')
+    keep = np.ones(len(labels), dtype=bool)
+    keep[plaetze+inhalt] = False
+
+    # the columns are the seminars: the requests are converted per column, only the special rows as Python objects
+    columns = [table.column(j) for j in range(1, table.num_columns)]
+    k, n = len(columns), int(keep.sum())
+    numPlaetze = _specialValues([c[plaetze[0]].as_py() for c in columns] if plaetze else None, defaultNumberParticipantsPerSeminar, k)
+    inhaltlich = _specialValues([c[inhalt[0]].as_py() for c in columns] if inhalt else None, None, k)
+    data = [_requestColumn(c.to_numpy(zero_copy_only=False)[keep]) for c in columns]
+    if sparse:
+        x = RegistrationMatrix.fromColumns([(np.flatnonzero(d), d[d != 0]) for d in data], (n, k), dtype='int')
+    else:
+        x = np.stack(data, axis=1) if data else np.zeros((n, 0), dtype='int')
+    return np.array(header[1:], dtype=object), x, np.array(labels, dtype=object)[keep], numPlaetze, inhaltlich
+
+def _requestColumn(values):
+    if values.dtype.kind == 'f': # missing values
+        values = np.nan_to_num(values)
+    try:
+        return values.astype('int')
+    except (TypeError, ValueError):
+        return np.array([0 if v is None or v == '' else int(cellValue(v)) for v in values], dtype='int')
+
+def readPandas(file, defaultNumberParticipantsPerSeminar=12, sparse=False, blockSize=4096):
+    from gluecksfee.lottery import readExcelFile
+    WS, x, userid, numPlaetze, inhaltlich = readExcelFile(file, defaultNumberParticipantsPerSeminar, sparse=sparse, blockSize=blockSize)
+    return np.asarray(WS.columns[1:]), x, userid, numPlaetze, inhaltlich
+
+READERS = {'xlsx': readXlsx, 'csv': readCsv, 'parquet': readParquet, 'pandas': readPandas}
+EXTENSIONS = {'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+
+def readSpecialRows(file, reader=None, defaultNumberParticipantsPerSeminar=12):
+    """Returns (seminarNames, numParticipantsPerSeminar, inhaltlich) without reading all registrations."""
+    reader = getReader(file, reader)
+    if reader is readXlsx:
+        rows = xlsxRows(file)
+        return specialFromRows(next(rows, []), rows, defaultNumberParticipantsPerSeminar)
+    if reader is readCsv:
+        with open(file, newline='', encoding='utf-8-sig') as f:
+            dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+            f.seek(0)
+            rows = csv.reader(f, dialect)
+            return specialFromRows([textLabel(v) for v in next(rows, [])], rows, defaultNumberParticipantsPerSeminar, textLabel)
+    if reader is readParquet:
+        import pyarrow.parquet as pq
+        f = pq.ParquetFile(file)
+        rows = (row for batch in f.iter_batches(batch_size=1024) for row in zip(*batch.to_pydict().values()))
+        return specialFromRows(f.schema_arrow.names, rows, defaultNumberParticipantsPerSeminar, textLabel)
+    seminarNames, _, _, numPlaetze, inhaltlich = reader(file, defaultNumberParticipantsPerSeminar=defaultNumberParticipantsPerSeminar)
+    return seminarNames, numPlaetze, inhaltlich
+
+def getReader(file, reader=None):
+    """Reader function by name, or by the file extension (default: pandas)."""
+    if callable(reader):
+        return reader
+    if reader is None:
+        reader = EXTENSIONS.get(os.path.splitext(str(file))[1].lower(), 'pandas')
+    try:
+        return READERS[reader]
+    except KeyError:
+        raise ValueError(f'Unknown reader "{reader}", choose one of {list(READERS)}') from None
+
+def readRegistrations(file, reader=None, defaultNumberParticipantsPerSeminar=12, sparse=False, blockSize=4096):
+    """Returns (seminarNames, x, userid, numParticipantsPerSeminar, inhaltlich)."""
+    return getReader(file, reader)(file, defaultNumberParticipantsPerSeminar=defaultNumberParticipantsPerSeminar,
+                                   sparse=sparse, blockSize=blockSize)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Gewichtetes Ziehen ohne Zurücklegen für die Auslosung und die Warteliste
+
+Ein Sampler zieht `size` viele der `users` ohne Zurücklegen, wobei `p` die
+(normierten) Gewichte sind. Die Reihenfolge der Rückgabe ist die Reihenfolge
+der Ziehung, d.h. bei size=len(users) entsteht eine gewichtete Permutation.
+Die Zufallszahlen kommen aus np.random oder aus dem Generator `rng` (ein Stream
+pro Seminar, s. gluecksfee.streams).
+
+  legacy       np.random.choice(..., replace=False, p=p); Default, reproduziert
+               die mit bisherigen Seeds veröffentlichten Auslosungen
+  exponential  Exponential-Keys (Efraimidis/Spirakis, äquivalent zu Gumbel-top-k):
+               e_i/p_i mit e_i ~ Exp(1), die kleinsten `size` Keys werden gezogen;
+               O(m log m) statt der wiederholten cdf-Berechnung von np.random.choice
+  buckets      Gewichtsklassen: in einer Runde der Auslosung haben alle Nutzer mit
+               gleich vielen zugewiesenen Seminaren das gleiche Gewicht. Gezogen
+               wird zuerst die Folge der Klassen (drawClasses: Keys nur für die
+               ersten `size` Ziehungen jeder Klasse), dann gleichverteilt die
+               Nutzer in den gezogenen Klassen. Die Auslosung hält die Klassen
+               pro Seminar vor und aktualisiert sie mit den Zählern
+               (lottery.WeightClasses), eine Runde kostet dann O(#Klassen) plus
+               die Plätze statt O(m). Ohne diese Klassen (z.B. Warteliste) werden
+               die Nutzer nach gleichem p gruppiert, bei mehr als MAX_CLASSES
+               Klassen wie exponential.
+
+Alle Sampler ziehen sequentiell proportional zu den Gewichten der noch nicht
+gezogenen Nutzer (Plackett-Luce). Die Inklusionswahrscheinlichkeiten sind daher
+identisch, die gezogenen Nutzer für einen gegebenen Seed aber nicht.
+Der Vergleich mit den exakten Inklusionswahrscheinlichkeiten wird mit
+
+    python -m gluecksfee.sampler
+
+ausgeführt.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import hashlib
+from itertools import permutations
+
+import numpy as np
+
+#%% Sampler
+def sampleLegacy(users, size, p, rng=None):
+    return (rng or np.random).choice(users, replace=False, size=size, p=p)
+
+def sampleExponential(users, size, p, rng=None):
+    users = np.asarray(users)
+    with np.errstate(divide='ignore'):
+        keys = (rng or np.random).exponential(size=users.size)/p # p_i=0 gives key inf, i.e. drawn last
+    if size < users.size:
+        first = np.argpartition(keys, size-1)[:size]
+        first = first[np.argsort(keys[first], kind='stable')]
+    else:
+        first = np.argsort(keys, kind='stable')
+    return users[first]
+
+MAX_CLASSES = 64 # more classes: exponential keys are faster than the draws per class
+
+def distinctPositions(n, size, rng):
+    """size distinct positions of range(n) in uniform random order: the first occurrences of uniform
+    draws, i.e. O(size) instead of a permutation of all n positions."""
+    if 8*size > n: # sorting the draws costs more than a permutation
+        return rng.permutation(n)[:size]
+    positions = np.empty(0, dtype='int64')
+    while positions.size < size:
+        draws = np.concatenate((positions, (rng.random(2*(size-positions.size)+8)*n).astype('int64')))
+        _, first = np.unique(draws, return_index=True)
+        positions = draws[np.sort(first)][:size]
+    return positions
+
+def drawClasses(n, w, size, rng):
+    """Classes of the first `size` draws, each proportional to the weights of the users not yet drawn,
+    for n_c users of weight w_c in class c; returns the class and the rank within the class per draw.
+    The sequence is the merge of the sorted keys per class: the j-th smallest of n_c keys Exp(1)/w_c
+    is the sum of the spacings Exp(1)/((n_c-i) w_c), i<j (Rényi), so only the first min(size, n_c)
+    keys of a class are generated. Users of weight 0 are not drawn, i.e. there may be fewer draws."""
+    k = np.where(w > 0, np.minimum(n, size), 0) # keys needed per class
+    c = np.repeat(np.arange(n.size), k)
+    segment = np.cumsum(k)-k
+    rank = np.arange(k.sum())-np.repeat(segment, k)
+    total = np.cumsum(rng.exponential(size=rank.size)/((n[c]-rank)*w[c]))
+    keys = total-np.repeat(np.concatenate(([0], total))[segment], k)
+    if size < keys.size:
+        first = np.argpartition(keys, size-1)[:size]
+        first = first[np.argsort(keys[first], kind='stable')]
+    else:
+        first = np.argsort(keys, kind='stable')
+    return c[first], rank[first]
+
+def sampleBuckets(users, size, p, rng=None, classes=None):
+    """Draw the classes first (drawClasses), then uniform users within each class. classes:
+    non-negative integer class per user with equal weights within a class, None: classes of equal p.
+    The users are grouped here in O(m); the lottery keeps them grouped, see lottery.WeightClasses."""
+    users = np.asarray(users)
+    p = np.asarray(p, dtype='float')
+    size = min(size, users.size)
+    if classes is None:
+        _, classes = np.unique(p, return_inverse=True)
+    counts = np.bincount(classes)
+    present = np.flatnonzero(counts)
+    if present.size > MAX_CLASSES:
+        return sampleExponential(users, size, p, rng)
+    rng = rng or np.random
+    n = counts[present]
+    w = np.bincount(classes, weights=p)[present]/n # weight of a user per class
+    drawn, rank = drawClasses(n, w, size, rng)
+
+    # the users of a class in uniform random order, only for the drawn classes
+    select = np.empty(size, dtype='int64')
+    weighted = select[:drawn.size]
+    for j in np.unique(drawn):
+        mask = drawn == j
+        members = np.flatnonzero(classes == present[j])
+        weighted[mask] = members[distinctPositions(n[j], mask.sum(), rng)[rank[mask]]]
+    if drawn.size < size: # only users with weight 0 are left, they follow in uniform order
+        zero = np.flatnonzero(np.isin(classes, present[w == 0]))
+        select[drawn.size:] = zero[distinctPositions(zero.size, size-drawn.size, rng)]
+    return users[select]
+
+sampleBuckets.usesClasses = True # the lottery draws from its weight classes, see lottery.WeightClasses
+
+def rngDigest(rng=None):
+    """Short digest of the state of a Generator, or of the legacy global generator np.random."""
+    if rng is not None:
+        return hashlib.sha256(repr(rng.bit_generator.state).encode()).hexdigest()[:16]
+    _, keys, pos, _, _ = np.random.get_state()
+    h = hashlib.sha256(keys.tobytes())
+    h.update(int(pos).to_bytes(4, 'little'))
+    return h.hexdigest()[:16]
+
+SAMPLERS = {'legacy': sampleLegacy,
+            'exponential': sampleExponential,
+            'buckets': sampleBuckets}
+
+def getSampler(sampler='legacy'):
+    if callable(sampler):
+        return sampler
+    try:
+        return SAMPLERS[sampler]
+    except KeyError:
+        raise ValueError(f'Unknown sampler "{sampler}", choose from {list(SAMPLERS)}!')
+
+#%% Equivalence check of the samplers
+def inclusionProbabilities(p, size):
+    """Exact probability of each user to be among the `size` drawn users for
+    sequential sampling proportional to p (enumeration, only for small len(p))."""
+    p = np.asarray(p, dtype='float')
+    incl = np.zeros(p.size)
+    for seq in permutations(range(p.size), size):
+        prob, rest = 1.0, p.sum()
+        for j in seq:
+            prob *= p[j]/rest
+            rest -= p[j]
+        incl[list(seq)] += prob
+    return incl
+
+def checkSamplers(p, size, runs=20000, seed=42):
+    """Draw `runs` samples with every sampler and return the largest deviation of
+    the inclusion frequencies from the exact probabilities in standard errors."""
+    p = np.asarray(p, dtype='float')
+    p = p/p.sum()
+    exact = inclusionProbabilities(p, size)
+    sigma = np.sqrt(exact*(1-exact)/runs)
+    users = np.arange(p.size)
+    res = {}
+    for name, sampler in SAMPLERS.items():
+        np.random.seed(seed)
+        counts = np.zeros(p.size)
+        for _ in range(runs):
+            counts[sampler(users, size, p)] += 1
+        res[name] = np.max(np.abs(counts/runs-exact)/sigma)
+    return res
+
+if __name__ == "__main__":
+    # weights as in the lottery: users without seminar get the factor 100
+    cases = [([100*3, 2, 2, 1, 1, 1], 2),
+             ([100*2, 100*2, 1, 1, 1], 3),
+             ([3, 2, 2, 1, 1, 1, 1], 4),
+             ([1, 1, 1, 1, 1], 2)]
+    ok = True
+    for p, size in cases:
+        res = checkSamplers(p, size)
+        ok &= all(z < 5 for z in res.values())
+        print(f'p={p}, size={size}: ' + ', '.join(f'{name} max. {z:.2f} sigma' for name, z in res.items()))
+    print('Inklusionswahrscheinlichkeiten stimmen überein' if ok else 'Abweichung der Inklusionswahrscheinlichkeiten!')
+    raise SystemExit(0 if ok else 1)
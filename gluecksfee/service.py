@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Lokaler Dienst für das Nachrücken von der Warteliste
+
+Lädt eine fertige Auslosung (Sheets Seminar, Warteplaetze und Parameters, s.
+gluecksfee.delta) einmal und beantwortet danach Abmeldungen per HTTP auf
+localhost oder über einen Unix-Socket. Im Speicher liegen die Indizes
+  Person  -> zugewiesene Seminare und Positionen auf Wartelisten
+  Seminar -> Teilnehmer, Warteliste und die erste noch nicht geprüfte Position
+sodass eine Abmeldung mit Nachrücken nur die betroffenen Einträge anfasst.
+Nachrücken darf, wer noch kein inhaltlich gleiches Seminar und weniger als die
+maximale Anzahl an Seminaren hat; wer nachrückt, wird von den Wartelisten der
+inhaltlich gleichen Seminare entfernt. Wer übersprungen wird, wird bei der
+Person vermerkt und erst wieder geprüft, wenn sie einen Platz abgibt; jeder
+Eintrag einer Warteliste wird so nur einmal pro Änderung der Person geprüft.
+Eine Warteliste mit einer Person, die nicht im Sheet Assignment steht, wird
+beim Laden abgelehnt (s. gluecksfee.delta.Result.checkWaitlists).
+
+Jede Änderung wird vor der Antwort als Zeile an ein Log (JSONL) angehängt. Beim
+Start mit einem vorhandenen Log werden die Änderungen erneut ausgeführt, der
+Dienst hat danach den Zustand vor dem Absturz.
+
+    python -m gluecksfee.service output.xlsx --port 8765
+    python -m gluecksfee.service output.xlsx --socket /tmp/gluecksfee.sock
+
+    GET  /person?id=Mia                   Seminare und Wartelisten einer Person
+    GET  /seminar?name=Tandemfahren       Teilnehmer, freie Plätze, nächste Person
+    POST /cancel  {"person": "Mia", "seminar": "Tandemfahren"}
+    POST /places  {"seminar": "Tandemfahren", "places": 16}
+    POST /export  {"output": "output2.xlsx"}
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import heapq
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import os
+import socketserver
+import stat
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from gluecksfee.delta import Result, contentGroups, resolveInput
+
+class PromotionService:
+    """Indexes of a finished draw; every change is appended to the log (a file name or None).
+    A waiting list with a person who is not in the sheet Assignment raises a ValueError."""
+    def __init__(self, result, inhaltlich=None, maximum=999, log=None, sync=False):
+        result.checkWaitlists()
+        self.result = result
+        self.names = list(result.seminarNames)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.group = list(inhaltlich) if inhaltlich is not None else list(range(len(self.names)))
+        self.members = {}
+        for i, g in enumerate(self.group):
+            self.members.setdefault(g, []).append(i)
+        self.maximum = maximum
+        self.places = list(result.places)
+        self.requests = list(result.requests)
+
+        self.participants = [dict.fromkeys(users) for users in result.participants] # ordered sets
+        self.assigned = {} # person -> assigned seminars
+        for i, users in enumerate(self.participants):
+            for u in users:
+                self.assigned.setdefault(u, set()).add(i)
+        self.waiting = [list(result.order.get(name, [])) for name in self.names] # None: removed
+        self.count = [len(persons) for persons in self.waiting] # persons left on the waiting list
+        self.head = [0]*len(self.names) # first entry of the waiting list that was not checked yet
+        self.skipped = {} # person -> seminars whose head passed the person while not eligible
+        self.revived = [[] for _ in self.names] # heap of positions before head that are eligible again
+        self.positions = {} # person -> {seminar: position on its waiting list}
+        for i, persons in enumerate(self.waiting):
+            for pos, u in enumerate(persons):
+                self.positions.setdefault(u, {})[i] = pos
+
+        self.sync = sync
+        self.log = None
+        if log is not None:
+            if os.path.isfile(log):
+                self.replay(log)
+            self.log = open(log, 'a', encoding='utf-8')
+
+    #%% queries
+    def eligible(self, u, i):
+        """u can get a place in seminar i: no content-identical seminar and less than the maximum."""
+        seminars = self.assigned.get(u, ())
+        return len(seminars) < self.maximum and all(self.group[s] != self.group[i] for s in seminars)
+
+    def next(self, i):
+        """(position, person) of the first eligible person on the waiting list of seminar i, or None.
+        Entries that are removed or not eligible are passed once: the head only moves forward, a
+        skipped person is checked again after giving up a place (see _revive)."""
+        persons, revived = self.waiting[i], self.revived[i]
+        while revived: # skipped persons before the head come first
+            u = persons[revived[0]]
+            if u is not None and self.eligible(u, i):
+                return revived[0], u
+            heapq.heappop(revived)
+            if u is not None:
+                self.skipped.setdefault(u, set()).add(i)
+        while self.head[i] < len(persons):
+            u = persons[self.head[i]]
+            if u is not None:
+                if self.eligible(u, i):
+                    return self.head[i], u
+                self.skipped.setdefault(u, set()).add(i)
+            self.head[i] += 1
+        return None
+
+    def person(self, u):
+        return {'person': u, 'seminars': [self.names[i] for i in sorted(self.assigned.get(u, ()))],
+                'waitlists': {self.names[i]: pos for i, pos in self.positions.get(u, {}).items()}}
+
+    def seminar(self, name):
+        i = self._seminar(name)
+        candidate = self.next(i)
+        return {'seminar': name, 'places': self.places[i], 'participants': list(self.participants[i]),
+                'free': self.places[i]-len(self.participants[i]),
+                'waiting': self.count[i],
+                'next': None if candidate is None else {'person': candidate[1], 'position': candidate[0]}}
+
+    def _seminar(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError(f'Unknown seminar "{name}"') from None
+
+    #%% changes
+    def _removeWaiting(self, u, i):
+        pos = self.positions[u].pop(i)
+        self.waiting[i][pos] = None
+        self.count[i] -= 1
+        if not self.positions[u]:
+            del self.positions[u]
+        if u in self.skipped:
+            self.skipped[u].discard(i)
+        return pos
+
+    def _revive(self, u):
+        """u gave up a place: the waiting lists that skipped u check u again at its position."""
+        for i in self.skipped.pop(u, ()):
+            if i in self.positions.get(u, ()):
+                heapq.heappush(self.revived[i], self.positions[u][i])
+
+    def fill(self, i):
+        """Give the free places of seminar i to the waiting list; returns [(person, position)]."""
+        promoted = []
+        while len(self.participants[i]) < self.places[i]:
+            candidate = self.next(i)
+            if candidate is None:
+                break
+            pos, u = candidate
+            self._removeWaiting(u, i)
+            self.participants[i][u] = None
+            self.assigned.setdefault(u, set()).add(i)
+            for s in self.members[self.group[i]]: # never two content-identical seminars
+                if s in self.positions.get(u, ()):
+                    self._removeWaiting(u, s)
+            promoted.append((u, pos))
+        return promoted
+
+    def cancel(self, person, seminar):
+        """Person gives up the place (or the waiting list position) in the seminar; the free place
+        is given to the waiting list."""
+        i = self._seminar(seminar)
+        if person in self.participants[i]:
+            del self.participants[i][person]
+            self.assigned[person].discard(i)
+            self._revive(person)
+            removed = 'Platz'
+        elif i in self.positions.get(person, ()):
+            self._removeWaiting(person, i)
+            removed = 'Warteliste'
+        else:
+            return {'removed': None, 'promoted': []}
+        self.requests[i] -= 1
+        res = {'removed': removed, 'promoted': [{'person': u, 'position': pos} for u, pos in self.fill(i)]}
+        self._log({'op': 'cancel', 'person': person, 'seminar': seminar}, res)
+        return res
+
+    def setPlaces(self, seminar, places):
+        i = self._seminar(seminar)
+        self.places[i] = int(places)
+        res = {'places': self.places[i], 'promoted': [{'person': u, 'position': pos} for u, pos in self.fill(i)]}
+        self._log({'op': 'places', 'seminar': seminar, 'places': self.places[i]}, res)
+        return res
+
+    def _log(self, op, res):
+        if self.log is not None:
+            self.log.write(json.dumps({**op, 'time': time.time(), 'result': res}, ensure_ascii=False)+'\n')
+            self.log.flush()
+            if self.sync:
+                os.fsync(self.log.fileno())
+
+    def replay(self, log):
+        """Execute the changes of a log again (without writing them)."""
+        with open(log, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                if op['op'] == 'cancel':
+                    self.cancel(op['person'], op['seminar'])
+                elif op['op'] == 'places':
+                    self.setPlaces(op['seminar'], op['places'])
+
+    def toResult(self):
+        """Current state as gluecksfee.delta.Result, e.g. to write the sheets."""
+        return Result(self.names, self.places, self.requests, [list(p) for p in self.participants],
+                      {name: [u for u in self.waiting[i] if u is not None] for name, i in
+                       ((name, self.index[name]) for name in self.result.order)}, self.result.parameters)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+#%% HTTP
+class Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, action):
+        try:
+            self._send(200, action())
+        except KeyError as e:
+            self._send(404, {'error': str(e.args[0]) if e.args else 'not found'})
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/person':
+            self._handle(lambda: self.service.person(query['id']))
+        elif url.path == '/seminar':
+            self._handle(lambda: self.service.seminar(query['name']))
+        else:
+            self._send(404, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        service = self.service
+        actions = {'/cancel': lambda: service.cancel(str(body['person']), body['seminar']),
+                   '/places': lambda: service.setPlaces(body['seminar'], body['places']),
+                   '/export': lambda: {'output': export(service, body['output'])}}
+        if self.path in actions:
+            self._handle(actions[self.path])
+        else:
+            self._send(404, {'error': f'unknown path {self.path}'})
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    pass
+
+def export(service, output):
+    from gluecksfee.output import writeSheets
+    writeSheets(output, service.toResult().sheets())
+    return output
+
+def serve(service, port=8765, socket=None):
+    handler = type('ServiceHandler', (Handler,), {'service': service})
+    if socket is not None:
+        if os.path.lexists(socket):
+            if not stat.S_ISSOCK(os.lstat(socket).st_mode):
+                raise FileExistsError(f'{socket} exists and is not a socket, it is not removed')
+            os.remove(socket) # socket of a previous run
+        server = UnixHTTPServer(socket, handler)
+    else:
+        server = HTTPServer(('127.0.0.1', port), handler)
+    return server
+
+def logFile(previous):
+    """Default file of the log: output.xlsx -> output_service.jsonl"""
+    return f'{os.path.splitext(str(previous))[0]}_service.jsonl'
+
+#%%
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokaler Dienst für das Nachrücken von der Warteliste")
+    parser.add_argument("previous", help="Ausgabe der Auslosung (.xlsx, oder .csv/.parquet mit einer Datei pro Sheet)")
+    parser.add_argument("-i", "--input", default=None,
+                        help="Eingabe mit der Zeile inhaltlich. Default: Eingabe-Datei aus dem Sheet Parameters")
+    parser.add_argument("-m", "--maximum", type=int, default=None,
+                        help="Maximale Anzahl von Seminaren pro Person. Default: aus dem Sheet Parameters")
+    parser.add_argument("--port", type=int, default=8765, help="Port auf localhost. Default: 8765")
+    parser.add_argument("--socket", default=None, help="Unix-Socket statt Port")
+    parser.add_argument("--log", default=None, help="Log der Änderungen (JSONL). Default: PREVIOUS_service.jsonl")
+    parser.add_argument("--fsync", action='store_true', help="Log nach jeder Änderung mit fsync auf die Platte schreiben")
+    args = parser.parse_args(argv)
+
+    result = Result.read(args.previous)
+    try:
+        result.checkWaitlists()
+    except ValueError as e:
+        parser.error(str(e))
+    maximum = args.maximum if args.maximum is not None else int(result.parameter('Maximale #Seminare', 999))
+    file = args.input or resolveInput(result.parameter('Eingabe-Datei'), args.previous) or result.parameter('Eingabe-Datei')
+    try:
+        inhaltlich = contentGroups(result, file)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if inhaltlich is None:
+        print(f'Keine Zeile inhaltlich in {file}: jedes Seminar ist eine eigene inhaltliche Gruppe')
+    log = args.log or logFile(args.previous)
+    service = PromotionService(result, inhaltlich, maximum, log=log, sync=args.fsync)
+    try:
+        server = serve(service, args.port, args.socket)
+    except FileExistsError as e:
+        service.close()
+        parser.error(str(e))
+    print(f'Warteliste von {args.previous} bereit auf {args.socket or f"http://127.0.0.1:{args.port}"}, Log {log}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Monte-Carlo-Simulation der Auslosung über viele Seeds
+
+Die Eingabedatei wird nur einmal eingelesen; die Auslosung (und optional die
+Warteliste) wird für `runs` abgeleitete Seeds in einem Prozesspool wiederholt.
+Durchlauf j nutzt den Seed-String f'{seed}/{j}' und kann damit jederzeit mit
+`-s "{seed}/{j}"` einzeln nachvollzogen werden.
+
+Mit `replicas` > 0 werden jeweils so viele Durchläufe gleichzeitig mit dem
+vektorisierten Kern gluecksfee.batched berechnet; Durchlauf j ist dann nicht mehr
+einzeln mit einem Seed reproduzierbar.
+
+Die Ergebnisse der Durchläufe werden nicht gespeichert, sondern fortlaufend in
+SimulationStats aggregiert (Summen, Quadratsummen, Minimum und Maximum pro
+Person und Seminar); der Speicherbedarf ist unabhängig von `runs`. Mit
+`metrics` werden zusätzlich die Kennzahlen der Fairness aus gluecksfee.metrics
+fortlaufend berechnet (Sheet Metrics).
+
+@author: Tobias Hoßfeld
+
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gluecksfee.batched import batchedAssignment
+from gluecksfee.lottery import assignmentMatrix, seedFromString, waitingListRequests, waitingPlacesMatrix
+from gluecksfee.metrics import FairnessMetrics
+from gluecksfee.sparse import asColumns
+
+#%% streaming aggregation of the simulation runs
+class SimulationStats:
+    def __init__(self, requested, places, requests=None):
+        self.requested = np.asarray(requested) # requests per user
+        self.places = np.asarray(places, dtype='float') # places per seminar
+        self.metrics = FairnessMetrics(requested, places, requests) if requests is not None else None # with requests per seminar
+        n, k = self.requested.size, self.places.size
+        self.runs = 0
+
+        self.atLeastOne = np.zeros(n) # runs with at least one seminar per user
+        self.assigned = np.zeros(n) # sum of assigned seminars per user
+        self.ratio = np.zeros(n) # sum of assigned/requested per user
+        self.ratioSq = np.zeros(n)
+        self.ratioMin = np.full(n, np.inf)
+        self.ratioMax = np.full(n, -np.inf)
+
+        self.filled = np.zeros(k) # sum of assigned places per seminar
+        self.filledSq = np.zeros(k)
+        self.filledMin = np.full(k, np.inf)
+        self.filledMax = np.full(k, -np.inf)
+
+        self.coverage = np.array([0.0, 0.0, np.inf, -np.inf]) # share of users with at least one seminar: sum, sum of squares, min, max
+        self.placesUsed = np.array([0.0, 0.0, np.inf, -np.inf]) # share of all places which are assigned
+
+        self.waitingBest = np.zeros(n) # sum of the best waiting list position per user
+        self.waitingRuns = np.zeros(n) # runs in which the user is on a waiting list
+        self.waitingLength = np.zeros(k) # sum of the waiting list length per seminar
+
+    def add(self, assigned, filled, waitingBest=None, waitingLength=None):
+        hasRequest = self.requested > 0
+        ratio = np.divide(assigned, self.requested, out=np.zeros(self.requested.size), where=hasRequest)
+        self.runs += 1
+        self.atLeastOne += assigned > 0
+        self.assigned += assigned
+        self.ratio += ratio
+        self.ratioSq += ratio**2
+        np.minimum(self.ratioMin, ratio, out=self.ratioMin)
+        np.maximum(self.ratioMax, ratio, out=self.ratioMax)
+
+        self.filled += filled
+        self.filledSq += filled**2
+        np.minimum(self.filledMin, filled, out=self.filledMin)
+        np.maximum(self.filledMax, filled, out=self.filledMax)
+
+        for acc, v in [(self.coverage, np.mean(assigned[hasRequest] > 0)), (self.placesUsed, filled.sum()/self.places.sum())]:
+            acc += [v, v**2, 0, 0]
+            acc[2:] = min(acc[2], v), max(acc[3], v)
+        if self.metrics is not None:
+            self.metrics.add(assigned, filled)
+
+        if waitingBest is not None:
+            onList = waitingBest > 0
+            self.waitingBest[onList] += waitingBest[onList]
+            self.waitingRuns += onList
+            self.waitingLength += waitingLength
+
+    def merge(self, other):
+        self.runs += other.runs
+        for name in ['atLeastOne', 'assigned', 'ratio', 'ratioSq', 'filled', 'filledSq',
+                     'waitingBest', 'waitingRuns', 'waitingLength']:
+            setattr(self, name, getattr(self, name)+getattr(other, name))
+        for name, fun in [('ratioMin', np.minimum), ('ratioMax', np.maximum),
+                          ('filledMin', np.minimum), ('filledMax', np.maximum)]:
+            setattr(self, name, fun(getattr(self, name), getattr(other, name)))
+        for acc, v in [(self.coverage, other.coverage), (self.placesUsed, other.placesUsed)]:
+            acc[:2] += v[:2]
+            acc[2:] = min(acc[2], v[2]), max(acc[3], v[3])
+        if self.metrics is not None:
+            self.metrics.merge(other.metrics)
+        return self
+
+    @staticmethod
+    def _std(s, sq, runs):
+        return np.sqrt(np.maximum(sq/runs-(s/runs)**2, 0))
+
+    def personView(self):
+        runs = max(self.runs, 1)
+        hasRequest = self.requested > 0
+        nan = lambda v: np.where(hasRequest, v, np.nan)
+        return {'requested': self.requested,
+                'P(>=1)': self.atLeastOne/runs,
+                'assigned': self.assigned/runs,
+                'ratio': nan(self.ratio/runs),
+                'ratio_std': nan(self._std(self.ratio, self.ratioSq, runs)),
+                'ratio_min': nan(self.ratioMin),
+                'ratio_max': nan(self.ratioMax),
+                'waiting_best': np.divide(self.waitingBest, self.waitingRuns, out=np.full(self.requested.size, np.nan), where=self.waitingRuns>0)}
+
+    def seminarView(self):
+        runs = max(self.runs, 1)
+        return {'Plaetze': self.places,
+                'Teilnehmer': self.filled/runs,
+                'Teilnehmer_std': self._std(self.filled, self.filledSq, runs),
+                'Teilnehmer_min': self.filledMin,
+                'Teilnehmer_max': self.filledMax,
+                'Zugewiesen': self.filled/runs/self.places,
+                'Warteliste': self.waitingLength/runs}
+
+    def summary(self):
+        runs = max(self.runs, 1)
+        res = {'Durchläufe': self.runs}
+        for name, (s, sq, vmin, vmax) in [('Anteil mit mind. 1 Seminar', self.coverage),
+                                          ('Anteil vergebener Plätze', self.placesUsed)]:
+            res[f'{name} (Mittel)'] = s/runs
+            res[f'{name} (Std)'] = self._std(s, sq, runs)
+            res[f'{name} (Min)'] = vmin
+            res[f'{name} (Max)'] = vmax
+        return res
+
+#%% a single run and the worker processes
+def waitingListStats(wx, y_wait):
+    """Best waiting list position per user (0: on no list) and length per seminar."""
+    wx, y_wait = asColumns(wx), asColumns(y_wait)
+    n, k = wx.shape
+    best = np.zeros(n, dtype='int')
+    length = np.zeros(k)
+    for i in range(k):
+        users = wx.registered(i)
+        m = users.size
+        length[i] = m
+        if m == 1:
+            pos = np.ones(1, dtype='int')
+        else:
+            users, rank = y_wait.column(i)
+            pos = np.rint((1-rank)*m).astype('int')+1 # rank=(m-j)/m for position j+1
+        better = (best[users] == 0) | (pos < best[users])
+        best[users[better]] = pos[better]
+    return best, length
+
+_problem = None
+
+def _initWorker(problem):
+    global _problem
+    _problem = problem
+
+def _simulateRuns(seeds):
+    p = _problem
+    stats = SimulationStats(p['requested'], p['places'], p['requests'])
+    for seed in seeds:
+        y = assignmentMatrix(p['x'], p['numParticipantsPerSeminar'], p['semTypes'], p['inhaltlich'],
+                             maxSeminarsAssignedPerParticipant=p['maximum'], seed=seed, sampler=p['sampler'])
+        assigned, filled = y.sum(axis=1), y.sum(axis=0)
+        if p['waitlist']:
+            wx = waitingListRequests(p['x'], y, p['semTypes'])
+            y_wait, _ = waitingPlacesMatrix(wx, p['numParticipantsPerSeminar'], p['semTypes'], p['inhaltlich'],
+                                            preAssigned=assigned, seed=seed, sampler=p['sampler'])
+            stats.add(assigned, filled, *waitingListStats(wx, y_wait))
+        else:
+            stats.add(assigned, filled)
+    return stats
+
+def _simulateBatches(batches):
+    p = _problem
+    stats = SimulationStats(p['requested'], p['places'], p['requests'])
+    for seed, replicas in batches:
+        A, F = batchedAssignment(p['x'], p['numParticipantsPerSeminar'], p['semTypes'], p['inhaltlich'], replicas,
+                                 maxSeminarsAssignedPerParticipant=p['maximum'], seed=seed)
+        for assigned, filled in zip(A, F):
+            stats.add(assigned, filled)
+    return stats
+
+def deriveSeeds(seed, runs):
+    return [seedFromString(f'{seed}/{j}') for j in range(runs)]
+
+def simulate(x, numParticipantsPerSeminar, semTypes, inhaltlich, seed, runs=1000, workers=None,
+             maxSeminarsAssignedPerParticipant=999, sampler='legacy', waitlist=False, replicas=0, metrics=False):
+    """Aggregate `runs` draws. With replicas>0 the draws are computed with the
+    vectorized kernel (gluecksfee.batched) in batches of `replicas`, which is much
+    faster but ignores `sampler` and `waitlist`. With metrics the stats also hold
+    the gluecksfee.metrics.FairnessMetrics of the runs."""
+    x = asColumns(x)
+    problem = {'x': x, 'numParticipantsPerSeminar': numParticipantsPerSeminar, 'semTypes': semTypes,
+               'inhaltlich': inhaltlich, 'maximum': maxSeminarsAssignedPerParticipant, 'sampler': sampler,
+               'waitlist': waitlist, 'requested': x.sum(axis=1), 'places': numParticipantsPerSeminar,
+               'requests': x.sum(axis=0) if metrics else None}
+    if replicas > 0:
+        units = [(seedFromString(f'{seed}/batch{b}'), min(replicas, runs-j)) for b, j in enumerate(range(0, runs, replicas))]
+        fun = _simulateBatches
+    else:
+        units = deriveSeeds(seed, runs)
+        fun = _simulateRuns
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1:
+        _initWorker(problem)
+        return fun(units)
+
+    chunk = max(1, -(-len(units)//(4*workers)))
+    stats = SimulationStats(problem['requested'], problem['places'], problem['requests'])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(problem,)) as pool:
+        for partial in pool.map(fun, [units[j:j+chunk] for j in range(0, len(units), chunk)]):
+            stats.merge(partial)
+    return stats
+
+#%% report
+def writeSimulationReport(file, stats, userid, seminarNames, parameters=()):
+    from pandas import DataFrame, ExcelWriter
+
+    writer = ExcelWriter(file, engine='xlsxwriter')
+    format_percent = writer.book.add_format({'num_format': '0.0%'})
+
+    df = DataFrame(list(stats.summary().items()), columns=['Kennzahl', 'Wert'])
+    df.to_excel(writer, sheet_name='Simulation', index=False)
+    writer.sheets['Simulation'].set_column('A:A', 40)
+
+    df = DataFrame(stats.personView(), index=userid)
+    df.to_excel(writer, sheet_name='Sim_Person', index=True, index_label='Person')
+    writer.sheets['Sim_Person'].set_column('C:C', 10, format_percent)
+    writer.sheets['Sim_Person'].conditional_format(f'C2:C{len(userid)+1}', {'type': '3_color_scale',
+                                         'min_color': "#FF0000",
+                                         'mid_color': "#FFFF00",
+                                         'max_color': "#00FF00"})
+
+    df = DataFrame(stats.seminarView(), index=seminarNames)
+    df.to_excel(writer, sheet_name='Sim_Seminar', index=True, index_label='Seminar')
+    writer.sheets['Sim_Seminar'].set_column('G:G', 12, format_percent)
+
+    df = DataFrame(list(parameters), columns=['Parameter'])
+    df.to_excel(writer, sheet_name='Parameters', index=False)
+
+    if stats.metrics is not None:
+        from gluecksfee.output import _xlsxSheets
+        _xlsxSheets(writer.book, [stats.metrics.sheet(seminarNames)], {'Metrics': [('A:A', 28, None)]})
+    writer.close()
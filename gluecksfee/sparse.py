@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Spaltenweise gespeicherte (CSC) Anmeldungen und Zuweisungen x[user_id, seminar_id]
+
+Bei großen Veranstaltungen meldet sich jede Person nur für wenige der Seminare an,
+die dichte Matrix besteht dann fast nur aus Nullen. RegistrationMatrix speichert
+für jedes Seminar nur die angemeldeten Nutzer (aufsteigend sortiert) und deren
+Werte, der Speicherbedarf wächst mit der Anzahl der Anmeldungen statt mit n*k.
+
+Die Funktionen asColumns, toDense und denseRowBlocks akzeptieren sowohl
+dichte numpy-Matrizen als auch RegistrationMatrix.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import numpy as np
+
+#%%
+class RegistrationMatrix:
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = np.asarray(indptr, dtype='int64') # entries of seminar i: indptr[i]:indptr[i+1]
+        self.indices = np.asarray(indices, dtype='int64') # user of each entry, sorted per seminar
+        self.data = np.asarray(data) # value of each entry
+        self.shape = tuple(shape)
+
+    @classmethod
+    def fromCoordinates(cls, users, seminars, data, shape):
+        users, seminars = np.asarray(users, dtype='int64'), np.asarray(seminars, dtype='int64')
+        order = np.lexsort((users, seminars))
+        indptr = np.zeros(shape[1]+1, dtype='int64')
+        np.cumsum(np.bincount(seminars, minlength=shape[1]), out=indptr[1:])
+        return cls(indptr, users[order], np.asarray(data)[order], shape)
+
+    @classmethod
+    def fromDense(cls, x):
+        users, seminars = np.nonzero(x)
+        return cls.fromCoordinates(users, seminars, x[users, seminars], x.shape)
+
+    @classmethod
+    def fromColumns(cls, columns, shape, dtype='int64'):
+        """Build the matrix from a list of (users, values) per seminar."""
+        users = [np.atleast_1d(np.asarray(u, dtype='int64')) for u, _ in columns]
+        data = [np.broadcast_to(np.asarray(v, dtype=dtype), u.shape) for u, (_, v) in zip(users, columns)]
+        seminars = np.repeat(np.arange(len(columns)), [u.size for u in users])
+        return cls.fromCoordinates(np.concatenate([np.zeros(0, dtype='int64')]+users), seminars,
+                                   np.concatenate([np.zeros(0, dtype=dtype)]+data), shape)
+
+    @property
+    def nnz(self):
+        return self.indices.size
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def T(self):
+        """Transposed matrix, i.e. the seminars per user are stored row-wise (CSR)."""
+        seminars = np.repeat(np.arange(self.shape[1]), np.diff(self.indptr))
+        return RegistrationMatrix.fromCoordinates(seminars, self.indices, self.data, self.shape[::-1])
+
+    def copy(self):
+        return RegistrationMatrix(self.indptr, self.indices, self.data.copy(), self.shape)
+
+    def column(self, i):
+        s = slice(self.indptr[i], self.indptr[i+1])
+        return self.indices[s], self.data[s]
+
+    def registered(self, i):
+        """Users with x[user,i]>0 in ascending order."""
+        users, values = self.column(i)
+        return users[values>0]
+
+    def sum(self, axis=None, dtype=None):
+        if dtype is None:
+            dtype = self.dtype if np.issubdtype(self.dtype, np.integer) else 'float'
+        if axis is None:
+            return self.data.sum(dtype=dtype)
+        if axis == 0:
+            c = np.concatenate(([0], np.cumsum(self.data, dtype=dtype)))
+            return c[self.indptr[1:]] - c[self.indptr[:-1]]
+        res = np.zeros(self.shape[0], dtype=dtype)
+        np.add.at(res, self.indices, self.data)
+        return res
+
+    def toDense(self):
+        x = np.zeros(self.shape, dtype=self.dtype)
+        x[self.indices, np.repeat(np.arange(self.shape[1]), np.diff(self.indptr))] = self.data
+        return x
+
+#%% helper functions for both dense numpy matrices and RegistrationMatrix
+def asColumns(m):
+    if isinstance(m, RegistrationMatrix):
+        return m
+    return RegistrationMatrix.fromDense(np.asarray(m))
+
+def toDense(m):
+    if isinstance(m, RegistrationMatrix):
+        return m.toDense()
+    return m
+
+def denseRowBlocks(m, blockSize=4096, rows=None):
+    """Yield (start, dense rows start:start+blockSize) of the matrix; `rows` can pass
+    m.T of a RegistrationMatrix if it is already known."""
+    n, k = m.shape
+    if not isinstance(m, RegistrationMatrix):
+        for start in range(0, n, blockSize):
+            yield start, m[start:start+blockSize]
+        return
+    if rows is None:
+        rows = m.T # seminars per user
+    for start in range(0, n, blockSize):
+        stop = min(start+blockSize, n)
+        s = slice(rows.indptr[start], rows.indptr[stop])
+        block = np.zeros((stop-start, k), dtype=m.dtype)
+        users = np.repeat(np.arange(start, stop), np.diff(rows.indptr[start:stop+1]))
+        block[users-start, rows.indices[s]] = rows.data[s]
+        yield start, block
+
+def writeMatrixSheet(writer, blocks, sheet_name, index, columns, index_label):
+    """DataFrame(m, index, columns).to_excel(...) for a matrix given as blocks of
+    dense rows (see denseRowBlocks), so that only one block exists at the same time."""
+    from pandas import DataFrame
+    for start, block in blocks:
+        df = DataFrame(block, index=index[start:start+block.shape[0]], columns=columns)
+        df.to_excel(writer, sheet_name=sheet_name, index=True, index_label=index_label,
+                    startrow=0 if start == 0 else start+1, header=(start == 0))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Unabhängige Zufallszahlen-Streams pro Seminar (--rng streams)
+
+Im bisherigen Modus (legacy) ziehen alle Seminare nacheinander aus dem globalen
+Generator np.random, initialisiert mit seedFromString(seed): jede Ziehung hängt
+davon ab, wie viele Zufallszahlen alle vorherigen Ziehungen verbraucht haben.
+
+Im Modus streams erhält jedes Seminar einen eigenen numpy Generator (PCG64).
+Die SeedSequence der Wurzel wird aus dem vollständigen SHA-256 des Seed-Strings
+gebildet; das Seminar ist ein Kind davon wie bei SeedSequence.spawn, nur mit
+dem SHA-256 des Seminarnamens (und der Phase assign/waitlist/delta) als spawn_key
+statt der laufenden Nummer. Der Stream eines Seminars hängt damit weder von der
+Reihenfolge noch von der Anzahl der anderen Seminare ab: ein Seminar kann
+einzeln neu gezogen und Wartelisten können parallel berechnet werden. Die
+Namen der Seminare müssen dafür eindeutig sein, sonst bricht seminarStreams ab.
+
+@author: Tobias Hoßfeld
+
+"""
+
+from collections import Counter
+import hashlib
+
+import numpy as np
+
+RNG_MODES = ('legacy', 'streams')
+PHASES = {'assign': 0, 'waitlist': 1, 'delta': 2}
+
+def _words(value):
+    """SHA-256 of the value as eight uint32 words."""
+    digest = hashlib.sha256(str(value).encode('utf-8')).digest()
+    return [int.from_bytes(digest[j:j+4], 'little') for j in range(0, 32, 4)]
+
+def rootSequence(seed):
+    """SeedSequence of a seed string (full SHA-256) or of an integer seed."""
+    if isinstance(seed, (int, np.integer)):
+        return np.random.SeedSequence(int(seed))
+    return np.random.SeedSequence(_words(seed))
+
+def seminarStream(seed, seminarName, phase='assign'):
+    """Generator of one seminar: the child of rootSequence(seed) keyed by phase and seminar name."""
+    root = rootSequence(seed)
+    child = np.random.SeedSequence(root.entropy, spawn_key=(*root.spawn_key, PHASES[phase], *_words(seminarName)))
+    return np.random.Generator(np.random.PCG64(child))
+
+def seminarStreams(seed, seminarNames, phase='assign'):
+    """Generators of all seminars. The stream is keyed by the name, so the names must be unique."""
+    duplicates = [name for name, count in Counter(str(name) for name in seminarNames).items() if count > 1]
+    if duplicates:
+        raise ValueError(f'Seminars with the same name would share a random stream: {", ".join(duplicates)}; '
+                         'rename them or use --rng legacy')
+    return [seminarStream(seed, name, phase) for name in seminarNames]
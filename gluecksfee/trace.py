@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Protokoll (Trace) der Auslosung für Nachfragen und Widersprüche
+
+Statt der ausführlichen Konsolenausgabe (--verbose) wird pro Runde, d.h. pro
+ausgelostem Seminar, ein kompakter Datensatz geschrieben:
+  phase       'assign' (Auslosung) oder 'waitlist' (Warteliste)
+  round       laufende Nummer der Runde in der Phase
+  seminar     Index des Seminars, places: Anzahl der Plätze
+  registered  Zeilenindizes der angemeldeten Personen
+  classes     Anzahl bisher zugewiesener Seminare (Klasse) der Angemeldeten,
+  counts      Anzahl der Personen pro Klasse und
+  weights     Wahrscheinlichkeit p einer Person der Klasse für den nächsten Platz
+              (leer, wenn alle Angemeldeten einen Platz erhalten)
+  selected    gezogene Personen in der Reihenfolge der Ziehung
+  rng         Digest des Zustands von np.random vor der Ziehung
+Der Kopf (Seed, Sampler, Maximum, Seminar- und Personennamen) steht in der
+ersten Zeile bzw. in den Metadaten der Datei.
+
+Formate nach Dateiendung:
+  .jsonl     eine JSON-Zeile pro Runde, gepuffert geschrieben
+  .parquet   spaltenweise (pyarrow), eine Row Group pro blockSize Runden
+
+Der lesbare Bericht "Round k: p_0=..." wird bei Bedarf aus dem Trace erzeugt:
+
+    python -m gluecksfee.trace trace.jsonl [--phase assign] [--details]
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import json
+import os.path
+
+import numpy as np
+
+TRACE_VERSION = 1
+
+def _classes(assigned, p):
+    """Classes of the assigned counts, persons per class and the weight p of each class.
+    All persons of a class have the same weight."""
+    if assigned.dtype.kind in 'iub':
+        counts = np.bincount(assigned)
+        weights = np.zeros(counts.size)
+        weights[assigned] = p
+        classes = np.flatnonzero(counts)
+        return classes, counts[classes], weights[classes]
+    classes, first, counts = np.unique(assigned, return_index=True, return_counts=True)
+    return classes, counts, p[first]
+
+def _toJson(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+#%% Writers
+class TraceWriter:
+    """Base class: collects the rounds and writes them in blocks."""
+    def __init__(self, file, header=None, blockSize=1024):
+        self.file = file
+        self.header = {'version': TRACE_VERSION, **(header or {})}
+        self.blockSize = blockSize
+        self.rounds = {}
+        self.block = []
+
+    def round(self, phase, seminar, places, registered, selected, assigned=None, p=None, rng=None):
+        """Record one round; assigned and p are the assigned counts and the weights of the
+        registered persons (None if all registered persons got a place)."""
+        k = self.rounds.get(phase, 0)
+        self.rounds[phase] = k+1
+        if p is None:
+            classes, counts, weights = (), (), ()
+        else:
+            classes, counts, weights = _classes(np.asarray(assigned), p)
+        self.block.append((phase, k, int(seminar), int(places), np.asarray(registered), np.asarray(classes),
+                           np.asarray(counts), np.asarray(weights, dtype='float'), np.asarray(selected), rng))
+        if len(self.block) >= self.blockSize:
+            self.flush()
+
+    def flush(self):
+        self.writeBlock(self.block)
+        self.block = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonlTraceWriter(TraceWriter):
+    FIELDS = ('phase', 'round', 'seminar', 'places', 'registered', 'classes', 'counts', 'weights', 'selected', 'rng')
+
+    def __init__(self, file, header=None, blockSize=1024):
+        super().__init__(file, header, blockSize)
+        self.f = open(file, 'w', encoding='utf-8', buffering=1 << 20)
+        self.f.write(json.dumps({'type': 'header', **self.header}, default=_toJson)+'\n')
+
+    def writeBlock(self, block):
+        # str() of a list of int/float is valid JSON and faster than json.dumps for long lists
+        for record in block:
+            values = [str(v.tolist()) if isinstance(v, np.ndarray) else json.dumps(v) for v in record]
+            self.f.write('{'+', '.join(f'"{k}": {v}' for k, v in zip(self.FIELDS, values))+'}\n')
+
+    def close(self):
+        super().close()
+        self.f.close()
+
+class ParquetTraceWriter(TraceWriter):
+    def __init__(self, file, header=None, blockSize=1024):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError('Parquet trace requires pyarrow (pip install pyarrow)') from e
+        super().__init__(file, header, blockSize)
+        self.pa = pa
+        integers, floats = pa.list_(pa.int64()), pa.list_(pa.float64())
+        self.schema = pa.schema([('phase', pa.string()), ('round', pa.int64()), ('seminar', pa.int64()),
+                                 ('places', pa.int64()), ('registered', integers), ('classes', floats),
+                                 ('counts', integers), ('weights', floats), ('selected', integers), ('rng', pa.string())],
+                                metadata={'gluecksfee.trace': json.dumps(self.header, default=_toJson)})
+        self.writer = pq.ParquetWriter(file, self.schema, use_dictionary=False) # ids rarely repeat within a row group
+
+    def _list(self, arrays, dtype):
+        offsets = np.zeros(len(arrays)+1, dtype='int32')
+        np.cumsum([a.size for a in arrays], out=offsets[1:])
+        values = np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype=dtype)
+        return self.pa.ListArray.from_arrays(offsets, values)
+
+    def writeBlock(self, block):
+        if not block:
+            return
+        columns = list(zip(*block))
+        arrays = [self.pa.array(columns[j], type=self.schema.field(j).type) for j in range(4)]
+        arrays += [self._list(columns[4], 'int64'), self._list(columns[5], 'float64'), self._list(columns[6], 'int64'),
+                   self._list(columns[7], 'float64'), self._list(columns[8], 'int64'),
+                   self.pa.array(columns[9], type=self.pa.string())]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+TRACE_WRITERS = {'.jsonl': JsonlTraceWriter, '.parquet': ParquetTraceWriter, '.pq': ParquetTraceWriter}
+
+def openTrace(file, header=None, blockSize=1024):
+    """TraceWriter by the file extension (default: JSONL)."""
+    return TRACE_WRITERS.get(os.path.splitext(str(file))[1].lower(), JsonlTraceWriter)(file, header, blockSize)
+
+#%% Reading and rendering
+def readTrace(file):
+    """Returns the header and an iterator over the rounds as dicts."""
+    if os.path.splitext(str(file))[1].lower() in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(file)
+        header = json.loads(pf.schema_arrow.metadata[b'gluecksfee.trace'])
+        def rounds():
+            for batch in pf.iter_batches():
+                yield from batch.to_pylist()
+        return header, rounds()
+
+    f = open(file, encoding='utf-8')
+    header = json.loads(f.readline())
+    header.pop('type', None)
+    def rounds():
+        with f:
+            for line in f:
+                yield json.loads(line)
+    return header, rounds()
+
+def _label(c):
+    return f'{c:g}' if isinstance(c, float) and not c.is_integer() else f'{int(c)}'
+
+def renderRounds(header, rounds, phase='assign', details=False):
+    """Lines of the report "Round k: Seminar "name" p_0=...% (n); ..." of one phase
+    (None: all phases) from readTrace."""
+    seminarNames = header.get('seminarNames')
+    userid = header.get('userid')
+    for r in rounds:
+        if phase is not None and r['phase'] != phase:
+            continue
+        name = seminarNames[r['seminar']] if seminarNames is not None else r['seminar']
+        s = f'Round {r["round"]}: Seminar "{name}" '
+        if not r['weights']:
+            s += f'p_*={100:.4f}% ({len(r["registered"])}); '
+        for c, n, p in zip(r['classes'], r['counts'], r['weights']):
+            s += f'p_{_label(c)}={p*100:.4f}% ({n}); '
+        yield s
+        if details:
+            ids = (lambda u: [userid[j] for j in u]) if userid is not None else (lambda u: u)
+            yield f'    {len(r["registered"])} registrations, {r["places"]} places, rng {r["rng"]}'
+            yield f'    registered users: {ids(r["registered"])}'
+            yield f'    selected users: {ids(r["selected"])}'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bericht der Runden aus einem Trace der SeKo Gluecksfee")
+    parser.add_argument("trace", help="Trace-Datei (.jsonl oder .parquet)")
+    parser.add_argument("--phase", choices=['assign', 'waitlist', 'all'], default='assign',
+                        help="Phase der Auslosung. Default: assign")
+    parser.add_argument("--details", action='store_true',
+                        help="Gibt zusätzlich die angemeldeten und gezogenen Personen pro Runde aus")
+    args = parser.parse_args(argv)
+
+    header, rounds = readTrace(args.trace)
+    print(f'Seed für Zufallszahlen: "{header.get("seed")}" ({header.get("seedValue")}), Sampler: {header.get("sampler")}, '
+          f'Maximale #Seminare: {header.get("maximum")}')
+    for line in renderRounds(header, rounds, None if args.phase == 'all' else args.phase, args.details):
+        print(line)
+
+if __name__ == "__main__":
+    main()
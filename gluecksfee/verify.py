@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Nachprüfen einer veröffentlichten Auslosung über den Seed
+
+Liest aus der Ausgabe nur die Sheets Parameters, Assignment und Warteplaetze
+(zeilenweise, s. gluecksfee.delta.iterResultRows), leitet aus dem Seed-String
+wie bei der Auslosung den Startwert ab (SHA-256, s. seedFromString) und spielt
+Auslosung und Warteliste mit Eingabe, Maximum, Sampler, RNG und Engine aus dem
+Sheet Parameters nach. Die nachgespielte Zuweisung wird blockweise mit dem
+Sheet Assignment verglichen, die Wartelisten Seminar für Seminar mit dem Sheet
+Warteplaetze; es werden keine Sheets geschrieben. Ausgegeben wird die erste
+Abweichung (Person und Seminar bzw. Seminar und Position), der Exit-Code ist 0
+bei Übereinstimmung, 1 bei einer Abweichung und 2, wenn die Ausgabe nicht
+nachgeprüft werden kann (Datei, Sheet oder Parameter fehlt).
+
+    python -m gluecksfee.verify output.xlsx
+    python -m gluecksfee.verify output.xlsx -i input.xlsx
+
+Ohne Sheet Warteplaetze (gluecksfee2.py) wird nur die Zuweisung geprüft.
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import os.path
+import time
+
+import numpy as np
+
+from gluecksfee.delta import iterResultRows, resolveInput, resultRows
+from gluecksfee.lottery import Lottery
+from gluecksfee.sparse import denseRowBlocks
+
+XLSX_COLUMNS = 16384 # columns of a worksheet, the writers drop the places of longer waiting lists
+
+#%% parameters of the output
+def readParameters(file):
+    """Lines 'name: value' of the sheet Parameters as dict."""
+    rows = resultRows(file, 'Parameters')
+    if rows is None:
+        raise ValueError(f'The output {file} has no sheet Parameters')
+    parameters = {}
+    for row in rows[1:]:
+        if row and row[0] is not None and ':' in str(row[0]):
+            name, value = str(row[0]).split(':', 1)
+            parameters.setdefault(name.strip(), value.strip())
+    return parameters
+
+def replaySettings(parameters):
+    """Keyword arguments of Lottery for the draw recorded in the parameters."""
+    seed = parameters.get('Seed für Zufallszahlen')
+    if seed is None:
+        raise ValueError('The sheet Parameters has no line "Seed für Zufallszahlen"')
+    if len(seed) >= 2 and seed[0] == seed[-1] == '"':
+        seed = seed[1:-1]
+    top = parameters.get('Warteliste', '')
+    settings = {'seed': seed, 'maximum': int(parameters.get('Maximale #Seminare', 999)),
+                'sampler': parameters.get('Sampler', 'legacy'), 'rng': parameters.get('RNG', 'legacy'),
+                'engine': parameters.get('Engine', 'lottery').split()[0],
+                'waitlistTop': int(top.split()[1]) if top.startswith('erste ') else None}
+    return settings
+
+def inputFile(parameters, output, input=None):
+    """Input of the draw: the given file, else the file of the parameters (also next to the output)."""
+    if input is not None:
+        return input
+    file = parameters.get('Eingabe-Datei')
+    if file is None:
+        raise ValueError('The sheet Parameters has no line "Eingabe-Datei", please pass the input with -i')
+    return resolveInput(file, output) or file
+
+def _person(v):
+    """Person as text, as it is written to and read from the sheets (1.0 and 1 are the same person)."""
+    if isinstance(v, np.ndarray):
+        v = v.item() if v.size == 1 else str(v)
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v)
+
+#%% comparisons, each returns the first divergence as text or None
+def compareAssignment(rows, lottery, blockSize=4096):
+    """Compare the rows of the sheet Assignment with the replayed assignment block by block."""
+    header = next(rows, None)
+    names = [str(v) for v in (header or [])[1:]]
+    expected = [str(v) for v in lottery.seminarNames]
+    if names != expected:
+        j = next((j for j, (a, b) in enumerate(zip(names, expected)) if a != b), min(len(names), len(expected)))
+        return (f'Assignment: Spalte {j+2} ist "{names[j] if j < len(names) else ""}", '
+                f'nachgespielt "{expected[j] if j < len(expected) else ""}"')
+    k = len(expected)
+    for start, block in denseRowBlocks(lottery.y, blockSize):
+        for r, replayed in enumerate(block):
+            u = start+r
+            row = next(rows, None)
+            if row is None:
+                return f'Assignment: endet nach {u} Personen, nachgespielt {lottery.y.shape[0]}'
+            if _person(row[0]) != _person(lottery.userid[u]):
+                return f'Assignment: Zeile {u+2} ist Person {row[0]}, nachgespielt {lottery.userid[u]}'
+            published = np.array([0 if v is None else v for v in row[1:k+1]] + [0]*(k+1-len(row)), dtype='float')
+            diff = np.flatnonzero(published != replayed)
+            if diff.size:
+                i = diff[0]
+                return (f'Assignment: Person {lottery.userid[u]} (Zeile {u+2}), Seminar {expected[i]}: '
+                        f'veröffentlicht {published[i]:g}, nachgespielt {replayed[i]:g}')
+    for row in rows:
+        if row and row[0] is not None:
+            return f'Assignment: zusätzliche Person {row[0]}, nachgespielt {lottery.y.shape[0]} Personen'
+    return None
+
+def compareWaitlist(rows, order, width=None):
+    """Compare the rows of the sheet Warteplaetze with the replayed waiting lists; width: the number of
+    places a row of the sheet can hold (xlsx: 16383 after the seminar name), longer lists are cut."""
+    next(rows, None)
+    names = iter(order)
+    for row in rows:
+        if not row or row[0] is None:
+            continue
+        name = next(names, None)
+        if str(row[0]) != str(name):
+            return f'Warteplaetze: Zeile für Seminar {row[0]}, nachgespielt {name}'
+        published = [_person(v) for v in row[1:] if v is not None and v != '']
+        replayed = [_person(u) for u in order[name][:width]]
+        if published != replayed:
+            pos = next((j for j, (a, b) in enumerate(zip(published, replayed)) if a != b), min(len(published), len(replayed)))
+            at = lambda persons: persons[pos] if pos < len(persons) else '(Ende)'
+            return f'Warteplaetze: Seminar {name}, Position {pos}: veröffentlicht {at(published)}, nachgespielt {at(replayed)}'
+    name = next(names, None)
+    if name is not None:
+        return f'Warteplaetze: Seminar {name} fehlt'
+    return None
+
+def verify(output, input=None, blockSize=4096, verbose=True):
+    """Replay the draw of an output; returns None if it is reproduced, else the first divergence."""
+    say = print if verbose else (lambda *args: None)
+    parameters = readParameters(output)
+    settings = replaySettings(parameters)
+    file = inputFile(parameters, output, input)
+    if not os.path.isfile(file):
+        raise FileNotFoundError(file)
+    rows = iterResultRows(output, 'Assignment')
+    if rows is None:
+        raise ValueError(f'The output {output} has no sheet Assignment')
+    if parameters.get('Engine', '').startswith('flow') and 'Zeitbudget' in parameters['Engine']:
+        say('Hinweis: die Zuweisung wurde mit Zeitbudget berechnet und ist evtl. nicht exakt reproduzierbar')
+
+    lottery = Lottery(**settings).load(file)
+    say(f'Seed "{settings["seed"]}" -> {lottery.seedValue}, Eingabe {file}')
+    lottery.assign()
+    divergence = compareAssignment(rows, lottery, blockSize)
+    if divergence is not None:
+        return divergence
+    say('Assignment stimmt überein')
+
+    rows = iterResultRows(output, 'Warteplaetze')
+    if rows is None:
+        return None
+    lottery.waitlist()
+    xlsx = os.path.splitext(str(output))[1].lower() not in ('.csv', '.parquet', '.pq')
+    divergence = compareWaitlist(rows, lottery.order, XLSX_COLUMNS-1 if xlsx else None)
+    if divergence is None:
+        say('Warteplaetze stimmen überein')
+    return divergence
+
+#%%
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nachprüfen einer veröffentlichten Auslosung über den Seed")
+    parser.add_argument("output", help="Ausgabe der Auslosung (.xlsx, oder .csv/.parquet mit einer Datei pro Sheet)")
+    parser.add_argument("-i", "--input", default=None,
+                        help="Eingabe der Auslosung. Default: Eingabe-Datei aus dem Sheet Parameters")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        divergence = verify(args.output, args.input)
+    except FileNotFoundError as e:
+        print(f'Fehler: Datei {e.filename or e} nicht gefunden')
+        return 2
+    except ValueError as e:
+        print(f'Fehler: {e}')
+        return 2
+    seconds = time.perf_counter()-start
+    if divergence is not None:
+        print(f'Abweichung: {divergence} ({seconds:.2f} s)')
+        return 1
+    print(f'Die Auslosung {args.output} ist mit dem Seed reproduzierbar ({seconds:.2f} s)')
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
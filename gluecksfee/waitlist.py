@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Warteliste mit den ersten K Plätzen pro Seminar (--waitlist-top K)
+
+Statt einer gewichteten Permutation aller Angemeldeten zieht waitingPlacesMatrix
+mit topK=K nur die ersten K Plätze jedes Seminars; die übrigen Personen erhalten
+für die Gewichte der folgenden Seminare den mittleren Rang der nicht gezogenen
+Plätze. Für jedes Seminar mit weiteren Angemeldeten wird gespeichert:
+  users     die noch nicht gezogenen Personen
+  p         ihre Gewichte bei der Ziehung
+  state     der Zustand des Zufallsgenerators nach der Ziehung
+  position  die Anzahl der bereits gezogenen Plätze
+
+extendWaitlist setzt die Ziehung von diesem Zustand aus fort (sequentiell
+proportional zu den Gewichten der noch nicht gezogenen Personen) und gibt die
+nächsten Plätze zurück. Der Zustand wird als .npz neben der Ausgabe gespeichert
+(Default <Ausgabe>_waitlist.npz) und beim Verlängern aktualisiert:
+
+    python -m gluecksfee.waitlist output_waitlist.npz "Seminar 1A" -n 10
+
+@author: Tobias Hoßfeld
+
+"""
+
+import argparse
+import json
+import os.path
+
+import numpy as np
+
+from gluecksfee.sampler import getSampler
+
+STATE_VERSION = 1
+
+def waitlistStateFile(output):
+    """Default file of the state: output.xlsx -> output_waitlist.npz"""
+    return f'{os.path.splitext(str(output))[0]}_waitlist.npz'
+
+#%% state of the random generator as JSON
+def _stateToJson(state):
+    if state is None:
+        return None
+    state = dict(state, state=dict(state['state']))
+    if isinstance(state['state'].get('key'), np.ndarray): # MT19937 of the legacy np.random
+        state['state']['key'] = state['state']['key'].tolist()
+    return state
+
+def _stateFromJson(state):
+    if state is not None and 'key' in state['state']:
+        state['state']['key'] = np.asarray(state['state']['key'], dtype='uint32')
+    return state
+
+#%% extend the waiting list of one seminar
+def extendWaitlist(entry, size, sampler='legacy', rng='legacy'):
+    """Draw the next `size` places of a seminar from its remainder entry (see waitingPlacesMatrix).
+    Returns the drawn users and the entry for the next extension."""
+    users, p = entry['users'], entry['p']
+    size = min(size, users.size)
+    if size == 0:
+        return users[:0], entry
+    if rng == 'streams':
+        generator = np.random.Generator(np.random.PCG64())
+        generator.bit_generator.state = entry['state']
+        select = getSampler(sampler)(np.arange(users.size), size, p/p.sum(), rng=generator)
+        state = generator.bit_generator.state
+    else:
+        np.random.set_state(entry['state'])
+        select = getSampler(sampler)(np.arange(users.size), size, p/p.sum())
+        state = np.random.get_state(legacy=False)
+    rest = np.ones(users.size, dtype='bool')
+    rest[select] = False
+    return users[select], {'users': users[rest], 'p': p[rest], 'state': state, 'position': entry['position']+size}
+
+#%% state file
+def saveWaitlistState(file, remainder, **header):
+    """Save the remainder of all seminars and the header (seed, sampler, rng, topK) as .npz."""
+    names = list(remainder)
+    seminars = [{'name': str(name), 'position': int(remainder[name]['position']),
+                 'state': _stateToJson(remainder[name]['state'])} for name in names]
+    arrays = {}
+    for j, name in enumerate(names):
+        arrays[f'users{j}'] = np.asarray(remainder[name]['users']).astype(str)
+        arrays[f'p{j}'] = np.asarray(remainder[name]['p'], dtype='float64')
+    header = json.dumps({**header, 'version': STATE_VERSION, 'seminars': seminars}, default=str)
+    with open(file, 'wb') as f: # a file object: np.savez does not append .npz
+        np.savez(f, header=np.array(header), **arrays)
+    return file
+
+def loadWaitlistState(file):
+    """Returns (header, remainder) of a state file written by saveWaitlistState."""
+    with np.load(file) as data:
+        header = json.loads(str(data['header']))
+        if header.get('version') != STATE_VERSION:
+            raise ValueError(f'Unknown version {header.get("version")} of the waiting list state {file}')
+        remainder = {s['name']: {'users': data[f'users{j}'], 'p': data[f'p{j}'], 'state': _stateFromJson(s['state']),
+                                 'position': s['position']} for j, s in enumerate(header.pop('seminars'))}
+    return header, remainder
+
+#%%
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verlängert die Warteliste eines Seminars (--waitlist-top)")
+    parser.add_argument("state", help="Zustand der Warteliste (.npz, gespeichert mit --waitlist-top)")
+    parser.add_argument("seminar", help="Name des Seminars")
+    parser.add_argument("-n", type=int, default=10, help="Anzahl weiterer Plätze. Default: 10")
+    args = parser.parse_args(argv)
+
+    header, remainder = loadWaitlistState(args.state)
+    if args.seminar not in remainder:
+        print(f'Die Warteliste von "{args.seminar}" ist bereits vollständig.')
+        return 1
+    entry = remainder[args.seminar]
+    users, remainder[args.seminar] = extendWaitlist(entry, args.n, header.get('sampler') or 'legacy', header.get('rng', 'legacy'))
+    for j, user in enumerate(users):
+        print(f'{entry["position"]+j}: {user}')
+    if remainder[args.seminar]['users'].size == 0:
+        del remainder[args.seminar]
+    saveWaitlistState(args.state, remainder, **header)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
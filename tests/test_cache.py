@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Cache der eingelesenen Anmeldungen (gluecksfee.cache): Schlüssel aus dem
+Dateiinhalt, Speichern und Laden der .npy-Dateien, neue Einträge bei
+geänderter Datei und verworfene veraltete oder beschädigte Einträge.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import gluecksfee.readers
+from gluecksfee.cache import InputCache, readCached
+from gluecksfee.sparse import toDense
+
+INPUT = 'Person;A;B;C\nPlaetze;2;1;3\ninhaltlich;1;1;2\n00123;1;0;1\n0042;0;1;1\n17;1;1;0\nMia;0;0;1\n'
+
+@pytest.fixture
+def input(tmp_path):
+    file = tmp_path/'input.csv'
+    file.write_text(INPUT, encoding='utf-8')
+    return str(file)
+
+@pytest.fixture
+def cache(tmp_path):
+    return InputCache(str(tmp_path/'cache'))
+
+def _noReader(*args, **kwargs):
+    raise AssertionError('the input is read again instead of loaded from the cache')
+
+def test_key_depends_on_content_and_reader(input, cache, tmp_path):
+    copy = tmp_path/'copy.csv'
+    copy.write_text(INPUT, encoding='utf-8')
+    assert cache.key(input) == cache.key(str(copy))
+    assert cache.key(input) != cache.key(input, reader='pandas')
+    assert cache.key(input) != cache.key(input, defaultNumberParticipantsPerSeminar=10)
+    copy.write_text(INPUT.replace('Mia;0;0;1', 'Mia;1;0;1'), encoding='utf-8')
+    assert cache.key(input) != cache.key(str(copy))
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_round_trip(input, cache, sparse, monkeypatch):
+    first = readCached(input, cache, sparse=sparse)
+    assert len(cache.entries()) == 1
+    monkeypatch.setattr(gluecksfee.readers, 'readRegistrations', _noReader)
+    second = readCached(input, cache, sparse=sparse)
+    assert list(second[0]) == list(first[0]) == ['A', 'B', 'C']
+    assert np.array_equal(toDense(second[1]), toDense(first[1]))
+    assert list(second[2]) == list(first[2]) == ['00123', '0042', 17, 'Mia']
+    assert list(second[3]) == list(first[3]) and list(second[4]) == list(first[4])
+    assert {k: v.tolist() for k, v in second[5].items()} == {k: v.tolist() for k, v in first[5].items()}
+
+def test_changed_file_gets_a_new_entry(input, cache):
+    readCached(input, cache)
+    with open(input, 'a', encoding='utf-8') as f:
+        f.write('Ben;1;1;1\n')
+    _, x, userid, _, _, _ = readCached(input, cache)
+    assert list(userid)[-1] == 'Ben' and x.shape == (5, 3)
+    assert len(cache.entries()) == 2
+
+@pytest.mark.parametrize('damage', ['version', 'file'])
+def test_outdated_or_damaged_entry_is_read_again(input, cache, damage):
+    readCached(input, cache)
+    directory = cache.path(cache.key(input))
+    if damage == 'version':
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['version'] = 0
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    else:
+        os.remove(os.path.join(directory, 'data.npy'))
+    assert cache.load(cache.key(input)) is None
+    assert not os.path.exists(directory)
+    assert list(readCached(input, cache)[2]) == ['00123', '0042', 17, 'Mia']
+
+def test_eviction_keeps_the_latest_entry(input, cache, tmp_path):
+    readCached(input, cache)
+    other = tmp_path/'other.csv'
+    other.write_text(INPUT+'Ben;1;1;1\n', encoding='utf-8')
+    cache.maxBytes = 1
+    readCached(str(other), cache)
+    assert [key for _, _, key in cache.entries()] == [cache.key(str(other))]
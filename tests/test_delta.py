@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Nachrücken mit gluecksfee.delta: die Wartelisten einer Ausgabe enthalten
+Personen, auch wenn nur eine Person auf der Warteliste steht.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import pytest
+
+from gluecksfee.delta import Result, applyChanges
+from gluecksfee.lottery import Lottery
+
+INPUT = 'Person,A,B\nPlaetze,1,5\ninhaltlich,1,2\nAnna,1,0\nBen,1,0\nCem,0,1\n'
+
+@pytest.fixture
+def output(tmp_path):
+    file = tmp_path/'input.csv'
+    file.write_text(INPUT, encoding='utf-8')
+    lottery = Lottery(seed='delta').load(str(file))
+    lottery.waitlist()
+    lottery.export(str(tmp_path/'output.xlsx'))
+    return lottery, str(tmp_path/'output.xlsx')
+
+def test_single_candidate_waitlist_holds_the_person(output):
+    lottery, _ = output
+    assigned = [u for u in ('Anna', 'Ben') if lottery.y[list(lottery.userid).index(u), 0]]
+    assert len(assigned) == 1
+    waiting = {'Anna', 'Ben'} - set(assigned)
+    assert list(lottery.order['A']) == list(waiting)
+
+def test_withdrawal_promotes_the_single_candidate(output):
+    lottery, file = output
+    result = Result.read(file)
+    assert result.persons == {'Anna', 'Ben', 'Cem'}
+    [participant] = result.participants[0]
+    [candidate] = result.order['A']
+    assert {participant, candidate} == {'Anna', 'Ben'}
+    diff = applyChanges(result, [('remove', participant, 'A', None)])
+    assert (candidate, 'A', 'nachgerueckt', 'Warteliste Platz 0') in diff
+    assert result.participants[0] == [candidate] and result.order['A'] == []
+
+def test_unknown_waitlisted_person_is_rejected(output):
+    _, file = output
+    result = Result.read(file)
+    result.order['A'] = ['0'] # row index instead of the person, as written by older versions
+    with pytest.raises(ValueError, match='not in the sheet Assignment'):
+        applyChanges(result, [('remove', result.participants[0][0], 'A', None)])
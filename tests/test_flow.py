@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Zuweisung als Flussproblem (gluecksfee.flow): die Zuweisung hält Plätze,
+Maximum und inhaltliche Gruppen ein, erreicht die maximale Anzahl an Personen
+mit mind. einem Seminar und danach die maximale Anzahl an Plätzen (verglichen
+mit einem einfachen Max-Flow), und ist für einen Seed reproduzierbar.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import collections
+
+import numpy as np
+import pytest
+
+from gluecksfee.flow import flowAssignment
+from gluecksfee.lottery import groupIndex, hashSemTypes
+from gluecksfee.sparse import RegistrationMatrix
+
+def maxFlow(x, places, group, maximum):
+    """Maximum number of places by augmenting paths in Quelle -> Person -> Person x Gruppe -> Seminar -> Senke."""
+    n, k = x.shape
+    graph = collections.defaultdict(dict)
+    def add(a, b, c):
+        graph[a][b] = graph[a].get(b, 0)+c
+        graph[b].setdefault(a, 0)
+    for u in range(n):
+        add('S', ('u', u), maximum)
+        for s in np.flatnonzero(x[u]):
+            if ('g', u, group[s]) not in graph[('u', u)]:
+                add(('u', u), ('g', u, group[s]), 1)
+            add(('g', u, group[s]), ('s', s), 1)
+    for s in range(k):
+        add(('s', s), 'T', int(places[s]))
+    flow = 0
+    while True:
+        parent, queue = {'S': None}, collections.deque(['S'])
+        while queue and 'T' not in parent:
+            a = queue.popleft()
+            for b, c in graph[a].items():
+                if c > 0 and b not in parent:
+                    parent[b] = a
+                    queue.append(b)
+        if 'T' not in parent:
+            return flow
+        b = 'T'
+        while parent[b] is not None:
+            a = parent[b]
+            graph[a][b] -= 1
+            graph[b][a] += 1
+            b = a
+        flow += 1
+
+def randomInput(rng):
+    n, k = rng.integers(3, 25), rng.integers(2, 9)
+    x = (rng.random((n, k)) < rng.uniform(0.2, 0.7)).astype('int64')
+    inhaltlich = rng.integers(0, max(1, k-rng.integers(0, k)), k)
+    return x, rng.integers(0, 6, k), inhaltlich, int(rng.integers(1, 5))
+
+@pytest.mark.parametrize('trial', range(40))
+def test_flow_is_valid_and_optimal(trial):
+    x, places, inhaltlich, maximum = randomInput(np.random.default_rng(trial))
+    semTypes = hashSemTypes(inhaltlich)
+    group = groupIndex(semTypes, x.shape[1])
+    stats = {}
+    y = flowAssignment(x, places, semTypes, inhaltlich, maxSeminarsAssignedPerParticipant=maximum, seed=trial, stats=stats)
+    assert stats['optimal']
+    assert np.all(y <= x) and np.all(y.sum(axis=0) <= places) and np.all(y.sum(axis=1) <= maximum)
+    for g in np.unique(group):
+        assert np.all(y[:, group == g].sum(axis=1) <= 1)
+    assert (y.sum(axis=1) > 0).sum() == maxFlow(x, places, group, 1) # coverage first
+    assert y.sum() == maxFlow(x, places, group, maximum) # then the places
+
+def test_flow_is_reproducible_dense_and_sparse():
+    x, places, inhaltlich, maximum = randomInput(np.random.default_rng(99))
+    semTypes = hashSemTypes(inhaltlich)
+    y = flowAssignment(x, places, semTypes, inhaltlich, maxSeminarsAssignedPerParticipant=maximum, seed=5)
+    assert np.array_equal(y, flowAssignment(x, places, semTypes, inhaltlich, maxSeminarsAssignedPerParticipant=maximum, seed=5))
+    sparse = flowAssignment(RegistrationMatrix.fromDense(x), places, semTypes, inhaltlich,
+                            maxSeminarsAssignedPerParticipant=maximum, seed=5)
+    assert isinstance(sparse, RegistrationMatrix) and np.array_equal(sparse.toDense(), y)
+
+def test_time_budget_returns_a_valid_assignment():
+    rng = np.random.default_rng(1)
+    n, k = 2000, 30
+    x = (rng.random((n, k)) < 0.2).astype('int64')
+    inhaltlich = np.arange(k)//2
+    places = rng.integers(5, 40, k)
+    stats = {}
+    y = flowAssignment(x, places, hashSemTypes(inhaltlich), inhaltlich, maxSeminarsAssignedPerParticipant=2,
+                       seed=1, timeBudget=0.0, stats=stats)
+    assert not stats['optimal'] and stats['levels'] == 1
+    assert np.all(y <= x) and np.all(y.sum(axis=0) <= places) and np.all(y.sum(axis=1) <= 2)
+    assert np.all(y[:, 0::2]+y[:, 1::2] <= 1) # content groups of two seminars
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Reproduzierbarkeit veröffentlichter Auslosungen: mit Sampler und RNG legacy
+ergeben input.xlsx und ein fester Seed dieselbe Zuweisung und dieselben
+Wartelisten wie das ursprüngliche gluecksfee3.py (tests/data/legacy_input.json),
+dicht und mit sparse=True (RegistrationMatrix).
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import json
+import os.path
+
+import numpy as np
+import pytest
+
+from gluecksfee.delta import iterResultRows
+from gluecksfee.lottery import Lottery
+from gluecksfee.sparse import toDense
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT = os.path.join(HERE, '..', 'input.xlsx')
+
+with open(os.path.join(HERE, 'data', 'legacy_input.json'), encoding='utf-8') as f:
+    EXPECTED = json.load(f)
+
+def _person(v):
+    return str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('seed', list(EXPECTED))
+def test_legacy_draw_is_reproduced(seed, sparse, tmp_path):
+    lottery = Lottery(seed=seed, sparse=sparse).load(INPUT)
+    lottery.waitlist()
+    y, names = toDense(lottery.y), [str(s) for s in lottery.seminarNames]
+    assignment = [[u, [names[i] for i in np.flatnonzero(y[j])]] for j, u in enumerate(lottery.userid)]
+    assert assignment == EXPECTED[seed]['assignment']
+    assert {str(k): list(v) for k, v in lottery.order.items()} == EXPECTED[seed]['waitlist']
+
+    # the sheets as written to the output
+    output = str(tmp_path/'output.xlsx')
+    lottery.export(output)
+    rows = iterResultRows(output, 'Assignment')
+    header = [str(v) for v in next(rows)[1:]]
+    published = [[_person(row[0]), [header[i] for i, v in enumerate(row[1:]) if v]] for row in rows]
+    assert published == [[_person(u), seminars] for u, seminars in EXPECTED[seed]['assignment']]
+    rows = iterResultRows(output, 'Warteplaetze')
+    next(rows)
+    published = {str(row[0]): [_person(v) for v in row[1:] if v is not None] for row in rows if row and row[0] is not None}
+    assert published == {k: [_person(u) for u in v] for k, v in EXPECTED[seed]['waitlist'].items()}
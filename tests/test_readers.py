@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Reader der Eingabe: das zeilenweise Einlesen der xlsx-Datei ergibt dieselben
+Personen, Seminare und Anmeldungen wie der bisherige Weg über pandas
+(readExcelFile), auch für Personen als Text mit führenden Nullen.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import numpy as np
+import pytest
+
+from gluecksfee.readers import readCsv, readXlsx
+
+ROWS = [['Person', 'A', 'B', 'C'],
+        ['Plaetze', 2, 1, 3],
+        ['inhaltlich', 1, 1, 2],
+        ['00123', 1, 0, 1],
+        ['0042', 0, 1, 1],
+        [17, 1, 1, 0],
+        ['Mia', 0, 0, 1]]
+
+@pytest.fixture
+def xlsx(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'registrierung'
+    for row in ROWS:
+        ws.append(row)
+    file = str(tmp_path/'input.xlsx')
+    wb.save(file)
+    return file
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_xlsx_reader_matches_pandas(xlsx, sparse):
+    pytest.importorskip('pandas')
+    from gluecksfee.lottery import readExcelFile
+    WS, x, userid, numPlaetze, inhaltlich = readExcelFile(xlsx, sparse=sparse)
+    seminarNames, x2, userid2, numPlaetze2, inhaltlich2 = readXlsx(xlsx, sparse=sparse)
+    assert list(userid2) == list(userid) == ['00123', '0042', 17, 'Mia']
+    assert list(seminarNames) == list(WS.columns[1:])
+    dense = lambda m: m.toDense() if sparse else m
+    assert np.array_equal(dense(x2), dense(x))
+    assert list(numPlaetze2) == list(numPlaetze) and list(inhaltlich2) == list(inhaltlich)
+
+def test_csv_keeps_text_persons(tmp_path):
+    file = tmp_path/'input.csv'
+    file.write_text('Person;A;B\n-99;2;1\nPerson 1;1;1\n00123;1;0\n17;0;1\n', encoding='utf-8')
+    seminarNames, x, userid, numPlaetze, _ = readCsv(str(file))
+    assert list(userid) == ['Person 1', '00123', 17]
+    assert list(numPlaetze) == [2, 1]
+    assert x.tolist() == [[1, 1], [1, 0], [0, 1]]
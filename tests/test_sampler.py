@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Gleichwertigkeit der Sampler: die Inklusionswahrscheinlichkeiten aller Sampler
+stimmen (mit festem Seed) innerhalb von 5 Standardfehlern mit den exakt
+berechneten Werten überein, s. gluecksfee.sampler.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import numpy as np
+import pytest
+
+from gluecksfee.sampler import SAMPLERS, checkSamplers, inclusionProbabilities, sampleBuckets
+
+TOLERANCE = 5 # standard errors
+
+# weights as in the lottery: users without seminar get the factor 100
+CASES = [([100*3, 2, 2, 1, 1, 1], 2),
+         ([100*2, 100*2, 1, 1, 1], 3),
+         ([3, 2, 2, 1, 1, 1, 1], 4),
+         ([1, 1, 1, 1, 1], 2)]
+
+@pytest.mark.parametrize('p, size', CASES)
+def test_inclusion_probabilities(p, size):
+    res = checkSamplers(p, size, runs=5000, seed=42)
+    assert set(res) == set(SAMPLERS)
+    for name, z in res.items():
+        assert z < TOLERANCE, f'{name}: {z:.2f} sigma'
+
+def test_buckets_with_classes():
+    # the classes of the lottery: assigned seminars per user, the weight falls with the class
+    assigned = np.array([0, 1, 1, 2, 2, 2])
+    p = (2+1-assigned)*np.where(assigned == 0, 100.0, 1.0)
+    p = p/p.sum()
+    size, runs = 3, 5000
+    exact = inclusionProbabilities(p, size)
+    rng = np.random.default_rng(7)
+    counts = np.zeros(p.size)
+    for _ in range(runs):
+        select = sampleBuckets(np.arange(p.size), size, p, rng=rng, classes=assigned)
+        assert len(set(select)) == size
+        counts[select] += 1
+    assert np.max(np.abs(counts/runs-exact)/np.sqrt(exact*(1-exact)/runs)) < TOLERANCE
+
+def test_zero_weights_are_not_drawn():
+    p = np.array([0, 0, 0.5, 0.5])
+    rng = np.random.default_rng(3)
+    for name, sampler in SAMPLERS.items():
+        assert set(sampler(np.arange(4), 2, p, rng=rng)) == {2, 3}, name
+
+def test_lottery_with_weight_classes():
+    # the draw with sampler='buckets' keeps the places, the maximum and the content groups
+    from gluecksfee.lottery import assignmentMatrix
+    from gluecksfee.sparse import RegistrationMatrix
+    rng = np.random.default_rng(11)
+    n, numSeminars, maximum = 400, 12, 2
+    users = np.repeat(np.arange(n), 4)
+    seminars = np.concatenate([rng.choice(numSeminars, 4, replace=False) for _ in range(n)])
+    x = RegistrationMatrix.fromCoordinates(users, seminars, np.ones(users.size, dtype='int64'), (n, numSeminars))
+    inhaltlich = [k // 2 for k in range(numSeminars)] # pairs of content-identical seminars
+    semTypes = {g: [k for k in range(numSeminars) if inhaltlich[k] == g] for g in set(inhaltlich)}
+    places = np.full(numSeminars, 25)
+    y = assignmentMatrix(x, places, semTypes, inhaltlich, maximum, seed=5, sampler='buckets').toDense()
+    assert np.all(y <= x.toDense())
+    assert np.all(y.sum(axis=0) <= places) and y.sum(axis=0).max() == 25
+    assert y.sum(axis=1).max() <= maximum
+    assert all(y[:, semTypes[g]].sum(axis=1).max() <= 1 for g in semTypes)
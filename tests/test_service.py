@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Nachrücken mit gluecksfee.service: Reihenfolge der Warteliste, übersprungene
+Personen, Log und HTTP-Schnittstelle.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import json
+import threading
+from urllib.request import Request, urlopen
+
+import pytest
+
+from gluecksfee.delta import Result
+from gluecksfee.service import PromotionService, serve
+
+def result(persons=None):
+    # A and B are content-identical, C is on its own; Mia and Noah already have 2 seminars
+    return Result(['A', 'B', 'C'], [2, 1, 2], [5, 3, 4],
+                  [['Mia', 'Noah'], ['Ida'], ['Mia', 'Noah']],
+                  {'A': ['Ida', 'Ben', 'Eva'], 'B': ['Mia', 'Ben'], 'C': ['Ida', 'Ben']}, ['Maximale #Seminare: 2'],
+                  persons)
+
+def test_cancel_promotes_the_first_eligible_person():
+    service = PromotionService(result(), inhaltlich=[1, 1, 2], maximum=2)
+    # Ida has B, which is content-identical to A: Ben moves up
+    res = service.cancel('Mia', 'A')
+    assert res == {'removed': 'Platz', 'promoted': [{'person': 'Ben', 'position': 1}]}
+    assert service.person('Ben') == {'person': 'Ben', 'seminars': ['A'], 'waitlists': {'C': 1}}
+    assert service.seminar('A')['waiting'] == 2
+
+def test_skipped_person_is_checked_again_after_giving_up_a_place():
+    service = PromotionService(result(), inhaltlich=[1, 1, 2], maximum=2)
+    service.setPlaces('B', 1)
+    assert service.seminar('B')['next'] == {'person': 'Ben', 'position': 1}
+    assert service.head[1] == 1 # Mia (maximum reached) is passed once
+    # Mia gives up A: she is again the first of the waiting list of B, Ben moves up in A
+    assert service.cancel('Mia', 'A')['promoted'] == [{'person': 'Ben', 'position': 1}]
+    assert service.seminar('B')['next'] == {'person': 'Mia', 'position': 0}
+    assert service.setPlaces('B', 2)['promoted'] == [{'person': 'Mia', 'position': 0}]
+    assert service.person('Mia')['seminars'] == ['B', 'C']
+
+def test_unknown_waitlisted_person_is_rejected():
+    with pytest.raises(ValueError, match='not in the sheet Assignment'):
+        PromotionService(result(persons={'Mia', 'Noah', 'Ida', 'Eva'}), inhaltlich=[1, 1, 2], maximum=2)
+    PromotionService(result(persons={'Mia', 'Noah', 'Ida', 'Ben', 'Eva'}), inhaltlich=[1, 1, 2], maximum=2)
+
+def test_log_is_replayed(tmp_path):
+    log = str(tmp_path/'service.jsonl')
+    service = PromotionService(result(), inhaltlich=[1, 1, 2], maximum=2, log=log)
+    service.cancel('Mia', 'A')
+    service.setPlaces('C', 3)
+    service.close()
+    expected = service.toResult()
+    replayed = PromotionService(result(), inhaltlich=[1, 1, 2], maximum=2, log=log)
+    replayed.close()
+    assert replayed.toResult().participants == expected.participants
+    assert replayed.toResult().order == expected.order
+
+def test_http():
+    service = PromotionService(result(), inhaltlich=[1, 1, 2], maximum=2)
+    server = serve(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        post = Request(url+'/cancel', data=json.dumps({'person': 'Mia', 'seminar': 'A'}).encode('utf-8'), method='POST')
+        with urlopen(post) as response:
+            assert json.load(response)['promoted'] == [{'person': 'Ben', 'position': 1}]
+        with urlopen(url+'/seminar?name=A') as response:
+            assert json.load(response)['participants'] == ['Noah', 'Ben']
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Nachprüfen einer Auslosung (gluecksfee.verify): Exit-Code 0 für eine
+reproduzierte Ausgabe, 1 für eine veränderte Zuweisung oder Warteliste und 2,
+wenn ein Sheet oder die Eingabe fehlt.
+
+    python -m pytest tests
+
+@author: Tobias Hoßfeld
+
+"""
+
+import csv
+import os.path
+
+import pytest
+
+from gluecksfee.lottery import Lottery
+from gluecksfee.output import sheetFile
+from gluecksfee.verify import main
+
+INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'input.xlsx')
+
+def draw(file):
+    lottery = Lottery(seed='verify', maximum=2).load(INPUT)
+    lottery.waitlist()
+    lottery.export(file)
+    return lottery
+
+@pytest.fixture(params=['.xlsx', '.csv'])
+def output(request, tmp_path):
+    file = str(tmp_path/f'output{request.param}')
+    draw(file)
+    return file
+
+def _editCsv(output, sheet, edit):
+    part = sheetFile(output, sheet, '.csv')
+    with open(part, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    edit(rows)
+    with open(part, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+def test_reproduced_output(output, capsys):
+    assert main([output]) == 0
+    assert 'reproduzierbar' in capsys.readouterr().out
+
+def test_tampered_assignment(tmp_path, capsys):
+    output = str(tmp_path/'output.csv')
+    lottery = draw(output)
+    def flip(rows):
+        rows[1][1] = '0' if rows[1][1] == '1' else '1'
+    _editCsv(output, 'Assignment', flip)
+    assert main([output]) == 1
+    assert f'Abweichung: Assignment: Person {lottery.userid[0]}' in capsys.readouterr().out
+
+def test_tampered_waitlist(tmp_path, capsys):
+    output = str(tmp_path/'output.csv')
+    draw(output)
+    def swap(rows):
+        row = next(row for row in rows[1:] if len([v for v in row if v]) > 2)
+        row[1], row[2] = row[2], row[1]
+    _editCsv(output, 'Warteplaetze', swap)
+    assert main([output]) == 1
+    assert 'Abweichung: Warteplaetze' in capsys.readouterr().out
+
+@pytest.mark.parametrize('sheet', ['Assignment', 'Parameters'])
+def test_missing_sheet(tmp_path, sheet, capsys):
+    output = str(tmp_path/'output.csv')
+    draw(output)
+    os.remove(sheetFile(output, sheet, '.csv'))
+    assert main([output]) == 2
+    assert capsys.readouterr().out.startswith(f'Fehler: The output {output} has no sheet {sheet}')
+
+def test_missing_input(output, tmp_path, capsys):
+    assert main([output, '-i', str(tmp_path/'missing.xlsx')]) == 2
+    assert 'missing.xlsx nicht gefunden' in capsys.readouterr().out